@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from .cache import TTLCache
+
+STUDENT_NAME_PLACEHOLDER = "{student_name}"
+# Part of every key; bump it when what gets cached changes, so older entries are never served
+KEY_FORMAT = 2
+# A reply using these says something about this particular student, even with the name factored out
+GENDERED_PRONOUNS = ("he", "him", "his", "himself", "she", "her", "hers", "herself")
+GENDERED_PRONOUN_PATTERN = re.compile(r"\b(?:" + "|".join(GENDERED_PRONOUNS) + r")\b", re.IGNORECASE)
+
+
+def normalize_text(text: str) -> str:
+    # "Sick.", " sick " and "SICK!" should all share an entry
+    return re.sub(r"\s+", " ", text).strip().strip(".!").strip().lower()
+
+
+class AIResponseCache:
+    """
+    Content-addressed cache of AI classifications. The key is the prompt version plus the
+    conversation's status/RFA and its normalized history, with the templated opening message
+    reduced to a marker so identical replies from different families share an entry. The
+    student's name in a cached reply is swapped for a placeholder on the way in and for the
+    current student's name on the way out. A reply that still refers to the student after that
+    (part of the name, or a gendered pronoun) isn't cached, since the key can't tell students apart.
+
+    Entries live in a bounded in-memory LRU and, if AI_CACHE_SQLITE_PATH is set, in a SQLite
+    file shared by workers and restarts. AI_CACHE_TTL_SECONDS bounds their age; prompt changes
+    change the version so old entries are never hit.
+    """
+
+    def __init__(self, version: str, initial_template: str):
+        self.version = version
+        self.ttl = float(os.environ.get("AI_CACHE_TTL_SECONDS", "86400"))
+        self.memory = TTLCache(int(os.environ.get("AI_CACHE_SIZE", "5000")), self.ttl)
+        prefix, _, suffix = initial_template.partition(STUDENT_NAME_PLACEHOLDER)
+        self.initial_pattern = re.compile(re.escape(prefix) + "(?P<student_name>.+?)" + re.escape(suffix) + "$", re.DOTALL)
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        # Replies not cached because they were specific to the student
+        self.skipped = 0
+
+        self.db = None
+        self.lock = threading.Lock()
+        path = os.environ.get("AI_CACHE_SQLITE_PATH")
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_response_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self.db.commit()
+
+    def key(self, conversation_history: List[dict], conversation: dict,
+            summary: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        Returns (cache key, student name from the opening message or None). summary is the
+        running summary shown before conversation_history, if any.
+        """
+        student_name = None
+        turns = []
+        for i, message in enumerate(conversation_history):
+            content = message["content"]
+            if i == 0 and message["sender_type"] == "admin":
+                match = self.initial_pattern.match(content)
+                if match:
+                    student_name = match.group("student_name")
+                    content = "<initial message>"
+            turns.append([message["sender_type"], normalize_text(content)])
+        material = json.dumps([KEY_FORMAT, self.version, conversation.get("status"), conversation.get("rfa"), summary, turns])
+        return hashlib.sha256(material.encode()).hexdigest(), student_name
+
+    async def get(self, key: str, student_name: Optional[str]) -> Optional[dict]:
+        response = self.memory.get(key)
+        if response is not None:
+            self.memory_hits += 1
+        elif self.db is not None:
+            response = await asyncio.to_thread(self._sqlite_get, key)
+            if response is not None:
+                self.sqlite_hits += 1
+                self.memory.set(key, response)
+        if response is None:
+            self.misses += 1
+            return None
+
+        response = dict(response)
+        if student_name:
+            # The key only has a student name when the opening message was templated, so every
+            # entry under it was stored with the same placeholder
+            response["response_content"] = response["response_content"].replace(
+                STUDENT_NAME_PLACEHOLDER, student_name)
+        return response
+
+    async def set(self, key: str, student_name: Optional[str], response: dict) -> bool:
+        """
+        Cache a reply. Returns False, and caches nothing, if the reply is specific to the student.
+        """
+        response = dict(response)
+        if student_name:
+            content = re.sub(r"\b" + re.escape(student_name) + r"\b", STUDENT_NAME_PLACEHOLDER,
+                             response["response_content"])
+            if self._refers_to_student(content, student_name):
+                self.skipped += 1
+                return False
+            response["response_content"] = content
+        self.memory.set(key, response)
+        if self.db is not None:
+            await asyncio.to_thread(self._sqlite_set, key, response)
+        return True
+
+    @staticmethod
+    def _refers_to_student(content: str, student_name: str) -> bool:
+        # The placeholder itself is fine; any word of the name ("Bob" of "Bob Johnson") isn't
+        content = content.replace(STUDENT_NAME_PLACEHOLDER, " ")
+        words = [word for word in re.findall(r"\w+", student_name) if len(word) > 1]
+        if words and re.search(r"\b(?:" + "|".join(map(re.escape, words)) + r")\b", content, re.IGNORECASE):
+            return True
+        return GENDERED_PRONOUN_PATTERN.search(content) is not None
+
+    def _sqlite_get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT response FROM ai_response_cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _sqlite_set(self, key: str, response: dict):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO ai_response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(response), time.time() + self.ttl))
+            self.db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.sqlite_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": round((self.memory_hits + self.sqlite_hits) / lookups, 3) if lookups else 0.0,
+            "memory_size": len(self.memory.entries),
+        }
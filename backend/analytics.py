@@ -0,0 +1,309 @@
+import asyncio
+import csv
+import io
+import logging
+import os
+import time
+from datetime import date, datetime
+from typing import AsyncIterator, List, Optional
+
+from . import db
+
+logger = logging.getLogger("uvicorn")
+
+# Export columns and their Parquet types, per report
+REPORT_COLUMNS = {
+    # One row per conversation (conversation_outcomes)
+    "conversations": [
+        ("conversation_id", "string"),
+        ("school_id", "string"),
+        ("created_at", "timestamp"),
+        ("student_id", "string"),
+        ("absence_id", "string"),
+        ("status", "string"),
+        ("rfa", "string"),
+        ("recommended_action", "string"),
+        ("escalated", "bool"),
+        ("resolved_at", "timestamp"),
+        ("resolution_seconds", "float"),
+        ("guardian_messages", "int"),
+        ("outbound_messages", "int"),
+        ("delivered", "int"),
+        ("read", "int"),
+        ("failed", "int"),
+        ("unconfirmed", "int"),
+        ("downgraded", "int"),
+        ("awaiting_approval", "int"),
+    ],
+    # One row per day and RFA (conversation_daily_stats)
+    "daily": [
+        ("school_id", "string"),
+        ("day", "date"),
+        ("rfa", "string"),
+        ("conversations", "int"),
+        ("completed", "int"),
+        ("action_needed", "int"),
+        ("escalated", "int"),
+        ("resolved", "int"),
+        ("resolution_seconds_total", "float"),
+        ("responded", "int"),
+        ("outbound_messages", "int"),
+        ("delivered", "int"),
+        ("read", "int"),
+        ("failed", "int"),
+        ("unconfirmed", "int"),
+        ("downgraded", "int"),
+    ],
+}
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def report_pages(report: str, school_id: str, start: date, end: date, page_size: int) -> AsyncIterator[List[dict]]:
+    columns = ", ".join(name for name, _ in REPORT_COLUMNS[report])
+    if report == "conversations":
+        return db.iter_conversation_outcomes(school_id, start, end, columns, page_size)
+    return db.iter_daily_stats(school_id, start, end, columns, page_size)
+
+
+async def with_first_page(pages: AsyncIterator[List[dict]]) -> AsyncIterator[List[dict]]:
+    """
+    Read the first page now, so a failing query is reported before a response starts streaming.
+    Returns an iterator over all the pages.
+    """
+    try:
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def all_pages():
+        if first is not None:
+            yield first
+        async for page in pages:
+            yield page
+    return all_pages()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def csv_chunks(pages: AsyncIterator[List[dict]], report: str):
+    """
+    The header, then one CSV chunk per page of rows.
+    """
+    names = [name for name, _ in REPORT_COLUMNS[report]]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    async for page in pages:
+        writer.writerows([row.get(name) for name in names] for row in page)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class ChunkSink:
+    """
+    Write-only file for pyarrow that hands back what was written since the last take(), so a
+    Parquet file can be streamed a row group at a time.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+async def parquet_chunks(pages: AsyncIterator[List[dict]], report: str):
+    """
+    A Parquet file with one row group per page of rows. Needs pyarrow (optional).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "date": pa.date32(),
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+    }
+    parsers = {"timestamp": _parse_timestamp, "date": _parse_date}
+    columns = REPORT_COLUMNS[report]
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+
+    def write_page(page: List[dict]) -> bytes:
+        arrays = []
+        for name, kind in columns:
+            parse = parsers.get(kind)
+            values = [row.get(name) for row in page]
+            arrays.append(pa.array([parse(value) for value in values] if parse else values, types[kind]))
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        return sink.take()
+
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        async for page in pages:
+            # Encoding and compression are CPU-bound; keep them off the event loop
+            yield await asyncio.to_thread(write_page, page)
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def summarize(rows: List[dict]) -> dict:
+    """
+    Rates and distributions from conversation_analytics_summary's per-RFA totals.
+    """
+    totals = {}
+    for row in rows:
+        for name, value in row.items():
+            if name != "rfa":
+                totals[name] = totals.get(name, 0) + (value or 0)
+
+    def rate(part: str, whole: str) -> Optional[float]:
+        return round(totals[part] / totals[whole], 4) if totals.get(whole) else None
+
+    conversations = totals.get("conversations", 0)
+    resolved = totals.get("resolved", 0)
+    return {
+        "conversations": conversations,
+        "rfa_distribution": {row["rfa"]: row["conversations"] for row in rows},
+        "status": {
+            "completed": totals.get("completed", 0),
+            "action_needed": totals.get("action_needed", 0),
+        },
+        "escalation_rate": rate("escalated", "conversations"),
+        "response_rate": rate("responded", "conversations"),
+        "resolution": {
+            "resolved": resolved,
+            "avg_hours": round(totals["resolution_seconds_total"] / resolved / 3600, 2) if resolved else None,
+        },
+        "delivery": {
+            "outbound_messages": totals.get("outbound_messages", 0),
+            "delivered_rate": rate("delivered", "outbound_messages"),
+            "read_rate": rate("read", "outbound_messages"),
+            "failed": totals.get("failed", 0),
+            "unconfirmed": totals.get("unconfirmed", 0),
+            "downgrade_rate": rate("downgraded", "outbound_messages"),
+        },
+    }
+
+
+class AnalyticsRefreshStats:
+    def __init__(self):
+        self.refreshes = 0
+        self.failures = 0
+        self.conversations_refreshed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_refreshed_at: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "conversations_refreshed": self.conversations_refreshed,
+            "avg_latency_ms": round(1000 * self.total_latency / self.refreshes, 2) if self.refreshes else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency, 2),
+            "last_refreshed_at": self.last_refreshed_at,
+        }
+
+
+class AnalyticsRefresher:
+    """
+    Keeps the reporting rollups current: every ANALYTICS_REFRESH_INTERVAL_SECONDS (0 turns the loop
+    off, e.g. when pg_cron does it), refresh_conversation_analytics() folds in up to
+    ANALYTICS_REFRESH_BATCH changed conversations, repeating while a full batch comes back. Every
+    worker process runs the loop; the database lets one refresh run at a time and the rest return
+    at once.
+    """
+
+    def __init__(self):
+        self.interval = float(os.environ.get("ANALYTICS_REFRESH_INTERVAL_SECONDS", "60"))
+        self.batch_size = int(os.environ.get("ANALYTICS_REFRESH_BATCH", "5000"))
+        self.stats = AnalyticsRefreshStats()
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Analytics refresh failed: {e}")
+
+    async def refresh(self, wait: bool = False) -> int:
+        """
+        Refresh until nothing is queued. Returns how many conversations were refreshed. If
+        another worker is refreshing, this stops at once, or with wait=True (on-demand refreshes
+        that must see every pending change) waits for it and carries on.
+        """
+        async with self.lock:
+            refreshed = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    count = await db.refresh_analytics(self.batch_size, wait)
+                except Exception:
+                    self.stats.failures += 1
+                    raise
+                latency = time.monotonic() - started
+                self.stats.refreshes += 1
+                self.stats.total_latency += latency
+                self.stats.max_latency = max(self.stats.max_latency, latency)
+                self.stats.conversations_refreshed += count
+                refreshed += count
+                if count < self.batch_size:
+                    break
+            self.stats.last_refreshed_at = datetime.now().astimezone().isoformat()
+            return refreshed
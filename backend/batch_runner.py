@@ -0,0 +1,234 @@
+"""
+Daily multi-school outreach without manual uploads. Every *.csv in --input-dir (one file per
+school, same columns as /initiate_conversations) is streamed, and unexplained absences are
+initiated in batches. Schools run concurrently: at most --concurrency batches are in flight
+across all schools and each school waits its turn for a slot (FIFO), so one large district file
+can't starve the others; --school-rate caps absences started per second per school on top of
+the shared Sendblue rate limit.
+
+Re-running for the same date is safe: absences that already have a conversation whose initial
+message went out are skipped, and ones whose send failed are retried. A JSON summary per school
+and one for the whole run are written to --summary-dir/<date>/.
+
+    python -m backend.batch_runner --input-dir attendance/ --summary-dir batch_summaries/
+    python -m backend.batch_runner --input-dir attendance/ --daily-at 08:30   # keep running, once a day
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from .ingest import iter_csv_rows
+from .main import (AUTO_APPROVE, INGEST_BATCH_SIZE, INTERRUPTED_SEND_STATUS, MAX_REPORTED_ROW_ERRORS,
+                   RESEND_STATUSES, SEND_UNCONFIRMED, absence_key, find_initiated_conversations,
+                   initiate_conversations_batch, parse_absence_row, sendblue_client)
+from .sendblue import TokenBucket
+
+
+class LocalFile:
+    """
+    The async read() iter_csv_rows expects, over a file on disk.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+
+    async def read(self, size: int) -> bytes:
+        return await asyncio.to_thread(self.file.read, size)
+
+    def close(self):
+        self.file.close()
+
+
+class SchoolRun:
+    def __init__(self, path: str, rate: float):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.bucket = TokenBucket(rate, max(1, int(rate))) if rate > 0 else None
+        self.school_ids = set()
+        self.counts = {"rows": 0, "valid": 0, "rejected": 0, "unexplained": 0, "other_date": 0,
+                       "already_initiated": 0, "initiated": 0, "unconfirmed": 0, "failed": 0}
+        self.row_errors = []
+        self.failures = []
+        self.started = time.monotonic()
+        self.finished = None
+
+    def summary(self, run_date: date) -> dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        processed = self.counts["initiated"] + self.counts["failed"]
+        return {
+            "school": self.name,
+            "file": self.path,
+            "date": run_date.isoformat(),
+            "school_ids": sorted(self.school_ids),
+            **self.counts,
+            "duration_seconds": round(elapsed, 3),
+            "initiated_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+            "failures": self.failures,
+            "row_errors": self.row_errors,
+        }
+
+
+async def run_batch(school: SchoolRun, absences: List[tuple], slots: asyncio.Semaphore):
+    if school.bucket:
+        for _ in absences:
+            await school.bucket.acquire()
+
+    async with slots:
+        existing = await find_initiated_conversations(absences)
+        to_initiate = []
+        for absence, school_id in absences:
+            found = existing.get(absence_key(absence, school_id))
+            # Interrupted sends go through too, to be marked SEND_UNCONFIRMED
+            if found and found["message"] and found["message"]["status"] not in (
+                    RESEND_STATUSES | {INTERRUPTED_SEND_STATUS}):
+                school.counts["already_initiated"] += 1
+            else:
+                to_initiate.append((absence, school_id))
+
+        try:
+            results = await initiate_conversations_batch(to_initiate, AUTO_APPROVE)
+        except Exception as e:
+            school.counts["failed"] += len(to_initiate)
+            if len(school.failures) < MAX_REPORTED_ROW_ERRORS:
+                school.failures.append({"absences": len(to_initiate), "error": f"{type(e).__name__}: {str(e)}"})
+            return
+
+    for (absence, _), result in zip(to_initiate, results):
+        if result["status"] in RESEND_STATUSES:
+            school.counts["failed"] += 1
+            if len(school.failures) < MAX_REPORTED_ROW_ERRORS:
+                school.failures.append({"student_id": absence.student_id, "message_id": result["message_id"],
+                                        "status": result["status"]})
+        else:
+            school.counts["initiated"] += 1
+            # Sendblue may or may not have it; never resent, so worth a look
+            if result["status"] == SEND_UNCONFIRMED:
+                school.counts["unconfirmed"] += 1
+
+
+async def run_school(school: SchoolRun, run_date: Optional[date], batch_size: int,
+                     slots: asyncio.Semaphore) -> SchoolRun:
+    file = LocalFile(school.path)
+    batch = []
+    try:
+        async for row_number, row in iter_csv_rows(file):
+            school.counts["rows"] += 1
+            try:
+                if "__error__" in row:
+                    raise ValueError(row["__error__"])
+                absence, school_id = parse_absence_row(row)
+            except (KeyError, ValueError) as e:
+                school.counts["rejected"] += 1
+                if len(school.row_errors) < MAX_REPORTED_ROW_ERRORS:
+                    error = f"Missing column {e}" if isinstance(e, KeyError) else str(e)
+                    school.row_errors.append({"row": row_number, "error": error})
+                continue
+            school.counts["valid"] += 1
+            school.school_ids.add(school_id)
+
+            if run_date and absence.date != run_date:
+                school.counts["other_date"] += 1
+                continue
+            if absence.rfa != "Unexplained":
+                continue
+            school.counts["unexplained"] += 1
+            batch.append((absence, school_id))
+            if len(batch) >= batch_size:
+                await run_batch(school, batch, slots)
+                batch = []
+        if batch:
+            await run_batch(school, batch, slots)
+    except UnicodeDecodeError as e:
+        school.row_errors.append(
+            {"row": None, "error": f"File is not valid UTF-8 after {school.counts['rows']} rows: {str(e)}"})
+    finally:
+        file.close()
+        school.finished = time.monotonic()
+    return school
+
+
+def write_summary(path: str, summary: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+async def run(input_dir: str, summary_dir: str, run_date: Optional[date], concurrency: int,
+              batch_size: int, school_rate: float) -> dict:
+    paths = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.lower().endswith(".csv"))
+    schools = [SchoolRun(path, school_rate) for path in paths]
+    slots = asyncio.Semaphore(concurrency)
+    summary_date = run_date or date.today()
+    out_dir = os.path.join(summary_dir, summary_date.isoformat())
+
+    started = time.monotonic()
+    await sendblue_client.start()
+    try:
+        await asyncio.gather(*[run_school(school, run_date, batch_size, slots) for school in schools])
+    finally:
+        await sendblue_client.close()
+    elapsed = time.monotonic() - started
+
+    totals = {}
+    for school in schools:
+        summary = school.summary(summary_date)
+        write_summary(os.path.join(out_dir, f"{school.name}.json"), summary)
+        for key, value in school.counts.items():
+            totals[key] = totals.get(key, 0) + value
+    run_summary = {
+        "date": summary_date.isoformat(),
+        "schools": len(schools),
+        **totals,
+        "duration_seconds": round(elapsed, 3),
+        "initiated_per_second": round((totals.get("initiated", 0) + totals.get("failed", 0)) / elapsed, 2) if elapsed else 0.0,
+        "schools_with_errors": [school.name for school in schools if school.counts["failed"] or school.counts["unconfirmed"] or school.row_errors],
+    }
+    write_summary(os.path.join(out_dir, "run.json"), run_summary)
+    return run_summary
+
+
+def seconds_until(at: str) -> float:
+    hour, minute = (int(part) for part in at.split(":"))
+    now = datetime.now()
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_daily(args):
+    while True:
+        await asyncio.sleep(seconds_until(args.daily_at))
+        summary = await run(args.input_dir, args.summary_dir, date.today(), args.concurrency,
+                            args.batch_size, args.school_rate)
+        print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Initiate conversations for every school's attendance file")
+    parser.add_argument("--input-dir", required=True, help="directory of per-school attendance CSVs")
+    parser.add_argument("--summary-dir", default="batch_summaries")
+    parser.add_argument("--date", type=date.fromisoformat,
+                        help="only absences on this date (default: every row; --daily-at uses today)")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", "4")),
+                        help="batches in flight across all schools")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--school-rate", type=float, default=float(os.environ.get("BATCH_SCHOOL_RATE", "0")),
+                        help="max absences started per second per school (0 = no per-school limit)")
+    parser.add_argument("--daily-at", help="HH:MM local time; keep running and process the directory once a day")
+    args = parser.parse_args()
+
+    if args.daily_at:
+        asyncio.run(run_daily(args))
+    else:
+        summary = asyncio.run(run(args.input_dir, args.summary_dir, args.date, args.concurrency,
+                                  args.batch_size, args.school_rate))
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
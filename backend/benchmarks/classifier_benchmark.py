@@ -0,0 +1,107 @@
+"""
+Benchmark for the offline fast-path classifier (backend/classifier.py).
+
+Runs a labelled sample of guardian replies through classify_text and reports, as JSON, how many
+LLM calls the fast path avoids, how often its answer matches the label, its own latency, and the
+model latency saved at a given per-call LLM latency (take avg_latency_ms from /ai_stats).
+
+    python -m backend.benchmarks.classifier_benchmark --llm-latency-ms 2500
+"""
+import argparse
+import json
+import time
+
+from ..classifier import classify_text
+
+# (guardian text, expected rfa when the fast path should answer, or None when it should defer)
+SAMPLES = [
+    ("He's sick", "Excused - Sick"),
+    ("sick", "Excused - Sick"),
+    ("Sick today.", "Excused - Sick"),
+    ("She has a fever since last night", "Excused - Sick"),
+    ("he was throwing up all night", "Excused - Sick"),
+    ("Stomach bug, sorry!", "Excused - Sick"),
+    ("she tested positive for covid", "Excused - Sick"),
+    ("Not feeling well today", "Excused - Sick"),
+    ("He was ill yesterday", "Excused - Sick"),
+    ("He had a dentist appointment", "Excused - appointment"),
+    ("orthodontist appt this morning", "Excused - appointment"),
+    ("Doctor's appointment", "Excused - appointment"),
+    ("annual check-up at the pediatrician", "Excused - appointment"),
+    ("She had therapy this morning", "Excused - Therapy or counseling appointment"),
+    ("appointment with her counselor", "Excused - Therapy or counseling appointment"),
+    ("We were at my grandfather's funeral", "Excused - Bereavement"),
+    ("family emergency, sorry", "Excused - Family emergency"),
+    ("It was Yom Kippur", "Excused - Religious observance"),
+    ("we're traveling this week", "Excused - Travel"),
+    ("we are out of town", "Excused - Travel"),
+    ("on vacation with family", "Unexcused - Family vacation (non-approved)"),
+    ("he overslept", "Unexcused - Overslept"),
+    ("Missed the bus and I couldn't drive him", "Unexcused - Transportation issues"),
+    ("our car broke down", "Unexcused - Transportation issues"),
+    ("college visit at UCLA", "Excused - College visit"),
+    ("mental health day", "Excused - Mental health day"),
+    # Should go to the LLM
+    ("He's not sick, he just refused to go", None),
+    ("She's sick, does she need a doctor's note?", None),
+    ("What? She was at school today", None),
+    ("Who is this?", None),
+    ("ok", None),
+    ("I'll call the office", None),
+    ("Ill call the office", None),
+    ("ill bring a note tomorrow", None),
+    ("sorry ill explain later", None),
+    ("He is sick of school so he stayed home", None),
+    ("she's sick and tired of the bullying", None),
+    ("Sick and then we had a dentist appointment after", None),
+    ("Thanks", None),
+    ("it's complicated, can someone call me", None),
+    ("We're dealing with some things at home right now", None),
+]
+
+
+def run(llm_latency_ms: float, repeat: int) -> dict:
+    classified = correct = 0
+    misclassified = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text, expected in SAMPLES:
+            classify_text(text)
+    classifier_seconds = time.perf_counter() - started
+
+    for text, expected in SAMPLES:
+        result = classify_text(text)
+        if result:
+            classified += 1
+            if result.rfa == expected:
+                correct += 1
+            else:
+                misclassified.append({"text": text, "expected": expected, "got": result.rfa})
+
+    should_classify = sum(1 for _, expected in SAMPLES if expected)
+    calls = len(SAMPLES) * repeat
+    return {
+        "samples": len(SAMPLES),
+        "classified": classified,
+        "llm_call_avoidance_rate": round(classified / len(SAMPLES), 3),
+        "precision": round(correct / classified, 3) if classified else 0.0,
+        "recall": round(correct / should_classify, 3) if should_classify else 0.0,
+        "misclassified": misclassified,
+        "classifier_latency_us": round(1e6 * classifier_seconds / calls, 2),
+        "assumed_llm_latency_ms": llm_latency_ms,
+        "latency_saved_ms_per_message": round(llm_latency_ms * classified / len(SAMPLES), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--llm-latency-ms", type=float, default=2500.0,
+                        help="Average LLM call latency to credit per avoided call")
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="Times to run the sample set when timing the classifier")
+    args = parser.parse_args()
+    print(json.dumps(run(args.llm_latency_ms, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Local stand-ins for the external services backend/main.py talks to, for benchmarks:
+
+- FakeSupabase: an in-memory, thread-safe subset of the supabase-py / PostgREST query builder
+  (the calls backend/db.py makes), with a per-call latency and call counts.
+- sendblue_transport: an httpx transport answering /send-message with configurable latency and
+  error rate, optionally replaying QUEUED -> SENT -> DELIVERED status callbacks into the app.
+- openai_transport: an httpx transport answering chat completions with canned
+  AIResponseSchema JSON.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+# Embedded selects, e.g. conversations?select=id,messages(id,status): child table -> foreign key
+EMBEDDED_FOREIGN_KEYS = {("conversations", "messages"): "conversation_id"}
+
+
+class FakeResult:
+    def __init__(self, data: List[dict]):
+        self.data = data
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _or_condition(condition: str) -> Callable[[dict], bool]:
+    # PostgREST "column.op.value" or "and(...)" as used in .or_() filters
+    if condition.startswith("and(") and condition.endswith(")"):
+        conditions = [_or_condition(part) for part in _split_top_level(condition[len("and("):-1])]
+        return lambda row: all(test(row) for test in conditions)
+    column, _, rest = condition.partition(".")
+    negate = rest.startswith("not.")
+    if negate:
+        rest = rest[len("not."):]
+    op, _, value = rest.partition(".")
+    value = value.strip('"')
+    if op == "is" and value == "null":
+        test = lambda row: row.get(column) is None
+    elif op == "in":
+        values = set(_split_top_level(value.strip("()")))
+        test = lambda row: row.get(column) in values
+    elif op == "eq":
+        test = lambda row: str(row.get(column)) == value
+    elif op == "gt":
+        test = lambda row: row.get(column) is not None and str(row.get(column)) > value
+    elif op == "lt":
+        test = lambda row: row.get(column) is not None and str(row.get(column)) < value
+    else:
+        raise NotImplementedError(f"or_ operator {op}")
+    if negate:
+        # SQL NOT IN is unknown for null
+        return lambda row: row.get(column) is not None and not test(row)
+    return test
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.filters: List[Callable[[dict], bool]] = []
+        self.orderings = []
+        # Orderings of embedded tables, e.g. .order("created_at", foreign_table="messages")
+        self.embedded_orderings: Dict[str, list] = {}
+        self.row_limit = None
+
+    def select(self, columns: str = "*", **kwargs):
+        self.columns = columns
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.operation, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", ignore_duplicates: bool = False, **kwargs):
+        self.operation, self.payload = "upsert", rows
+        self.on_conflict = [column.strip() for column in on_conflict.split(",")]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data: dict, **kwargs):
+        self.operation, self.payload = "update", data
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def lt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def or_(self, filters: str):
+        conditions = [_or_condition(condition) for condition in _split_top_level(filters)]
+        self.filters.append(lambda row: any(condition(row) for condition in conditions))
+        return self
+
+    def order(self, column: str, desc: bool = False, foreign_table: Optional[str] = None, **kwargs):
+        if foreign_table:
+            self.embedded_orderings.setdefault(foreign_table, []).append((column, desc))
+        else:
+            self.orderings.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def execute(self) -> FakeResult:
+        return self.db.execute(self)
+
+
+class FakeRpc:
+    def __init__(self, db: "FakeSupabase", name: str, params: dict):
+        self.db = db
+        self.name = name
+        self.params = params or {}
+
+    def execute(self) -> FakeResult:
+        if self.db.latency:
+            time.sleep(self.db.latency)
+        with self.db.lock:
+            self.db.calls[f"rpc.{self.name}"] += 1
+            return FakeResult(self.db.functions[self.name](self.params))
+
+
+class FakeSupabase:
+    """
+    Tables are dicts of id -> row. Every execute() sleeps latency seconds (on the caller's
+    thread, i.e. the DB thread pool) to stand in for the PostgREST round trip. Database
+    functions called with rpc() are looked up in functions (name -> params -> data). max_rows
+    caps every select, like PostgREST's db-max-rows.
+    """
+
+    def __init__(self, latency: float = 0.0, max_rows: Optional[int] = None):
+        self.latency = latency
+        self.max_rows = max_rows
+        self.tables: Dict[str, Dict[str, dict]] = {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        # The analytics rollups aren't modelled; their refresh has nothing to do
+        self.functions: Dict[str, Callable[[dict], object]] = {
+            "refresh_conversation_analytics": lambda params: 0,
+            "refresh_conversation_analytics_blocking": lambda params: 0,
+        }
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def reset_counts(self):
+        self.calls.clear()
+
+    def rows(self, table: str) -> Dict[str, dict]:
+        return self.tables.setdefault(table, {})
+
+    def seed(self, table: str, rows: List[dict]) -> List[dict]:
+        with self.lock:
+            return [self._insert(table, row) for row in rows]
+
+    def execute(self, query: FakeQuery) -> FakeResult:
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls[f"{query.table}.{query.operation}"] += 1
+            if query.operation == "select":
+                data = [self._project(query.table, row, query.columns, query.embedded_orderings)
+                        for row in self._select(query)]
+            elif query.operation == "insert":
+                data = [self._insert(query.table, row) for row in _as_list(query.payload)]
+            elif query.operation == "upsert":
+                data = [row for row in (self._upsert(query, row) for row in _as_list(query.payload)) if row]
+            elif query.operation == "delete":
+                data = [self.rows(query.table).pop(row["id"]) for row in self._select(query)]
+            else:
+                data = []
+                for row in self._select(query):
+                    row.update(query.payload)
+                    data.append(dict(row))
+            return FakeResult(data)
+
+    def _select(self, query: FakeQuery) -> List[dict]:
+        rows = [row for row in self.rows(query.table).values() if all(test(row) for test in query.filters)]
+        rows = _ordered(rows, query.orderings)
+        if query.row_limit is not None:
+            rows = rows[:query.row_limit]
+        if self.max_rows is not None and query.operation == "select":
+            rows = rows[:self.max_rows]
+        return rows
+
+    def _insert(self, table: str, row: dict) -> dict:
+        row = {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat(), **row}
+        self.rows(table)[row["id"]] = row
+        return dict(row)
+
+    def _upsert(self, query: FakeQuery, row: dict) -> Optional[dict]:
+        if query.on_conflict == ["id"]:
+            existing = self.rows(query.table).get(row.get("id"))
+        elif any(row.get(column) is None for column in query.on_conflict):
+            # NULLs never conflict under a unique constraint
+            existing = None
+        else:
+            key = tuple(row.get(column) for column in query.on_conflict)
+            existing = next((
+                candidate for candidate in self.rows(query.table).values()
+                if tuple(candidate.get(column) for column in query.on_conflict) == key), None)
+        if existing is None:
+            return self._insert(query.table, row)
+        if query.ignore_duplicates:
+            return None
+        existing.update(row)
+        return dict(existing)
+
+    def _project(self, table: str, row: dict, columns: str, embedded_orderings: Optional[dict] = None) -> dict:
+        if columns.strip() == "*":
+            return dict(row)
+        projected = {}
+        for column in _split_top_level(columns):
+            match = re.fullmatch(r"(\w+)\((.*)\)", column)
+            if match:
+                child, child_columns = match.groups()
+                foreign_key = EMBEDDED_FOREIGN_KEYS[(table, child)]
+                child_rows = [child_row for child_row in self.rows(child).values()
+                              if child_row.get(foreign_key) == row["id"]]
+                projected[child] = [
+                    self._project(child, child_row, child_columns)
+                    for child_row in _ordered(child_rows, (embedded_orderings or {}).get(child, []))
+                ]
+            else:
+                projected[column] = row.get(column)
+        return projected
+
+
+def _ordered(rows: List[dict], orderings: list) -> List[dict]:
+    # Stable sorts, last key first, give a multi-column order
+    for column, desc in reversed(orderings):
+        rows.sort(key=lambda row: row.get(column) or "", reverse=desc)
+    return rows
+
+
+def _as_list(rows) -> List[dict]:
+    return rows if isinstance(rows, list) else [rows]
+
+
+class ServiceCounters:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.callbacks = 0
+
+
+def sendblue_transport(counters: ServiceCounters, latency: float, error_rate: float,
+                       post_callback: Optional[Callable[[dict], "asyncio.Future"]] = None,
+                       callback_delay: float = 0.05) -> httpx.MockTransport:
+    """
+    Answers /send-message like Sendblue. With post_callback, each accepted send is followed by
+    QUEUED, SENT and DELIVERED status callbacks spaced callback_delay apart.
+    """
+    pending = set()
+
+    async def replay_callbacks(message_handle: str):
+        for status in ("QUEUED", "SENT", "DELIVERED"):
+            await asyncio.sleep(callback_delay)
+            counters.callbacks += 1
+            await post_callback({"message_handle": message_handle, "status": status, "was_downgraded": False})
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        counters.calls += 1
+        await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            counters.errors += 1
+            return httpx.Response(500, json={"error": "injected failure"})
+        message_handle = str(uuid.uuid4())
+        if post_callback:
+            task = asyncio.create_task(replay_callbacks(message_handle))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        return httpx.Response(200, json={
+            "status": "QUEUED",
+            "message_handle": message_handle,
+            "was_downgraded": False,
+        })
+
+    return httpx.MockTransport(handler)
+
+
+CANNED_AI_RESPONSE = {
+    "rfa": None,
+    "conversation_status": "in_progress",
+    "recommended_action": None,
+    "response_content": "Thanks for getting back to us. Could you tell us a bit more about why they were out?",
+}
+
+
+def openai_transport(counters: ServiceCounters, latency: float,
+                     response: Optional[dict] = None) -> httpx.MockTransport:
+    """
+    Answers /chat/completions with a canned AIResponseSchema as the message content.
+    """
+    content = json.dumps(response or CANNED_AI_RESPONSE)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        counters.calls += 1
+        await asyncio.sleep(latency)
+        body = json.loads(request.content)
+        prompt_tokens = sum(len(message.get("content") or "") for message in body["messages"]) // 4
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4,
+            },
+        })
+
+    return httpx.MockTransport(handler)
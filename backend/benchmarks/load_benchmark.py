@@ -0,0 +1,332 @@
+"""
+Load benchmark for the FastAPI app (backend/main.py) against local fakes for Supabase, Sendblue
+and OpenAI (backend/benchmarks/fakes.py), so changes can be measured without calling paid
+services. Scenarios:
+
+- csv_upload: POST a --rows absence CSV to /initiate_conversations and wait for the job queue
+  to send every initial message.
+- inbound_webhooks: --webhooks guardians reply at once on /process_response; waits for every
+  debounced evaluation to finish.
+- callback_storm: QUEUED/SENT/DELIVERED callbacks for --callbacks messages, shuffled, on
+  /sendblue_status_callback; waits for the bulk flush and checks no status regressed.
+
+Prints one JSON document with throughput, p50/p95/p99 request latency and DB/API call counts
+per request for each scenario:
+
+    python -m backend.benchmarks.load_benchmark --scenario all --rows 10000 --webhooks 500
+
+Service latencies and error rates are flags; the app's own knobs (SENDBLUE_RATE_PER_SECOND,
+JOB_WORKERS, DB_MAX_THREADS, ...) are read from the environment as usual.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date
+from typing import Callable, List
+
+# The app reads its configuration at import time
+_job_db = tempfile.NamedTemporaryFile(prefix="bench_jobs_", suffix=".db", delete=False)
+for name, value in {
+    "SUPABASE_URL": "http://supabase.bench",
+    "SUPABASE_ANON_KEY": "bench",
+    "OPENAI_API_KEY": "sk-bench",
+    "SENDBLUE_BASE_URL": "http://sendblue.bench",
+    "SENDBLUE_API_KEY": "bench",
+    "SENDBLUE_API_SECRET": "bench",
+    "NGROK_BASE_URL": "http://app.bench",
+    "JOB_STORE": "sqlite",
+    "JOB_SQLITE_PATH": _job_db.name,
+    "SENDBLUE_RATE_PER_SECOND": "1000",
+    "SENDBLUE_BURST": "100",
+    "RESPONSE_DEBOUNCE_SECONDS": "0.5",
+    "STATUS_FLUSH_INTERVAL_SECONDS": "0.2",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+from .. import db, main  # noqa: E402
+from .fakes import FakeSupabase, ServiceCounters, openai_transport, sendblue_transport  # noqa: E402
+
+GUARDIAN_REPLIES = [
+    "He's sick",
+    "sick today",
+    "She had a dentist appointment",
+    "Who is this?",
+    "it's complicated, can someone call me",
+    "We're dealing with some things at home right now",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    return {
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+        "max_ms": round(1000 * max(latencies), 2) if latencies else 0.0,
+        "mean_ms": round(1000 * statistics.fmean(latencies), 2) if latencies else 0.0,
+    }
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.fake_db = FakeSupabase(latency=args.db_latency_ms / 1000)
+        self.sendblue = ServiceCounters()
+        self.openai = ServiceCounters()
+        self.client: httpx.AsyncClient = None
+
+    def install(self):
+        db.supabase = self.fake_db
+        for cache in (db.guardians_by_phone, db.guardians_by_id, db.conversations_by_id, db.latest_conversation_ids):
+            cache.clear()
+        main.llm_client.client = AsyncOpenAI(
+            api_key="sk-bench", max_retries=0,
+            http_client=httpx.AsyncClient(transport=openai_transport(self.openai, self.args.openai_latency_ms / 1000)))
+        main.sendblue_client.http = httpx.AsyncClient(
+            base_url=os.environ["SENDBLUE_BASE_URL"],
+            transport=sendblue_transport(
+                self.sendblue, self.args.sendblue_latency_ms / 1000, self.args.sendblue_error_rate,
+                post_callback=self.post_callback if self.args.sendblue_callbacks else None))
+
+    async def post_callback(self, payload: dict):
+        await self.client.post("/sendblue_status_callback", json=payload)
+
+    def snapshot(self) -> dict:
+        return {
+            "db": sum(self.fake_db.calls.values()),
+            "db_by_call": dict(self.fake_db.calls),
+            "sendblue": self.sendblue.calls,
+            "sendblue_errors": self.sendblue.errors,
+            "openai": self.openai.calls,
+        }
+
+    async def drive(self, requests: List[Callable], concurrency: int) -> List[float]:
+        """
+        Issue requests with at most concurrency in flight. Returns per-request latencies.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(request: Callable):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await request()
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        await asyncio.gather(*(one(request) for request in requests))
+        return latencies
+
+    async def wait_for_jobs(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with sqlite3.connect(os.environ["JOB_SQLITE_PATH"]) as conn:
+                (outstanding,) = conn.execute(
+                    "SELECT COUNT(*) FROM outbound_jobs WHERE status IN ('queued', 'running')").fetchone()
+            if not outstanding:
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    def report(self, scenario: str, requests: int, latencies: List[float], elapsed: float,
+               drained_elapsed: float, before: dict, extra: dict = None) -> dict:
+        after = self.snapshot()
+        db_calls = after["db"] - before["db"]
+        db_by_call = {
+            call: count - before["db_by_call"].get(call, 0)
+            for call, count in after["db_by_call"].items()
+            if count - before["db_by_call"].get(call, 0)
+        }
+        return {
+            "scenario": scenario,
+            "requests": requests,
+            "request_seconds": round(elapsed, 3),
+            "requests_per_second": round(requests / elapsed, 1) if elapsed else 0.0,
+            "completed_seconds": round(drained_elapsed, 3),
+            "completed_per_second": round(requests / drained_elapsed, 1) if drained_elapsed else 0.0,
+            "latency": latency_summary(latencies),
+            "db_calls": db_calls,
+            "db_calls_per_request": round(db_calls / requests, 2) if requests else 0.0,
+            "db_calls_by_type": db_by_call,
+            "sendblue_calls": after["sendblue"] - before["sendblue"],
+            "sendblue_errors": after["sendblue_errors"] - before["sendblue_errors"],
+            "openai_calls": after["openai"] - before["openai"],
+            **(extra or {}),
+        }
+
+    async def csv_upload(self) -> dict:
+        rows = self.args.rows
+        school_ids = [f"school-{i}" for i in range(self.args.schools)]
+        csv = io.StringIO()
+        csv.write("school_id,student_id,student_name,date,rfa,guardian_name,guardian_phone\n")
+        for i in range(rows):
+            # One in ten absences already has a reason and is skipped
+            rfa = "Excused - Sick" if i % 10 == 0 else "Unexplained"
+            csv.write(f"{school_ids[i % len(school_ids)]},S{i},Student {i},{date.today()},{rfa},"
+                      f"Guardian {i},1555{i:07d}\n")
+        body = csv.getvalue().encode()
+
+        before = self.snapshot()
+        started = time.perf_counter()
+        response = await self.client.post(
+            "/initiate_conversations", params={"stream": "true"}, files={"file": ("absences.csv", body, "text/csv")})
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        upload = response.json()
+        drained = await self.wait_for_jobs(self.args.timeout)
+        drained_elapsed = time.perf_counter() - started
+        return self.report("csv_upload", rows, [elapsed], elapsed, drained_elapsed, before, {
+            "csv_bytes": len(body),
+            "enqueued": upload["enqueued"],
+            "rejected": upload["rejected"],
+            "drained": drained,
+            "sent_messages": sum(
+                1 for row in self.fake_db.rows("messages").values() if row.get("sendblue_message_handle")),
+        })
+
+    async def inbound_webhooks(self) -> dict:
+        count = self.args.webhooks
+        guardians = self.fake_db.seed("guardians", [
+            {"school_id": "school-bench", "phone_number": f"1666{i:07d}", "first_name": "Guardian", "last_name": str(i)}
+            for i in range(count)
+        ])
+        conversations = self.fake_db.seed("conversations", [
+            {"guardian_id": guardian["id"], "school_id": "school-bench", "student_id": f"W{i}", "absence_id": f"W{i}",
+             "topic": "absence", "status": "in_progress", "rfa": None, "recommended_action": None}
+            for i, guardian in enumerate(guardians)
+        ])
+        self.fake_db.seed("messages", [
+            {"conversation_id": conversation["id"], "sender_type": "admin", "status": "DELIVERED",
+             "content": main.INITIAL_MESSAGE_TEMPLATE.format(student_name=f"Student W{i}"),
+             "sendblue_message_handle": f"seed-{i}", "was_downgraded": False}
+            for i, conversation in enumerate(conversations)
+        ])
+
+        payloads = [{
+            "from_number": "+" + guardian["phone_number"],
+            "to_number": "+15550000000",
+            "content": GUARDIAN_REPLIES[i % len(GUARDIAN_REPLIES)],
+            "message_handle": f"inbound-{i}",
+        } for i, guardian in enumerate(guardians)]
+
+        before = self.snapshot()
+        started = time.perf_counter()
+        latencies = await self.drive(
+            [lambda payload=payload: self.client.post("/process_response", json=payload) for payload in payloads],
+            self.args.concurrency)
+        elapsed = time.perf_counter() - started
+        drained = await self.wait_for_jobs(self.args.timeout)
+        drained_elapsed = time.perf_counter() - started
+        return self.report("inbound_webhooks", count, latencies, elapsed, drained_elapsed, before, {
+            "drained": drained,
+            "inbound_stats": main.inbound_stats.as_dict(),
+            "ai_stats": {
+                "fast_path": main.fast_path_stats.as_dict(),
+                "response_cache": main.ai_response_cache.stats(),
+            },
+        })
+
+    async def callback_storm(self) -> dict:
+        count = self.args.callbacks
+        handles = [f"storm-{i}" for i in range(count)]
+        self.fake_db.seed("messages", [
+            {"conversation_id": None, "sender_type": "admin", "status": "SENDING", "content": "storm",
+             "sendblue_message_handle": handle, "was_downgraded": None}
+            for handle in handles
+        ])
+        callbacks = [
+            {"message_handle": handle, "status": status, "was_downgraded": False}
+            for handle in handles for status in ("QUEUED", "SENT", "DELIVERED")
+        ]
+        random.shuffle(callbacks)
+
+        before = self.snapshot()
+        started = time.perf_counter()
+        latencies = await self.drive(
+            [lambda payload=payload: self.client.post("/sendblue_status_callback", json=payload) for payload in callbacks],
+            self.args.concurrency)
+        elapsed = time.perf_counter() - started
+        await main.status_callbacks.flush()
+        drained_elapsed = time.perf_counter() - started
+
+        wanted = set(handles)
+        delivered = sum(
+            1 for row in self.fake_db.rows("messages").values()
+            if row.get("sendblue_message_handle") in wanted and row["status"] == "DELIVERED")
+        return self.report("callback_storm", len(callbacks), latencies, elapsed, drained_elapsed, before, {
+            "messages": count,
+            "final_status_delivered": delivered,
+            "status_callback_stats": main.status_callbacks.stats.as_dict(),
+        })
+
+
+SCENARIOS = ["csv_upload", "inbound_webhooks", "callback_storm"]
+
+
+async def run(args) -> dict:
+    harness = Harness(args)
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        harness.install()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                     base_url="http://app.bench", timeout=None) as client:
+            harness.client = client
+            for scenario in (SCENARIOS if args.scenario == "all" else [args.scenario]):
+                results.append(await getattr(harness, scenario)())
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": results,
+        "sendblue_stats": main.sendblue_client.stats.as_dict(),
+        "llm_stats": main.llm_client.stats.as_dict(),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="all")
+    parser.add_argument("--rows", type=int, default=10000, help="CSV rows for csv_upload")
+    parser.add_argument("--schools", type=int, default=10, help="schools the CSV rows are spread over")
+    parser.add_argument("--webhooks", type=int, default=500, help="guardian replies for inbound_webhooks")
+    parser.add_argument("--callbacks", type=int, default=2000, help="messages for callback_storm (3 callbacks each)")
+    parser.add_argument("--concurrency", type=int, default=500, help="requests in flight at once")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--sendblue-latency-ms", type=float, default=150.0)
+    parser.add_argument("--sendblue-error-rate", type=float, default=0.0)
+    parser.add_argument("--sendblue-callbacks", action="store_true",
+                        help="replay QUEUED/SENT/DELIVERED callbacks for every send")
+    parser.add_argument("--openai-latency-ms", type=float, default=800.0)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for queued work")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(_job_db.name + suffix):
+                os.unlink(_job_db.name + suffix)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,139 @@
+"""
+Cold-start benchmark for the backend: each run is a fresh interpreter that imports backend.main,
+runs the app's startup, and makes its first requests against the local fakes
+(backend/benchmarks/fakes.py), so nothing needs credentials or a network. Reports, per phase:
+
+- import: `import backend.main`
+- startup: the lifespan's startup half (server can take traffic after this)
+- first_request: the first GET / (liveness)
+- ready: from the end of startup until GET /ready first returns 200, i.e. the background client
+  warm-up is done
+
+plus which heavy packages were already imported after `import backend.main`, and (with
+--importtime) the slowest modules from python -X importtime:
+
+    python -m backend.benchmarks.startup_benchmark --runs 5 --importtime
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Packages that should not be loaded until a client is first needed
+DEFERRED_PACKAGES = ("openai", "supabase", "uvicorn")
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    for name, value in {
+        "SUPABASE_URL": "http://supabase.bench",
+        "SUPABASE_ANON_KEY": "bench",
+        "OPENAI_API_KEY": "sk-bench",
+        "SENDBLUE_BASE_URL": "http://sendblue.bench",
+        "SENDBLUE_API_KEY": "bench",
+        "SENDBLUE_API_SECRET": "bench",
+        "JOB_STORE": "sqlite",
+    }.items():
+        env.setdefault(name, value)
+    return env
+
+
+async def measure_startup(main, fake_db) -> dict:
+    import httpx
+
+    from .. import db
+
+    timings = {}
+    db.supabase = fake_db
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app.bench") as client:
+        started = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            timings["startup"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = await client.get("/")
+            response.raise_for_status()
+            timings["first_request"] = time.perf_counter() - started
+
+            while (await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.005)
+            timings["ready"] = time.perf_counter() - started
+    return timings
+
+
+def run_child():
+    """
+    One measurement, in this (fresh) process. Prints a JSON line.
+    """
+    started = time.perf_counter()
+    from .. import main
+    import_seconds = time.perf_counter() - started
+    loaded = [name for name in DEFERRED_PACKAGES if name in sys.modules]
+
+    from .fakes import FakeSupabase
+    timings = asyncio.run(measure_startup(main, FakeSupabase()))
+    print(json.dumps({"import": import_seconds, **timings, "loaded_at_import": loaded}))
+
+
+def spawn(args: list, env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    result = spawn(["-X", "importtime", "-c", "import backend.main"], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "median_ms": round(1000 * statistics.median(values), 1),
+        "max_ms": round(1000 * max(values), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend cold start and first-request latency")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    env = child_env()
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="startup_bench_") as directory:
+        env["JOB_SQLITE_PATH"] = os.path.join(directory, "jobs.db")
+        for _ in range(args.runs):
+            result = spawn(["-m", "backend.benchmarks.startup_benchmark", "--child"], env)
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        report = {
+            "runs": args.runs,
+            **{phase: summarize([run[phase] for run in runs])
+               for phase in ("import", "startup", "first_request", "ready")},
+            "loaded_at_import": sorted({name for run in runs for name in run["loaded_at_import"]}),
+        }
+        if args.importtime:
+            report["slowest_imports"] = slowest_imports(env, args.top)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
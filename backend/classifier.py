@@ -0,0 +1,163 @@
+import os
+import re
+import time
+from typing import List, Optional
+
+# Offline fast path for guardian replies that are obvious ("she's sick", "dentist appointment").
+# Confident matches get an RFA and a templated reply without calling the LLM; anything
+# ambiguous returns None and goes to GPT as before.
+
+MIN_CONFIDENCE = float(os.environ.get("FAST_PATH_MIN_CONFIDENCE", "0.8"))
+
+# Longer texts usually carry more than one fact or a question for the school
+MAX_FAST_PATH_CHARS = 240
+
+NEGATION = re.compile(r"\b(not|isn'?t|wasn'?t|no|never|didn'?t|doesn'?t|won'?t)\W+(?:\w+\W+)?$")
+
+
+class Rule:
+    def __init__(self, rfa: str, patterns: List[str], label: str, confidence: float = 0.9,
+                 escalate: bool = False, overrides: tuple = ()):
+        self.rfa = rfa
+        self.pattern = re.compile(r"\b(?:" + "|".join(patterns) + r")\b", re.IGNORECASE)
+        self.label = label
+        self.confidence = confidence
+        # Clear reason, but excused vs unexcused is the attendance officer's call
+        self.escalate = escalate
+        # Less specific rules this one wins over (e.g. therapy over a generic appointment)
+        self.overrides = overrides
+
+
+RULES = [
+    Rule("Excused - Sick", [
+        # "sick of" is an idiom, and texts often spell "I'll" as "ill", so "ill" needs a verb before it
+        r"sick(?! of\b| and tired\b)", r"(?:is|was|been|be|feeling|felt|fell|got|getting|very|really) ill",
+        r"fever", r"flu", r"a cold", r"cough(?:ing)?", r"vomit(?:ing|ed)?", r"throwing up", r"threw up",
+        r"stomach (?:ache|bug|flu)", r"stomachache", r"headache", r"migraine", r"covid", r"strep",
+        r"not feeling (?:well|good)", r"under the weather", r"diarrh?ea", r"ear infection",
+    ], "illness"),
+    Rule("Excused - appointment", [
+        r"dentist", r"dental", r"orthodontist", r"doctor'?s? appointment", r"dr\.? appointment",
+        r"appointment", r"appt", r"check-?up", r"physical exam",
+    ], "an appointment"),
+    Rule("Excused - Therapy or counseling appointment", [
+        r"therapy", r"therapist", r"counsel(?:l)?ing", r"counsel(?:l)?or", r"psychologist", r"psychiatrist",
+    ], "a counseling appointment", overrides=("Excused - appointment",)),
+    Rule("Excused - Bereavement", [
+        r"funeral", r"passed away", r"memorial service",
+    ], "a bereavement", confidence=0.85),
+    Rule("Excused - Family emergency", [
+        r"family emergency",
+    ], "a family emergency", confidence=0.85),
+    Rule("Excused - Religious observance", [
+        r"religious", r"yom kippur", r"rosh hashanah", r"eid", r"good friday", r"ash wednesday", r"passover",
+    ], "a religious observance", confidence=0.85),
+    Rule("Excused - College visit", [
+        r"college visit", r"campus (?:visit|tour)", r"visiting (?:a )?colleges?",
+    ], "a college visit"),
+    Rule("Excused - Mental health day", [
+        r"mental health day", r"mental health",
+    ], "a mental health day", confidence=0.85),
+    Rule("Excused - Travel", [
+        r"travel(?:l)?ing", r"out of town", r"on a trip", r"flight",
+    ], "travel", escalate=True),
+    Rule("Unexcused - Family vacation (non-approved)", [
+        r"vacation", r"holiday trip",
+    ], "a family vacation", escalate=True),
+    Rule("Unexcused - Overslept", [
+        r"overslept", r"slept in", r"woke up late", r"alarm (?:didn'?t|did not) go off",
+    ], "oversleeping", escalate=True),
+    Rule("Unexcused - Transportation issues", [
+        r"missed the bus", r"car (?:broke|trouble|wouldn'?t start)", r"no ride", r"flat tire",
+        r"bus (?:didn'?t|never) (?:come|show)",
+    ], "transportation issues", escalate=True),
+]
+
+COMPLETED_TEMPLATE = "Thank you for letting us know! We've noted that the absence was due to {label}. Please reach out if there's anything we can do to help."
+SICK_TEMPLATE = "Thank you for letting us know, we hope they feel better soon! We've noted the absence as due to illness. Please reach out if there's anything we can do to help."
+ESCALATE_TEMPLATE = "Thanks for letting us know. I'll pass this along to the attendance officer, and they'll be in touch soon if anything else is needed."
+
+
+class FastPathResult:
+    def __init__(self, rfa: str, confidence: float, escalate: bool, response_content: str):
+        self.rfa = rfa
+        self.confidence = confidence
+        self.escalate = escalate
+        self.response_content = response_content
+
+
+class FastPathStats:
+    def __init__(self):
+        self.classified = 0
+        self.deferred = 0
+        self.total_latency = 0.0
+
+    def as_dict(self) -> dict:
+        attempts = self.classified + self.deferred
+        return {
+            "classified": self.classified,
+            "deferred_to_llm": self.deferred,
+            "llm_call_avoidance_rate": round(self.classified / attempts, 3) if attempts else 0.0,
+            "avg_latency_us": round(1e6 * self.total_latency / attempts, 1) if attempts else 0.0,
+        }
+
+
+stats = FastPathStats()
+
+
+def _matches(rule: Rule, text: str) -> bool:
+    for match in rule.pattern.finditer(text):
+        # "he's not sick, he ..." must not classify as sick
+        if not NEGATION.search(text[max(0, match.start() - 20):match.start()]):
+            return True
+    return False
+
+
+def classify_text(text: str) -> Optional[FastPathResult]:
+    """
+    Classify guardian text onto an AIResponseSchema.rfa literal. Returns None unless exactly one
+    reason is clear enough to skip the LLM.
+    """
+    text = text.strip()
+    if not text:
+        return None
+
+    matched = [rule for rule in RULES if _matches(rule, text)]
+    overridden = {rfa for rule in matched for rfa in rule.overrides}
+    matched = [rule for rule in matched if rule.rfa not in overridden]
+    if not matched:
+        return None
+
+    rule = max(matched, key=lambda r: r.confidence)
+    confidence = rule.confidence
+    if len(matched) > 1:
+        confidence -= 0.3
+    if "?" in text:
+        # Questions for the school need a real answer
+        confidence -= 0.3
+    if len(text) > MAX_FAST_PATH_CHARS:
+        confidence -= 0.2
+    if confidence < MIN_CONFIDENCE:
+        return None
+
+    if rule.escalate:
+        response_content = ESCALATE_TEMPLATE
+    elif rule.rfa == "Excused - Sick":
+        response_content = SICK_TEMPLATE
+    else:
+        response_content = COMPLETED_TEMPLATE.format(label=rule.label)
+    return FastPathResult(rule.rfa, round(confidence, 2), rule.escalate, response_content)
+
+
+def classify_messages(guardian_messages: List[str]) -> Optional[FastPathResult]:
+    """
+    classify_text over a burst of guardian texts, recording fast-path stats.
+    """
+    started = time.perf_counter()
+    result = classify_text("\n".join(guardian_messages))
+    stats.total_latency += time.perf_counter() - started
+    if result:
+        stats.classified += 1
+    else:
+        stats.deferred += 1
+    return result
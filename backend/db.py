@@ -0,0 +1,502 @@
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from . import telemetry
+from .cache import TTLCache
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Async data access for guardians, conversations and messages.
+# supabase-py's query builder is synchronous, so every query runs on a dedicated, bounded
+# thread pool (DB_MAX_THREADS) instead of on the event loop: a slow query ties up one pool
+# thread rather than every other request being served.
+#
+# The supabase client (and the supabase package, which is slow to import) is only created by
+# the first client() call, so importing the app needs neither credentials nor a network.
+supabase: "Client" = None
+supabase_url: str = None
+supabase_key: str = None
+client_lock = threading.Lock()
+executor: ThreadPoolExecutor = None
+# Rows per bulk insert/upsert
+bulk_chunk_size = 500
+
+# Lookup caches for the webhook hot path. Our own writes keep them current; LOOKUP_CACHE_TTL_SECONDS
+# bounds how long a change made elsewhere (e.g. the dashboard) can go unseen.
+guardians_by_phone: TTLCache = None         # phone_number -> guardian row
+guardians_by_id: TTLCache = None            # guardian id -> guardian row
+conversations_by_id: TTLCache = None        # conversation id -> conversation row
+latest_conversation_ids: TTLCache = None    # (guardian_id, school_id) -> most recent conversation id
+
+# Conversation columns the backend reads; cached conversation rows hold these
+CONVERSATION_COLUMNS = ("id, guardian_id, school_id, student_id, absence_id, status, rfa, recommended_action, "
+                        "created_at, history_summary, history_summary_through_at, history_summary_through_id")
+
+
+def configure(url: str, key: str):
+    """
+    Read settings and set up the thread pool and caches. Doesn't connect; see client().
+    """
+    global supabase_url, supabase_key, executor, bulk_chunk_size
+    global guardians_by_phone, guardians_by_id, conversations_by_id, latest_conversation_ids
+    supabase_url, supabase_key = url, key
+    bulk_chunk_size = int(os.environ.get("BULK_CHUNK_SIZE", "500"))
+    executor = ThreadPoolExecutor(
+        max_workers=int(os.environ.get("DB_MAX_THREADS", "16")), thread_name_prefix="supabase")
+
+    cache_size = int(os.environ.get("LOOKUP_CACHE_SIZE", "10000"))
+    cache_ttl = float(os.environ.get("LOOKUP_CACHE_TTL_SECONDS", "30"))
+    guardians_by_phone = TTLCache(cache_size, cache_ttl)
+    guardians_by_id = TTLCache(cache_size, cache_ttl)
+    conversations_by_id = TTLCache(cache_size, cache_ttl)
+    latest_conversation_ids = TTLCache(cache_size, cache_ttl)
+
+
+def client() -> "Client":
+    """
+    The shared supabase client, created on first use. Safe to call from the DB threads.
+    """
+    global supabase
+    if supabase is None:
+        with client_lock:
+            if supabase is None:
+                from supabase import create_client
+                supabase = create_client(supabase_url, supabase_key)
+    return supabase
+
+
+def cache_stats() -> dict:
+    return {
+        "guardians_by_phone": guardians_by_phone.stats(),
+        "guardians_by_id": guardians_by_id.stats(),
+        "conversations_by_id": conversations_by_id.stats(),
+        "latest_conversation_ids": latest_conversation_ids.stats(),
+    }
+
+
+async def run(query: Callable):
+    """
+    Run a blocking supabase call (usually a lambda ending in .execute()) on the DB thread pool,
+    timed as a "supabase.<calling function>" span.
+    """
+    with telemetry.span("supabase." + sys._getframe(1).f_code.co_name):
+        return await asyncio.get_running_loop().run_in_executor(executor, query)
+
+
+def with_columns(columns: str, *required: str) -> str:
+    """
+    A select list that also has the required columns (e.g. keyset pagination keys).
+    """
+    if columns.strip() == "*":
+        return columns
+    names = [name.strip() for name in columns.split(",")]
+    return ", ".join(names + [name for name in required if name not in names])
+
+
+def chunked(items: list, size: int = None):
+    size = size or bulk_chunk_size
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Guardians
+
+def cache_guardian(guardian: dict):
+    guardians_by_id.set(guardian["id"], guardian)
+    guardians_by_phone.set(guardian["phone_number"], guardian)
+
+
+async def get_guardian(guardian_id: str) -> Optional[dict]:
+    guardian = guardians_by_id.get(guardian_id)
+    if guardian is None:
+        result = await run(lambda: client().table("guardians").select(
+            "*").eq("id", guardian_id).limit(1).execute())
+        guardian = result.data[0] if result.data else None
+        if guardian:
+            cache_guardian(guardian)
+    return guardian
+
+
+async def get_guardian_by_phone(phone_number: str) -> Optional[dict]:
+    guardian = guardians_by_phone.get(phone_number)
+    if guardian is None:
+        result = await run(lambda: client().table("guardians").select(
+            "*").eq("phone_number", phone_number).limit(1).execute())
+        guardian = result.data[0] if result.data else None
+        if guardian:
+            cache_guardian(guardian)
+    return guardian
+
+
+async def get_guardians(guardian_ids: List[str]) -> Dict[str, dict]:
+    """
+    Guardians by id, from the cache where possible and one call per chunk of misses.
+    """
+    guardians, missing = {}, []
+    for guardian_id in set(guardian_ids):
+        guardian = guardians_by_id.get(guardian_id)
+        if guardian is None:
+            missing.append(guardian_id)
+        else:
+            guardians[guardian_id] = guardian
+    for chunk in chunked(missing):
+        result = await run(lambda: client().table("guardians").select("*").in_("id", chunk).execute())
+        for guardian in result.data:
+            cache_guardian(guardian)
+            guardians[guardian["id"]] = guardian
+    return guardians
+
+
+async def upsert_guardians(rows: List[dict]) -> List[dict]:
+    """
+    Upsert guardians on (phone_number, school_id), one call per chunk. Returns the stored rows.
+    """
+    stored = []
+    for chunk in chunked(rows):
+        result = await run(lambda: client().table("guardians").upsert(
+            chunk, on_conflict="phone_number,school_id").execute())
+        stored.extend(result.data)
+    for guardian in stored:
+        # A phone number can belong to guardians at several schools, so drop rather than overwrite
+        guardians_by_phone.invalidate(guardian["phone_number"])
+        guardians_by_id.set(guardian["id"], guardian)
+    return stored
+
+
+# Conversations
+
+async def get_conversation(conversation_id: str, fresh: bool = False) -> Optional[dict]:
+    """
+    fresh=True skips the cache (and refreshes it), for reads that must see other workers' writes.
+    """
+    conversation = None if fresh else conversations_by_id.get(conversation_id)
+    if conversation is None:
+        result = await run(lambda: client().table("conversations").select(
+            CONVERSATION_COLUMNS).eq("id", conversation_id).limit(1).execute())
+        conversation = result.data[0] if result.data else None
+        conversations_by_id.set(conversation_id, conversation)
+    return conversation
+
+
+async def get_conversations(conversation_ids: List[str]) -> Dict[str, dict]:
+    """
+    Conversations by id, from the cache where possible and one call per chunk of misses.
+    """
+    conversations, missing = {}, []
+    for conversation_id in set(conversation_ids):
+        conversation = conversations_by_id.get(conversation_id)
+        if conversation is None:
+            missing.append(conversation_id)
+        else:
+            conversations[conversation_id] = conversation
+    for chunk in chunked(missing):
+        result = await run(lambda: client().table("conversations").select(
+            CONVERSATION_COLUMNS).in_("id", chunk).execute())
+        for conversation in result.data:
+            conversations_by_id.set(conversation["id"], conversation)
+            conversations[conversation["id"]] = conversation
+    return conversations
+
+
+async def get_latest_conversation(guardian_id: str, school_id: str) -> Optional[dict]:
+    conversation_id = latest_conversation_ids.get((guardian_id, school_id))
+    conversation = conversations_by_id.get(conversation_id) if conversation_id else None
+    if conversation is None:
+        result = await run(lambda: client().table("conversations").select(CONVERSATION_COLUMNS).eq(
+            "guardian_id", guardian_id).eq("school_id", school_id).order("created_at", desc=True).limit(1).execute())
+        conversation = result.data[0] if result.data else None
+        if conversation:
+            conversations_by_id.set(conversation["id"], conversation)
+            latest_conversation_ids.set((guardian_id, school_id), conversation["id"])
+    return conversation
+
+
+async def create_conversations(rows: List[dict]) -> List[str]:
+    """
+    Insert conversations in chunks. Returns their ids in the same order as rows.
+    """
+    ids = []
+    for chunk in chunked(rows):
+        result = await run(lambda: client().table("conversations").insert(chunk).execute())
+        for row in result.data:
+            ids.append(row["id"])
+            conversations_by_id.set(row["id"], row)
+            latest_conversation_ids.set((row["guardian_id"], row["school_id"]), row["id"])
+    return ids
+
+
+async def update_conversation(conversation_id: str, data: dict):
+    result = await run(lambda: client().table("conversations").update(data).eq("id", conversation_id).execute())
+    if result.data:
+        conversations_by_id.set(conversation_id, result.data[0])
+    else:
+        conversations_by_id.invalidate(conversation_id)
+
+
+async def find_conversations_for_absences(absence_ids: List[str], school_ids: List[str], since: str,
+                                          columns: str = "*") -> List[dict]:
+    """
+    Conversations for these absence ids and schools created since. Embedded messages, if columns
+    selects them, come oldest first.
+    """
+    result = await run(lambda: client().table("conversations").select(columns).in_(
+        "absence_id", absence_ids).in_("school_id", school_ids).gte("created_at", since).order(
+        "created_at", foreign_table="messages").order("id", foreign_table="messages").execute())
+    return result.data
+
+
+async def find_conversations(school_id: Optional[str] = None, since: Optional[str] = None,
+                             until: Optional[str] = None, columns: str = "*",
+                             page_size: int = 1000) -> List[dict]:
+    """
+    Conversations for a school (any school if None) created in [since, until), oldest first. Read
+    in keyset pages, so a busy day isn't cut off at PostgREST's max_rows.
+    """
+    def where(builder):
+        if school_id:
+            builder = builder.eq("school_id", school_id)
+        if since:
+            builder = builder.gte("created_at", since)
+        if until:
+            builder = builder.lt("created_at", until)
+        return builder
+    rows = []
+    async for page in iter_keyset_pages("conversations", with_columns(columns, "created_at", "id"),
+                                        ("created_at", "id"), where, page_size):
+        rows.extend(page)
+    return rows
+
+
+# Messages
+
+async def get_message(message_id: str, columns: str = "*") -> Optional[dict]:
+    result = await run(lambda: client().table("messages").select(
+        columns).eq("id", message_id).limit(1).execute())
+    return result.data[0] if result.data else None
+
+
+async def get_messages(message_ids: List[str], columns: str = "*") -> List[dict]:
+    rows = []
+    for chunk in chunked(message_ids):
+        result = await run(lambda: client().table("messages").select(columns).in_("id", chunk).execute())
+        rows.extend(result.data)
+    return rows
+
+
+async def find_message_handles(handles: List[str]) -> set:
+    """
+    Which of these Sendblue handles are on a message, one call per chunk.
+    """
+    found = set()
+    for chunk in chunked(handles):
+        result = await run(lambda: client().table("messages").select("sendblue_message_handle").in_(
+            "sendblue_message_handle", chunk).execute())
+        found.update(row["sendblue_message_handle"] for row in result.data)
+    return found
+
+
+async def find_messages(conversation_ids: List[str], status: str, columns: str = "*",
+                        page_size: int = 1000) -> List[dict]:
+    """
+    Messages in any of these conversations with the given status, in keyset pages per chunk.
+    """
+    rows = []
+    for chunk in chunked(conversation_ids):
+        async for page in iter_keyset_pages(
+                "messages", with_columns(columns, "created_at", "id"), ("created_at", "id"),
+                lambda builder, chunk=chunk: builder.in_("conversation_id", chunk).eq("status", status),
+                page_size):
+            rows.extend(page)
+    return rows
+
+
+async def get_recent_messages(conversation_id: str, limit: int, columns: str = "*") -> List[dict]:
+    """
+    The newest limit messages of a conversation, oldest first.
+    """
+    result = await run(lambda: client().table("messages").select(columns).eq(
+        "conversation_id", conversation_id).order("created_at", desc=True).order("id", desc=True).limit(limit).execute())
+    return result.data[::-1]
+
+
+async def get_messages_after(conversation_id: str, after: Optional[tuple], limit: int,
+                             columns: str = "*") -> List[dict]:
+    """
+    One keyset page: up to limit messages ordered by (created_at, id) that come after the
+    (created_at, id) cursor, or from the start if after is None. columns must include both.
+    """
+    def query():
+        builder = client().table("messages").select(columns).eq("conversation_id", conversation_id)
+        if after:
+            created_at, message_id = after
+            builder = builder.or_(
+                f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{message_id})')
+        return builder.order("created_at").order("id").limit(limit).execute()
+    return (await run(query)).data
+
+
+async def iter_message_pages(conversation_id: str, after: Optional[tuple] = None,
+                             columns: str = "*", page_size: int = 200):
+    """
+    Page through a conversation's messages after the cursor, oldest first. Every page costs the
+    same however deep it is, and stays under PostgREST's max_rows, so long threads are never
+    silently truncated.
+    """
+    while True:
+        page = await get_messages_after(conversation_id, after, page_size, columns)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = (page[-1]["created_at"], page[-1]["id"])
+
+
+async def create_message(message_data: dict) -> str:
+    result = await run(lambda: client().table("messages").insert(message_data).execute())
+    return result.data[0]['id']
+
+
+async def insert_message_once(message_data: dict) -> Optional[str]:
+    """
+    Insert a message unless one with the same sendblue_message_handle exists (the messages
+    unique constraint). Returns the new id, or None for a duplicate.
+    """
+    result = await run(lambda: client().table("messages").upsert(
+        message_data, on_conflict="sendblue_message_handle", ignore_duplicates=True).execute())
+    return result.data[0]["id"] if result.data else None
+
+
+async def create_messages(rows: List[dict]) -> List[str]:
+    """
+    Insert messages in chunks. Returns their ids in the same order as rows.
+    """
+    ids = []
+    for chunk in chunked(rows):
+        result = await run(lambda: client().table("messages").insert(chunk).execute())
+        ids.extend(row["id"] for row in result.data)
+    return ids
+
+
+async def update_message(message_id: str, data: dict):
+    await run(lambda: client().table("messages").update(data).eq("id", message_id).execute())
+
+
+async def delete_message(message_id: str):
+    await run(lambda: client().table("messages").delete().eq("id", message_id).execute())
+
+
+async def upsert_messages(rows: List[dict]):
+    """
+    Write back full message rows keyed on id, one call per chunk.
+    """
+    for chunk in chunked(rows):
+        await run(lambda: client().table("messages").upsert(chunk, on_conflict="id").execute())
+
+
+async def transition_messages(message_ids: List[str], from_status: str, to_status: str) -> List[dict]:
+    """
+    Move messages from from_status to to_status, one call per chunk, and return the rows that
+    moved. A message another request already moved is left out, so callers can use this to
+    claim work.
+    """
+    updated = []
+    for chunk in chunked(message_ids):
+        result = await run(lambda: client().table("messages").update({"status": to_status}).in_(
+            "id", chunk).eq("status", from_status).execute())
+        updated.extend(result.data)
+    return updated
+
+
+async def update_messages_by_handles(handles: List[str], data: dict,
+                                     unless_status: Optional[List[str]] = None) -> List[dict]:
+    """
+    Apply the same update to every message whose handle is in handles, one call per chunk.
+    Rows whose current status is in unless_status are left alone.
+    """
+    updated = []
+    for chunk in chunked(handles):
+        def query(chunk=chunk):
+            builder = client().table("messages").update(data).in_("sendblue_message_handle", chunk)
+            if unless_status:
+                # NOT IN alone would also skip rows with no status yet
+                builder = builder.or_(f"status.is.null,status.not.in.({','.join(unless_status)})")
+            return builder.execute()
+        updated.extend((await run(query)).data)
+    return updated
+
+
+# Analytics (rollups maintained by supabase/migrations/*_conversation_analytics.sql)
+
+async def refresh_analytics(batch_size: Optional[int] = None, wait: bool = False) -> int:
+    """
+    Recompute the outcomes and daily totals of conversations that changed since the last refresh,
+    up to batch_size of them (the function's default if None). Returns how many it refreshed.
+    While another refresh runs this returns 0 at once, or with wait=True waits for it first.
+    """
+    params = {} if batch_size is None else {"batch_size": batch_size}
+    function = "refresh_conversation_analytics_blocking" if wait else "refresh_conversation_analytics"
+    result = await run(lambda: client().rpc(function, params).execute())
+    return result.data or 0
+
+
+async def get_analytics_summary(school_id: str, start: date, end: date) -> List[dict]:
+    """
+    Totals per RFA over the school's conversations started on days start..end (inclusive).
+    """
+    result = await run(lambda: client().rpc("conversation_analytics_summary", {
+        "school": school_id, "from_day": start.isoformat(), "to_day": end.isoformat()}).execute())
+    return result.data
+
+
+async def iter_keyset_pages(table: str, columns: str, keys: tuple, where: Callable,
+                            page_size: int = 1000):
+    """
+    Page through a table in (keys[0], keys[1]) order with a keyset cursor. where(builder) applies
+    the filters. Every page costs the same however deep it is, so an export of any size reads at
+    a steady rate and holds one page at a time. columns must include both keys.
+    """
+    first, second = keys
+    after = None
+    while True:
+        def query(after=after):
+            builder = where(client().table(table).select(columns))
+            if after:
+                builder = builder.or_(
+                    f'{first}.gt."{after[0]}",and({first}.eq."{after[0]}",{second}.gt."{after[1]}")')
+            return builder.order(first).order(second).limit(page_size).execute()
+        page = (await run(query)).data
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = (page[-1][first], page[-1][second])
+
+
+def iter_conversation_outcomes(school_id: str, start: date, end: date, columns: str = "*",
+                               page_size: int = 1000):
+    """
+    Pages of conversation_outcomes for conversations the school started on days start..end (UTC).
+    """
+    since = datetime.combine(start, time.min, timezone.utc).isoformat()
+    until = datetime.combine(end + timedelta(days=1), time.min, timezone.utc).isoformat()
+    return iter_keyset_pages(
+        "conversation_outcomes", columns, ("created_at", "conversation_id"),
+        lambda builder: builder.eq("school_id", school_id).gte("created_at", since).lt("created_at", until),
+        page_size)
+
+
+def iter_daily_stats(school_id: str, start: date, end: date, columns: str = "*", page_size: int = 1000):
+    """
+    Pages of conversation_daily_stats for the school's days start..end, by day then RFA.
+    """
+    return iter_keyset_pages(
+        "conversation_daily_stats", columns, ("day", "rfa"),
+        lambda builder: builder.eq("school_id", school_id).gte("day", start.isoformat()).lt(
+            "day", (end + timedelta(days=1)).isoformat()),
+        page_size)
@@ -0,0 +1,108 @@
+import codecs
+import csv
+from collections import deque
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# A quoted field still open after this many lines is taken to be a stray quote
+MAX_RECORD_LINES = 50
+
+
+def _parse_record(lines: List[str]) -> List[str]:
+    return next(csv.reader(lines), [])
+
+
+def _ends_in_quoted_field(line: str, in_quotes: bool) -> bool:
+    """
+    Whether a record is inside a quoted field at the end of line, given whether it was at the
+    start. Like csv, only a quote at the start of a field opens one; O"Brien is plain text.
+    """
+    if '"' not in line:
+        return in_quotes
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == ","
+        i += 1
+    return in_quotes
+
+
+async def iter_csv_rows(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    Read an uploaded CSV a chunk at a time and yield (line_number, row) pairs like csv.DictReader
+    would, without ever holding the whole file in memory. line_number is the 1-based line the row
+    starts on (the header is line 1). Malformed records are yielded as {"__error__": reason} so
+    callers can report them and keep going; a quoted field left open for MAX_RECORD_LINES lines
+    is reported on its first line and the lines after it are read again as records.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header = None
+    pending = ""
+    record_lines: List[Tuple[int, str]] = []
+    in_quotes = False
+    line_number = 0
+
+    while True:
+        chunk = await file.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        # Only "\n" ends a line ("\r\n" keeps its "\r", which csv drops); str.splitlines() would
+        # also split on characters like U+2028 that are plain text inside a CSV field
+        lines = [line + "\n" for line in pending.split("\n")]
+        # Hold back a trailing partial line until the next chunk arrives
+        pending = lines.pop()[:-1]
+        if not chunk and pending:
+            lines.append(pending)
+            pending = ""
+
+        numbered = deque(enumerate(lines, line_number + 1))
+        line_number += len(lines)
+
+        while numbered:
+            number, line = numbered.popleft()
+            record_lines.append((number, line))
+            # A quoted field can span lines; the record is complete once it's closed
+            in_quotes = _ends_in_quoted_field(line, in_quotes)
+            if in_quotes:
+                if len(record_lines) < MAX_RECORD_LINES:
+                    continue
+                # Resync: report the record's first line and read the rest as new records
+                yield record_lines[0][0], {"__error__": f"Quoted field still open after {MAX_RECORD_LINES} lines"}
+                numbered.extendleft(reversed(record_lines[1:]))
+                record_lines = []
+                in_quotes = False
+                continue
+
+            record_start = record_lines[0][0]
+            record, record_lines = [record_line for _, record_line in record_lines], []
+            try:
+                values = _parse_record(record)
+            except csv.Error as e:
+                # e.g. a stray "\r" inside an unquoted field
+                yield record_start, {"__error__": f"Malformed row: {e}"}
+                continue
+            if not values:
+                continue
+            if header is None:
+                header = values
+                continue
+            if len(values) != len(header):
+                yield record_start, {"__error__": f"Expected {len(header)} fields, got {len(values)}"}
+                continue
+            yield record_start, dict(zip(header, values))
+
+        if not chunk:
+            break
+
+    if record_lines:
+        yield record_lines[0][0], {"__error__": "Unterminated quoted field"}
@@ -0,0 +1,319 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+
+from . import telemetry
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_DEAD = "dead"
+# last_error of a job dead-lettered because its last worker never reported back
+LEASE_EXPIRED_ERROR = "Lease expired on the last attempt; the worker running it probably died"
+
+
+class JobStore(ABC):
+    """
+    Persistence for outbound jobs. A job is claimed with a lease; if the worker dies the
+    lease runs out and another worker picks it up again (at-least-once delivery), unless that
+    was its last attempt, in which case it's dead-lettered instead.
+    Jobs are dicts with idempotency_key, kind, payload and optionally batch_id,
+    max_attempts and delay_seconds (don't run before now + delay).
+    """
+
+    @abstractmethod
+    async def enqueue(self, jobs: List[dict]) -> int:
+        ...
+
+    @abstractmethod
+    async def claim(self, worker_id: str, limit: int, lease_seconds: int) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def complete(self, job_id: str, result: dict):
+        ...
+
+    @abstractmethod
+    async def fail(self, job_id: str, error: str, retry_in_seconds: float):
+        ...
+
+    @abstractmethod
+    async def batch_status(self, batch_id: str) -> dict:
+        ...
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Local-file job store for development and single-host deployments. Calls are run in a thread
+    so they don't block the event loop. Several server processes can share the file: claims take
+    SQLite's write lock before selecting, so two processes never claim the same job.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # Other processes may hold the write lock briefly; wait rather than fail
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS outbound_jobs (
+                id TEXT PRIMARY KEY,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                batch_id TEXT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                available_at REAL NOT NULL,
+                locked_until REAL,
+                locked_by TEXT,
+                last_error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS outbound_jobs_claim_idx ON outbound_jobs (status, available_at)")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS outbound_jobs_batch_idx ON outbound_jobs (batch_id)")
+        self.db.commit()
+
+    def _run(self, fn, *args):
+        with self.lock:
+            try:
+                result = fn(*args)
+                self.db.commit()
+                return result
+            except Exception:
+                self.db.rollback()
+                raise
+
+    def _enqueue(self, jobs: List[dict]) -> int:
+        now = time.time()
+        cursor = self.db.executemany(
+            """INSERT OR IGNORE INTO outbound_jobs
+               (id, idempotency_key, batch_id, kind, payload, max_attempts, available_at, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(str(uuid.uuid4()), job["idempotency_key"], job.get("batch_id"), job["kind"],
+              json.dumps(job["payload"]), job.get("max_attempts", 5), now + job.get("delay_seconds", 0), now, now)
+             for job in jobs])
+        return cursor.rowcount
+
+    def _claim(self, worker_id: str, limit: int, lease_seconds: int) -> List[dict]:
+        self.db.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        # A job whose worker crashed on its last attempt would otherwise be redelivered forever
+        self.db.execute(
+            """UPDATE outbound_jobs SET status = 'dead', last_error = ?, locked_by = NULL,
+               locked_until = NULL, updated_at = ?
+               WHERE status = 'running' AND locked_until < ? AND attempts >= max_attempts""",
+            (LEASE_EXPIRED_ERROR, now, now))
+        rows = self.db.execute(
+            """SELECT * FROM outbound_jobs
+               WHERE (status = 'queued' AND available_at <= ?)
+                  OR (status = 'running' AND locked_until < ?)
+               ORDER BY available_at LIMIT ?""",
+            (now, now, limit)).fetchall()
+        if not rows:
+            return []
+        self.db.executemany(
+            """UPDATE outbound_jobs SET status = 'running', attempts = attempts + 1,
+               locked_by = ?, locked_until = ?, updated_at = ? WHERE id = ?""",
+            [(worker_id, now + lease_seconds, now, row["id"]) for row in rows])
+        return [{**dict(row), "payload": json.loads(row["payload"]), "attempts": row["attempts"] + 1} for row in rows]
+
+    def _complete(self, job_id: str, result: dict):
+        self.db.execute(
+            """UPDATE outbound_jobs SET status = 'done', result = ?, locked_by = NULL,
+               locked_until = NULL, updated_at = ? WHERE id = ?""",
+            (json.dumps(result), time.time(), job_id))
+
+    def _fail(self, job_id: str, error: str, retry_in_seconds: float):
+        now = time.time()
+        self.db.execute(
+            """UPDATE outbound_jobs SET
+                 status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                 last_error = ?, available_at = ?, locked_by = NULL, locked_until = NULL, updated_at = ?
+               WHERE id = ?""",
+            (error, now + retry_in_seconds, now, job_id))
+
+    def _batch_status(self, batch_id: str) -> dict:
+        counts = {row["status"]: row["n"] for row in self.db.execute(
+            "SELECT status, COUNT(*) AS n FROM outbound_jobs WHERE batch_id = ? GROUP BY status", (batch_id,))}
+        dead = [{"idempotency_key": row["idempotency_key"], "attempts": row["attempts"], "last_error": row["last_error"]}
+                for row in self.db.execute(
+                    "SELECT idempotency_key, attempts, last_error FROM outbound_jobs WHERE batch_id = ? AND status = 'dead'",
+                    (batch_id,))]
+        return {"counts": counts, "dead_letters": dead}
+
+    async def enqueue(self, jobs: List[dict]) -> int:
+        return await asyncio.to_thread(self._run, self._enqueue, jobs)
+
+    async def claim(self, worker_id: str, limit: int, lease_seconds: int) -> List[dict]:
+        return await asyncio.to_thread(self._run, self._claim, worker_id, limit, lease_seconds)
+
+    async def complete(self, job_id: str, result: dict):
+        await asyncio.to_thread(self._run, self._complete, job_id, result)
+
+    async def fail(self, job_id: str, error: str, retry_in_seconds: float):
+        await asyncio.to_thread(self._run, self._fail, job_id, error, retry_in_seconds)
+
+    async def batch_status(self, batch_id: str) -> dict:
+        return await asyncio.to_thread(self._run, self._batch_status, batch_id)
+
+
+class SupabaseJobStore(JobStore):
+    """
+    Postgres-backed job store using the outbound_jobs table and the claim_outbound_jobs
+    function from supabase/migrations (FOR UPDATE SKIP LOCKED, so workers never double-claim).
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def enqueue(self, jobs: List[dict]) -> int:
+        rows = [{
+            "idempotency_key": job["idempotency_key"],
+            "batch_id": job.get("batch_id"),
+            "kind": job["kind"],
+            "payload": job["payload"],
+            "max_attempts": job.get("max_attempts", 5),
+            "available_at": (datetime.now(timezone.utc) + timedelta(seconds=job.get("delay_seconds", 0))).isoformat()
+        } for job in jobs]
+        result = await self.db.run(
+            lambda: self.db.client().table("outbound_jobs").upsert(
+                rows, on_conflict="idempotency_key", ignore_duplicates=True).execute())
+        return len(result.data or [])
+
+    async def claim(self, worker_id: str, limit: int, lease_seconds: int) -> List[dict]:
+        result = await self.db.run(
+            lambda: self.db.client().rpc("claim_outbound_jobs", {
+                "worker_id": worker_id, "batch_size": limit, "lease_seconds": lease_seconds}).execute())
+        return result.data or []
+
+    async def complete(self, job_id: str, result: dict):
+        await self.db.run(
+            lambda: self.db.client().table("outbound_jobs").update({
+                "status": JOB_DONE, "result": result, "locked_by": None, "locked_until": None,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }).eq("id", job_id).execute())
+
+    async def fail(self, job_id: str, error: str, retry_in_seconds: float):
+        await self.db.run(
+            lambda: self.db.client().rpc("fail_outbound_job", {
+                "job_id": job_id, "error": error, "retry_in_seconds": retry_in_seconds}).execute())
+
+    async def batch_status(self, batch_id: str) -> dict:
+        result = await self.db.run(
+            lambda: self.db.client().table("outbound_jobs").select(
+                "idempotency_key, status, attempts, last_error").eq("batch_id", batch_id).execute())
+        counts = {}
+        dead = []
+        for row in result.data:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+            if row["status"] == JOB_DEAD:
+                dead.append({key: row[key] for key in ("idempotency_key", "attempts", "last_error")})
+        return {"counts": counts, "dead_letters": dead}
+
+
+# A handler gets every claimed job of its kind at once (so it can bulk-write) and returns
+# one (ok, result_or_error) pair per job, in order.
+JobHandler = Callable[[List[dict]], Awaitable[List[tuple]]]
+
+
+class JobQueue:
+    """
+    Pool of asyncio workers draining a JobStore. Each worker claims up to claim_size jobs,
+    groups them by kind and passes each group to its handler.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, JobHandler], workers: int = 4,
+                 claim_size: int = 50, lease_seconds: int = 300, poll_interval: float = 1.0):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.claim_size = claim_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.tasks: List[asyncio.Task] = []
+        self.wakeup = asyncio.Event()
+
+    def start(self):
+        for i in range(self.workers):
+            worker_id = f"{os.getpid()}-{i}-{uuid.uuid4().hex[:6]}"
+            self.tasks.append(asyncio.create_task(self._work(worker_id)))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def enqueue(self, jobs: List[dict]) -> int:
+        inserted = await self.store.enqueue(jobs)
+        self.wakeup.set()
+        return inserted
+
+    async def _work(self, worker_id: str):
+        while True:
+            try:
+                jobs = await self.store.claim(worker_id, self.claim_size, self.lease_seconds)
+            except Exception as e:
+                print(f"Job worker {worker_id} failed to claim jobs: {str(e)}")
+                jobs = []
+
+            if not jobs:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            by_kind: Dict[str, List[dict]] = {}
+            for job in jobs:
+                by_kind.setdefault(job["kind"], []).append(job)
+            for kind, kind_jobs in by_kind.items():
+                try:
+                    await self._run_handler(kind, kind_jobs)
+                except Exception as e:
+                    # Whatever wasn't recorded is redelivered once its lease runs out
+                    print(f"Job worker {worker_id} failed to run {kind} jobs: {str(e)}")
+
+    async def _run_handler(self, kind: str, jobs: List[dict]):
+        handler = self.handlers.get(kind)
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind {kind}")
+            with telemetry.span("job." + kind):
+                outcomes = await handler(jobs)
+        except Exception as e:
+            outcomes = [(False, f"{type(e).__name__}: {str(e)}")] * len(jobs)
+
+        for job, (ok, result) in zip(jobs, outcomes):
+            telemetry.JOBS.inc(kind=kind, outcome="done" if ok else "failed")
+            try:
+                if ok:
+                    await self.store.complete(job["id"], result)
+                else:
+                    # Exponential backoff between attempts; the store dead-letters once max_attempts is hit
+                    await self.store.fail(job["id"], str(result), min(300, 5 * 2 ** (job["attempts"] - 1)))
+            except Exception as e:
+                # The job stays running until its lease expires, then it's redelivered
+                print(f"Failed to record the outcome of job {job['id']}: {str(e)}")
+
+
+def create_job_store(db) -> JobStore:
+    if os.environ.get("JOB_STORE", "sqlite") == "supabase":
+        return SupabaseJobStore(db)
+    return SQLiteJobStore(os.environ.get("JOB_SQLITE_PATH", "outbound_jobs.db"))
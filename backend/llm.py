@@ -0,0 +1,177 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import List, Optional, Type
+
+from pydantic import BaseModel
+
+from . import telemetry
+
+
+def retryable_errors() -> tuple:
+    # openai takes longer to import than the rest of the app, so it's only imported once needed
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def completion_usage(completion) -> dict:
+    """
+    Token counts for one completion (zeros if the API didn't report usage).
+    """
+    usage = getattr(completion, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "cached_prompt_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+class LLMStats:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record_wait(self, wait: float):
+        self.total_queue_wait += wait
+        self.max_queue_wait = max(self.max_queue_wait, wait)
+
+    def record_request(self, latency: float):
+        self.requests += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def record_usage(self, usage: dict):
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.cached_prompt_tokens += usage["cached_prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+
+    def as_dict(self) -> dict:
+        started = self.requests + self.failures
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "in_flight": self.in_flight,
+            "avg_queue_wait_ms": round(1000 * self.total_queue_wait / started, 2) if started else 0.0,
+            "max_queue_wait_ms": round(1000 * self.max_queue_wait, 2),
+            "avg_latency_ms": round(1000 * self.total_latency / self.requests, 2) if self.requests else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency, 2),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class LLMClient:
+    """
+    Async OpenAI client shared by the app. Caps the number of completions in flight
+    (OPENAI_MAX_IN_FLIGHT), applies a per-request timeout and retries rate-limit and
+    transient errors with backoff, so a burst of guardian replies is processed concurrently
+    without blocking the event loop or blowing through the OpenAI rate limit.
+
+    The underlying AsyncOpenAI client is created by connect(), which the first completion
+    calls if nobody did so earlier (e.g. the app's startup warm-up).
+    """
+
+    def __init__(self, api_key: str):
+        self.max_in_flight = int(os.environ.get("OPENAI_MAX_IN_FLIGHT", "16"))
+        self.max_retries = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+        self.timeout = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "30"))
+        self.api_key = api_key
+        self.client = None
+        self.client_lock = threading.Lock()
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.stats = LLMStats()
+
+    def connect(self):
+        """
+        Create the AsyncOpenAI client if it doesn't exist yet. Blocking (imports openai), so
+        call it via asyncio.to_thread from async code that shouldn't stall.
+        """
+        if self.client is None:
+            with self.client_lock:
+                if self.client is None:
+                    from openai import AsyncOpenAI
+                    # Retries are ours so they show up in stats
+                    self.client = AsyncOpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def parse(self, model: str, messages: List[dict], response_format: Type[BaseModel]):
+        """
+        client.beta.chat.completions.parse under the in-flight limit, with retries.
+        Returns the completion.
+        """
+        wait_started = time.monotonic()
+        async with self.semaphore:
+            self.stats.record_wait(time.monotonic() - wait_started)
+            self.stats.in_flight += 1
+            try:
+                return await self._parse_with_retries(model, messages, response_format)
+            finally:
+                self.stats.in_flight -= 1
+
+    async def _parse_with_retries(self, model: str, messages: List[dict], response_format: Type[BaseModel]):
+        client = self.connect()
+        from openai import RateLimitError
+        retryable = retryable_errors()
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with telemetry.span("openai.chat.completions.parse"):
+                    completion = await client.beta.chat.completions.parse(
+                        model=model,
+                        messages=messages,
+                        response_format=response_format
+                    )
+            except retryable as e:
+                if isinstance(e, RateLimitError):
+                    self.stats.rate_limited += 1
+                if attempt >= self.max_retries:
+                    self.stats.failures += 1
+                    raise
+                await self._backoff(attempt, e)
+                attempt += 1
+                continue
+            except Exception:
+                self.stats.failures += 1
+                raise
+            self.stats.record_request(time.monotonic() - started)
+            self.stats.record_usage(completion_usage(completion))
+            return completion
+
+    async def _backoff(self, attempt: int, error: Exception):
+        self.stats.retries += 1
+        delay = 1.0 * (2 ** attempt) + random.uniform(0, 0.5)
+        response = getattr(error, "response", None)
+        retry_after: Optional[str] = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        await asyncio.sleep(delay)
@@ -0,0 +1,148 @@
+import asyncio
+import fcntl
+import logging
+import os
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from typing import Dict
+
+logger = logging.getLogger("uvicorn")
+
+
+class KeyedLocks:
+    """
+    One asyncio.Lock per key (e.g. conversation id), created on demand and dropped once
+    nobody holds or waits on it, so the map doesn't grow with every conversation ever seen.
+    Only serializes within one process; see FileLocks / SupabaseLocks for several workers.
+    """
+
+    def __init__(self):
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.waiters: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.waiters[key] -= 1
+            if not self.waiters[key]:
+                del self.waiters[key]
+                del self.locks[key]
+
+
+async def _poll_backoff(attempt: int):
+    await asyncio.sleep(min(0.5, 0.01 * 2 ** attempt))
+
+
+class FileLocks(KeyedLocks):
+    """
+    Cross-process keyed locks for server processes on one host. Keys hash onto a fixed set of
+    flock()ed stripe files in directory, so unrelated keys occasionally share a stripe but the
+    number of files stays bounded. Coroutines in the same process queue on the in-process lock
+    first, so only one of them polls the file lock at a time.
+    """
+
+    def __init__(self, directory: str, stripes: int = 1024):
+        super().__init__()
+        self.directory = directory
+        self.stripes = stripes
+        os.makedirs(directory, exist_ok=True)
+
+    def _stripe(self, key: str) -> str:
+        return os.path.join(self.directory, f"{zlib.crc32(key.encode()) % self.stripes:04d}.lock")
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        async with super().hold(key):
+            fd = os.open(self._stripe(key), os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                attempt = 0
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        await _poll_backoff(attempt)
+                        attempt += 1
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+
+class SupabaseLocks(KeyedLocks):
+    """
+    Cross-host keyed locks for several pods, as leases in the lock_leases table (see
+    supabase/migrations). A lease expires after lease_seconds, so a crashed worker can't hold a
+    key forever. While hold() is held the lease is renewed every third of lease_seconds, so a
+    block can outlast it (e.g. several LLM calls with retries); if a renewal finds the lease
+    taken over, or renewals keep failing until it has expired, that's logged as an error.
+    """
+
+    def __init__(self, db, lease_seconds: int = 120):
+        super().__init__()
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        async with super().hold(key):
+            attempt = 0
+            while True:
+                if await self._try_acquire(key):
+                    break
+                await _poll_backoff(attempt)
+                attempt += 1
+            renewal = asyncio.create_task(self._renew(key))
+            try:
+                yield
+            finally:
+                renewal.cancel()
+                await asyncio.gather(renewal, return_exceptions=True)
+                await self.db.run(lambda: self.db.client().rpc("release_lock_lease", {
+                    "lease_key": key, "lease_owner": self.owner}).execute())
+
+    async def _try_acquire(self, key: str) -> bool:
+        result = await self.db.run(lambda: self.db.client().rpc("try_acquire_lock_lease", {
+            "lease_key": key, "lease_owner": self.owner, "lease_seconds": self.lease_seconds}).execute())
+        return bool(result.data)
+
+    async def _renew(self, key: str):
+        # try_acquire_lock_lease extends a lease we already own
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + self.lease_seconds
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self._try_acquire(key)
+            except Exception as e:
+                if loop.time() >= expires_at:
+                    logger.error(f"Lock lease {key} expired while held: renewal failed ({e})")
+                else:
+                    logger.warning(f"Could not renew lock lease {key}: {e}")
+                continue
+            if not renewed:
+                logger.error(f"Lock lease {key} was taken over while held; the work under it is no longer exclusive")
+                return
+            expires_at = loop.time() + self.lease_seconds
+
+
+def create_locks(db) -> KeyedLocks:
+    """
+    LOCK_BACKEND: "local" (one process), "file" (processes on one host, LOCK_DIR) or
+    "supabase" (several hosts).
+    """
+    backend = os.environ.get("LOCK_BACKEND", "local")
+    if backend == "supabase":
+        return SupabaseLocks(db, int(os.environ.get("LOCK_LEASE_SECONDS", "120")))
+    if backend == "file":
+        return FileLocks(os.environ.get("LOCK_DIR", ".locks"))
+    return KeyedLocks()
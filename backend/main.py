@@ -1,33 +1,48 @@
 from typing import Literal, Optional
+import argparse
+import asyncio
 import logging
-import json
-import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import httpx
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
-from supabase import create_client, Client
-from datetime import date
+from typing import Awaitable, List, Optional, Literal
+from datetime import date, datetime
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 from enum import Enum
-import csv
-from io import StringIO
+import time
+import uuid
+from contextlib import asynccontextmanager
 
+# Load backend/.env before the modules below read their settings
 load_dotenv()
 
-app = FastAPI()
+from . import db
+from .sendblue import SendblueClient, SendUnconfirmed
+from .llm import LLMClient, completion_usage
+from .prompts import MODEL, build_messages, build_summary_messages, prompt_version
+from .ai_cache import AIResponseCache
+from .classifier import classify_messages, stats as fast_path_stats
+from .cache import TTLCache
+from .locks import create_locks
+from .jobs import JobQueue, create_job_store
+from .ingest import iter_csv_rows
+from .status_callbacks import StatusCallbackBuffer
+from . import analytics
+from . import telemetry
+
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+llm_client = LLMClient(api_key=OPENAI_API_KEY)
 
 
 # Initialize Supabase client
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+# The Supabase and OpenAI clients are created lazily (see warm_up_clients below), so importing
+# this module is fast and needs no credentials
+db.configure(url, key)
 
 # Get sendblue constants
 SENDBLUE_BASE_URL = os.environ.get("SENDBLUE_BASE_URL")
@@ -39,7 +54,138 @@ BACKEND_BASE_URL = os.environ.get("BACKEND_BASE_URL")
 NGROK_BASE_URL = os.environ.get("NGROK_BASE_URL")
 INITIAL_MESSAGE_TEMPLATE = "Hi there! This is Crystal Springs Middle School. We noticed that {student_name} was not able to make it to school today. Can you please provide a reason for their absence? Also please let us know how we can help. Thanks!"
 AUTO_APPROVE = True
+# Valid CSV rows per job-queue insert, and how many bad rows an upload reports back
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+MAX_REPORTED_ROW_ERRORS = 100
+# Guardian texts arriving within this many seconds of each other get one AI evaluation and one
+# reply, but a burst is never held back longer than the max
+RESPONSE_DEBOUNCE_SECONDS = float(os.environ.get("RESPONSE_DEBOUNCE_SECONDS", "8"))
+RESPONSE_MAX_DEBOUNCE_SECONDS = float(os.environ.get("RESPONSE_MAX_DEBOUNCE_SECONDS", "60"))
+# Initial messages in these statuses never made it to Sendblue and are retried by the job queue
+RESEND_STATUSES = {"SEND_FAILED"}
+# A send that may or may not have reached Sendblue. Never resent automatically, so a guardian is
+# never texted twice; it's left for an officer to check.
+SEND_UNCONFIRMED = "SEND_UNCONFIRMED"
+# An initial message found still SENDING on a re-run was being sent by a worker that died, so
+# Sendblue may have it; it becomes SEND_UNCONFIRMED instead of being resent
+INTERRUPTED_SEND_STATUS = "SENDING"
+# Inbound Sendblue message handles seen recently, to drop redelivered webhooks before any DB work
+INBOUND_DEDUPE_SIZE = int(os.environ.get("INBOUND_DEDUPE_SIZE", "50000"))
+INBOUND_DEDUPE_TTL_SECONDS = float(os.environ.get("INBOUND_DEDUPE_TTL_SECONDS", "86400"))
+# Messages shown to the model verbatim; older ones are folded into the conversation's running
+# summary HISTORY_SUMMARY_BATCH at a time, so one history read is at most the sum of the two
+HISTORY_WINDOW_MESSAGES = int(os.environ.get("HISTORY_WINDOW_MESSAGES", "20"))
+HISTORY_SUMMARY_BATCH = int(os.environ.get("HISTORY_SUMMARY_BATCH", "10"))
+HISTORY_COLUMNS = "id, sender_type, content, created_at, sendblue_message_handle"
+# Sendblue sends in flight per /approve_and_send_messages call, and messages it approves at most
+APPROVE_MAX_CONCURRENCY = int(os.environ.get("APPROVE_MAX_CONCURRENCY", "16"))
+APPROVE_MAX_MESSAGES = int(os.environ.get("APPROVE_MAX_MESSAGES", "1000"))
+# Rows per keyset page (and per Parquet row group) in /analytics/export
+ANALYTICS_EXPORT_PAGE_SIZE = int(os.environ.get("ANALYTICS_EXPORT_PAGE_SIZE", "1000"))
+
+# One pooled Sendblue client for the lifetime of the app (see lifespan below)
+sendblue_client = SendblueClient(
+    SENDBLUE_BASE_URL, SENDBLUE_API_KEY, SENDBLUE_API_SECRET)
+# Durable outbound job queue, started in lifespan
+job_queue: JobQueue = None
+# Background creation of the Supabase and OpenAI clients, started in lifespan
+warm_up_task: asyncio.Task = None
+# Per-dependency timeout for GET /ready
+READY_TIMEOUT_SECONDS = float(os.environ.get("READY_TIMEOUT_SECONDS", "2"))
+
+
+class InboundStats:
+    """
+    Latency from webhook receipt to each processing stage ("stored", "replied")
+    """
+
+    def __init__(self):
+        self.stages = {}
+        # Redelivered webhooks dropped in memory, and ones only the messages unique constraint caught
+        self.duplicates = {"webhook": 0, "stored": 0}
+
+    def record(self, stage: str, latency: float):
+        count, total, worst = self.stages.get(stage, (0, 0.0, 0.0))
+        self.stages[stage] = (count + 1, total + latency, max(worst, latency))
+
+    def as_dict(self) -> dict:
+        return {
+            **{
+                stage: {
+                    "count": count,
+                    "avg_ms": round(1000 * total / count, 2),
+                    "max_ms": round(1000 * worst, 2),
+                }
+                for stage, (count, total, worst) in self.stages.items()
+            },
+            "duplicates": self.duplicates
+        }
+
 
+inbound_stats = InboundStats()
+recent_inbound_handles = TTLCache(INBOUND_DEDUPE_SIZE, INBOUND_DEDUPE_TTL_SECONDS)
+# Serializes evaluations of one conversation, across server processes when LOCK_BACKEND says so
+conversation_locks = create_locks(db)
+
+# Sendblue delivery statuses, coalesced per message and written in bulk
+status_callbacks = StatusCallbackBuffer()
+
+# Periodic incremental refresh of the reporting rollups behind /analytics/*
+analytics_refresher = analytics.AnalyticsRefresher()
+
+telemetry.registry.gauge("sherpa_openai_in_flight", "OpenAI completions in flight",
+                         lambda: llm_client.stats.in_flight)
+telemetry.registry.counter_callback("sherpa_openai_prompt_tokens_total", "Prompt tokens used",
+                                    lambda: llm_client.stats.prompt_tokens)
+telemetry.registry.counter_callback("sherpa_openai_cached_prompt_tokens_total",
+                                    "Prompt tokens served from OpenAI's prompt cache",
+                                    lambda: llm_client.stats.cached_prompt_tokens)
+telemetry.registry.counter_callback("sherpa_sendblue_retries_total", "Sendblue send retries",
+                                    lambda: sendblue_client.stats.retries)
+telemetry.registry.gauge("sherpa_status_callbacks_pending", "Status callbacks waiting for the next bulk flush",
+                         lambda: len(status_callbacks.pending))
+
+
+async def warm_up_clients():
+    """
+    Create the Supabase and OpenAI clients (and import their packages) on threads right after
+    startup, so the server takes traffic at once and the first webhook doesn't pay for them.
+    A failure here is logged and shows up in GET /ready; the first real call retries.
+    """
+    results = await asyncio.gather(
+        asyncio.to_thread(db.client), asyncio.to_thread(llm_client.connect), return_exceptions=True)
+    for name, result in zip(("supabase", "openai"), results):
+        if isinstance(result, Exception):
+            logger.warning("Could not create the %s client: %s", name, result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_queue, warm_up_task
+    warm_up_task = asyncio.create_task(warm_up_clients())
+    await sendblue_client.start()
+    job_queue = JobQueue(
+        create_job_store(db),
+        {
+            "initiate_conversation": process_initiate_conversation_jobs,
+            "process_response": process_response_jobs,
+            "evaluate_conversation": evaluate_conversation_jobs,
+        },
+        workers=int(os.environ.get("JOB_WORKERS", "4")),
+        claim_size=int(os.environ.get("JOB_CLAIM_SIZE", "50")),
+    )
+    job_queue.start()
+    status_callbacks.start()
+    analytics_refresher.start()
+    yield
+    await warm_up_task
+    await job_queue.stop()
+    await status_callbacks.close()
+    await analytics_refresher.close()
+    await sendblue_client.close()
+    await llm_client.close()
+
+app = FastAPI(lifespan=lifespan)
 
 logger = logging.getLogger("uvicorn")
 
@@ -56,6 +202,27 @@ app.add_middleware(
 async def http_exception_handler(request: Request, exc: HTTPException):
     logger.error(f"HTTPException: {exc.status_code} - {exc.detail}")
     return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give every request a trace id (the caller's X-Trace-Id if set), echo it back, and record
+    request count/latency per route template.
+    """
+    with telemetry.trace(request.headers.get("x-trace-id")) as trace_id:
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Trace-Id"] = trace_id
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            telemetry.HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+            telemetry.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
 # Pydantic models
 
 
@@ -83,6 +250,17 @@ class Message(BaseModel):
     was_downgraded: Optional[bool] = None
     sendblue_message_handle: Optional[str] = None
 
+
+class BulkApproveRequest(BaseModel):
+    """
+    Either explicit message_ids, or every AWAITING_APPROVAL message in conversations opened on
+    created_on (and at school_id, if given).
+    """
+    message_ids: Optional[List[str]] = None
+    school_id: Optional[str] = None
+    created_on: Optional[date] = None
+
+
 class ConversationStatus(str, Enum):
     IN_PROGRESS = "in_progress"
     ACTION_NEEDED = "action_needed"
@@ -134,6 +312,13 @@ class AIResponseSchema(BaseModel):
     response_content: str = Field(...,
                                   description="The response content to send to the recipient")
 
+
+class HistorySummary(BaseModel):
+    summary: str = Field(..., description="The updated running summary of the conversation")
+
+# Cache of AI classifications, keyed on prompt version + normalized conversation content
+ai_response_cache = AIResponseCache(prompt_version(AIResponseSchema), INITIAL_MESSAGE_TEMPLATE)
+
 # Helper Functions
 
 
@@ -151,178 +336,439 @@ def get_attendance_report() -> AttendanceReport:
     )
 
 
-async def sendblue_send_message(phone_number: str, content: str) -> dict:
-    url = f"{SENDBLUE_BASE_URL}/send-message"
-    payload = json.dumps({
+async def sendblue_send_message(phone_number: str, content: str, idempotency_key: str = None) -> dict:
+    """
+    Send a text. Pass one idempotency_key per outbound message (e.g. "message:<id>") so a retry
+    can't text the guardian twice; if such a send's outcome is unknown, returns status
+    SEND_UNCONFIRMED instead of raising.
+    """
+    payload = {
         "number": phone_number,
         "content": content,
         # our ngrok reverse proxy to http://127.0.0.1:8000
         "status_callback": f"{NGROK_BASE_URL}/sendblue_status_callback"
-    })
-
-    headers = {
-        "sb-api-key-id": SENDBLUE_API_KEY,
-        "sb-api-secret-key": SENDBLUE_API_SECRET,
-        "Content-Type": "application/json"
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, headers=headers, content=payload)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            error_detail = f"HTTP Status Error: {
-                e.response.status_code} - {e.response.text}"
-            print(f"Error sending message: {error_detail}")
-            raise HTTPException(status_code=e.response.status_code,
-                                detail=f"Error sending message: {error_detail}")
-        except httpx.RequestError as e:
-            error_detail = f"Request Error: {str(e)}"
-            print(f"Error sending message: {error_detail}")
-            raise HTTPException(
-                status_code=500, detail=f"Error sending message: {error_detail}")
-        except Exception as e:
-            error_detail = f"Unexpected error: {str(e)}"
-            print(f"Error sending message: {error_detail}")
-            raise HTTPException(
-                status_code=500, detail=f"Error sending message: {error_detail}")
-
-
-def get_or_create_guardian(phone_number: str, school_id: str, first_name: str, last_name: str) -> str:
-    # Try to find an existing guardian
-    existing_guardian = supabase.table("guardians").select(
-        "*").eq("phone_number", phone_number).eq("school_id", school_id).execute()
-
-    if existing_guardian.data:
-        return existing_guardian.data[0]['id']
+    try:
+        with telemetry.span("sendblue_send_message"):
+            return await sendblue_client.post("/send-message", payload, idempotency_key)
+    except SendUnconfirmed as e:
+        print(f"Send outcome unknown, not retrying ({idempotency_key}): {str(e)}")
+        return {"status": SEND_UNCONFIRMED}
+    except httpx.HTTPStatusError as e:
+        error_detail = f"HTTP Status Error: {e.response.status_code} - {e.response.text}"
+        print(f"Error sending message: {error_detail}")
+        raise HTTPException(status_code=e.response.status_code,
+                            detail=f"Error sending message: {error_detail}")
+    except httpx.RequestError as e:
+        error_detail = f"Request Error: {str(e)}"
+        print(f"Error sending message: {error_detail}")
+        raise HTTPException(
+            status_code=500, detail=f"Error sending message: {error_detail}")
+    except Exception as e:
+        error_detail = f"Unexpected error: {str(e)}"
+        print(f"Error sending message: {error_detail}")
+        raise HTTPException(
+            status_code=500, detail=f"Error sending message: {error_detail}")
 
-    # If not found, create a new guardian
-    new_guardian = supabase.table("guardians").insert({
-        "phone_number": phone_number,
-        "school_id": school_id,
-        "first_name": first_name,
-        "last_name": last_name
-    }).execute()
 
-    return new_guardian.data[0]['id']
+def split_guardian_name(guardian_name: str) -> tuple:
+    first_name, _, last_name = guardian_name.strip().partition(" ")
+    return first_name, last_name
 
 
-def create_conversation(student_id: str, absence_id: str, school_id: str, guardian_id: str) -> str:
-    conversation_data = {
+async def bulk_upsert_guardians(absences: List[tuple]) -> dict:
+    """
+    Upsert every distinct (phone_number, school_id) guardian in the batch and return a
+    map of (phone_number, school_id) -> guardian id. One call per chunk of guardians.
+    """
+    guardians = {}
+    for absence, school_id in absences:
+        key = (absence.guardian_phone, school_id)
+        if key not in guardians:
+            first_name, last_name = split_guardian_name(absence.guardian_name)
+            guardians[key] = {
+                "phone_number": absence.guardian_phone,
+                "school_id": school_id,
+                "first_name": first_name,
+                "last_name": last_name
+            }
+
+    rows = await db.upsert_guardians(list(guardians.values()))
+    return {(row["phone_number"], row["school_id"]): row["id"] for row in rows}
+
+
+async def bulk_create_conversations(absences: List[tuple], guardian_ids: dict) -> List[str]:
+    """
+    Insert one conversation per absence, chunked. Returns conversation ids in the same order as absences.
+    """
+    return await db.create_conversations([{
         "topic": "Absence Inquiry",
-        "student_id": student_id,
+        "student_id": absence.student_id,
         "school_id": school_id,
         "status": "in_progress",
-        "absence_id": absence_id,
-        "guardian_id": guardian_id,
+        "absence_id": absence.id,
+        "absence_date": absence.date.isoformat(),
+        "guardian_id": guardian_ids[(absence.guardian_phone, school_id)],
         "user_id": None  # Leave this null for the MVP
-    }
-    result = supabase.table("conversations").insert(
-        conversation_data).execute()
-    return result.data[0]['id']
-
-
-def create_message(message: Message) -> str:
-    message_data = {
-        "conversation_id": message.conversation_id,
-        "content": message.content,
-        "sender_type": message.sender_type,
-        "status": message.status,
-        "was_downgraded": message.was_downgraded,
-        "sendblue_message_handle": message.sendblue_message_handle
-    }
-    result = supabase.table("messages").insert(message_data).execute()
-    return result.data[0]['id']
+    } for absence, school_id in absences])
 
 
-async def initiate_conversation(absence: Absence, school_id: str, auto_approve: bool) -> dict:
-    initial_message = INITIAL_MESSAGE_TEMPLATE.format(
-        student_name=absence.student_name)
-    sendblue_response = None
+async def create_message(message: Message) -> str:
+    return await db.create_message(message.model_dump())
 
-    if auto_approve:
+
+async def send_initial_message(message_id: str, message: Message, guardian_phone: str,
+                               trace_id: str = None) -> dict:
+    with telemetry.trace(trace_id or telemetry.current_trace_id()):
         try:
-            sendblue_response = await sendblue_send_message(absence.guardian_phone, initial_message)
+            sendblue_response = await sendblue_send_message(
+                guardian_phone, message.content, idempotency_key=f"message:{message_id}")
         except HTTPException as e:
-            print(f"Failed to send message via Sendblue: {str(e)}")
-            raise e
+            print(f"[trace {telemetry.current_trace_id()}] Failed to send message via Sendblue: {str(e)}")
+            sendblue_response = {"status": "SEND_FAILED"}
 
-    # Get or create guardian
-    guardian_first_name, guardian_last_name = absence.guardian_name.split(
-        " ", 1)
-    guardian_id = get_or_create_guardian(
-        absence.guardian_phone, school_id, guardian_first_name, guardian_last_name)
+    return {
+        "id": message_id,
+        **message.model_dump(),
+        "status": sendblue_response.get("status"),
+        "was_downgraded": sendblue_response.get("was_downgraded"),
+        "sendblue_message_handle": sendblue_response.get("message_handle")
+    }
 
-    # Create conversation
-    conversation_id = create_conversation(
-        absence.student_id, absence.id, school_id, guardian_id)
 
-    # Create message
-    message = Message(
-        conversation_id=conversation_id,
-        content=initial_message,
-        sender_type="admin",
-        status="AWAITING_APPROVAL" if not auto_approve else sendblue_response.get(
-            "status"),
-        was_downgraded=sendblue_response.get(
-            "was_downgraded") if auto_approve else None,
-        sendblue_message_handle=sendblue_response.get(
-            "message_handle") if auto_approve else None
-    )
-    message_id = create_message(message)
+async def send_and_store(sends: List[Awaitable[dict]]) -> List[dict]:
+    """
+    Run sends (each returning the message row to write back) concurrently, and upsert each row
+    as soon as its send returns rather than after the slowest one, so Sendblue's status callbacks
+    find the handle. Rows that finish while a write is in flight go out together in the next
+    write, so a fast burst still costs few calls. Returns the rows in the order of sends.
+    """
+    finished: List[dict] = []
+    ready = asyncio.Event()
+    all_sent = False
+
+    async def send_one(send: Awaitable[dict]) -> dict:
+        row = await send
+        finished.append(row)
+        ready.set()
+        return row
+
+    async def write_behind():
+        while True:
+            await ready.wait()
+            ready.clear()
+            rows = finished[:]
+            del finished[:]
+            if rows:
+                await db.upsert_messages(rows)
+            if all_sent and not finished:
+                return
+
+    writer = asyncio.create_task(write_behind())
+    try:
+        return await asyncio.gather(*[send_one(send) for send in sends])
+    finally:
+        all_sent = True
+        ready.set()
+        await writer
 
-    return {
-        "conversation_id": conversation_id,
-        "message_id": message_id,
-        "status": message.status
+
+def absence_key(absence: Absence, school_id: str) -> tuple:
+    """
+    Identifies one absence: the same student can be absent on several days in one file, and each
+    day gets its own conversation. Matches initiate_conversation_job's idempotency key.
+    """
+    return (absence.id, school_id, absence.date)
+
+
+async def find_initiated_conversations(absences: List[tuple]) -> dict:
+    """
+    Look up conversations already created for these absences (same absence id, school and absence
+    date) so a retried job doesn't open a second conversation. Returns absence_key -> {"conversation_id",
+    "message"} with the initial admin message.
+
+    Conversations from before absence_date was recorded are matched the old way, by absence id and
+    school created on or after the absence date, to the latest such absence.
+    """
+    keys = {absence_key(absence, school_id) for absence, school_id in absences}
+    found = {}
+    legacy = []
+    for chunk in db.chunked(absences):
+        rows = await db.find_conversations_for_absences(
+            list({absence.id for absence, _ in chunk}),
+            list({school_id for _, school_id in chunk}),
+            min(absence.date for absence, _ in chunk).isoformat(),
+            columns="id, absence_id, school_id, absence_date, created_at, messages(id, conversation_id, content, sender_type, status, was_downgraded, sendblue_message_handle)")
+        for row in rows:
+            if row["absence_date"] is None:
+                legacy.append(row)
+                continue
+            key = (row["absence_id"], row["school_id"], date.fromisoformat(row["absence_date"]))
+            if key in keys:
+                found[key] = initiated_conversation(row)
+    for row in legacy:
+        created_on = date.fromisoformat(row["created_at"][:10])
+        candidates = [key for key in keys if key[:2] == (row["absence_id"], row["school_id"])
+                      and key[2] <= created_on and key not in found]
+        if candidates:
+            found[max(candidates, key=lambda key: key[2])] = initiated_conversation(row)
+    return found
+
+
+def initiated_conversation(row: dict) -> dict:
+    # messages are embedded oldest first (see db.find_conversations_for_absences)
+    admin_messages = [m for m in row.get("messages") or [] if m["sender_type"] == "admin"]
+    return {"conversation_id": row["id"], "message": admin_messages[0] if admin_messages else None}
+
+
+async def initiate_conversations_batch(absences: List[tuple], auto_approve: bool,
+                                       trace_ids: List[str] = None) -> List[dict]:
+    """
+    Create guardians, conversations and initial messages for a batch of (absence, school_id)
+    pairs with chunked bulk writes, then dispatch the Sendblue sends, storing each one's status
+    and handle as it returns (see send_and_store). Database calls scale with the number of
+    chunks, not the number of absences.
+
+    Safe to re-run for the same absences: existing conversations are reused, and their initial
+    message is only resent if a previous attempt's send failed. One left SENDING by a crashed
+    attempt may have reached Sendblue, so it is marked SEND_UNCONFIRMED rather than resent. trace_ids, parallel
+    to absences, are the traces of the uploads each absence came from.
+    """
+    if not absences:
+        return []
+    with telemetry.span("initiate_conversations_batch"):
+        return await _initiate_conversations_batch(absences, auto_approve, trace_ids or [None] * len(absences))
+
+
+async def _initiate_conversations_batch(absences: List[tuple], auto_approve: bool, trace_ids: List[str]) -> List[dict]:
+
+    existing = await find_initiated_conversations(absences)
+    # One conversation per absence, even if it's listed twice
+    new_absences = list({
+        absence_key(absence, school_id): (absence, school_id) for absence, school_id in absences
+        if absence_key(absence, school_id) not in existing
+    }.values())
+
+    guardian_ids = await bulk_upsert_guardians(new_absences)
+    conversation_ids = await bulk_create_conversations(new_absences, guardian_ids)
+
+    messages = [
+        Message(
+            conversation_id=conversation_id,
+            content=INITIAL_MESSAGE_TEMPLATE.format(
+                student_name=absence.student_name),
+            sender_type="admin",
+            status="SENDING" if auto_approve else "AWAITING_APPROVAL"
+        )
+        for (absence, _), conversation_id in zip(new_absences, conversation_ids)
+    ]
+    message_ids = await db.create_messages([message.model_dump() for message in messages])
+
+    # absence_key -> (conversation_id, message_id, message)
+    initiated = {
+        absence_key(absence, school_id): (conversation_id, message_id, message)
+        for (absence, school_id), conversation_id, message_id, message
+        in zip(new_absences, conversation_ids, message_ids, messages)
     }
+    for key, found in existing.items():
+        if found["message"]:
+            message_row = dict(found["message"])
+            message_id = message_row.pop("id")
+            initiated[key] = (found["conversation_id"],
+                              message_id, Message(**message_row))
+        else:
+            initiated[key] = (found["conversation_id"], None, None)
+
+    interrupted = [message_id for key, (_, message_id, message) in initiated.items()
+                   if key in existing and message and message.status == INTERRUPTED_SEND_STATUS]
+    if interrupted:
+        # Only the ones still SENDING: a worker that is alive may have stored its result meanwhile
+        unconfirmed = {row["id"] for row in await db.transition_messages(
+            interrupted, INTERRUPTED_SEND_STATUS, SEND_UNCONFIRMED)}
+        for key, (_, message_id, message) in initiated.items():
+            if message_id in unconfirmed:
+                message.status = SEND_UNCONFIRMED
+
+    statuses = {key: message.status if message else None
+                for key, (_, _, message) in initiated.items()}
+
+    if auto_approve:
+        to_send = list({
+            key: (key, absence.guardian_phone, trace_id)
+            for (absence, school_id), trace_id in zip(absences, trace_ids)
+            for key in [absence_key(absence, school_id)]
+            if initiated[key][2] and (
+                initiated[key][2].status in RESEND_STATUSES
+                or (key not in existing and initiated[key][2].status == INTERRUPTED_SEND_STATUS))
+        }.values())
+        # The shared Sendblue client paces these, so it is safe to fan them all out
+        sent = await send_and_store([
+            send_initial_message(
+                initiated[key][1], initiated[key][2], guardian_phone, trace_id)
+            for key, guardian_phone, trace_id in to_send
+        ])
+        for (key, _, _), row in zip(to_send, sent):
+            statuses[key] = row["status"]
+
+    results = []
+    for absence, school_id in absences:
+        key = absence_key(absence, school_id)
+        conversation_id, message_id, _ = initiated[key]
+        results.append({
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "status": statuses[key]
+        })
+    return results
+
+
+async def process_initiate_conversation_jobs(jobs: List[dict]) -> List[tuple]:
+    """
+    Job handler for "initiate_conversation" jobs: runs the claimed absences through bulk batches
+    (one per auto_approve setting) and fails any job whose initial message didn't get sent.
+    """
+    outcomes = {}
+    for auto_approve in (True, False):
+        group = [job for job in jobs if job["payload"]["auto_approve"] == auto_approve]
+        absences = [(Absence(**job["payload"]["absence"]),
+                     job["payload"]["school_id"]) for job in group]
+        results = await initiate_conversations_batch(
+            absences, auto_approve, [job["payload"].get("trace_id") for job in group])
+        for job, result in zip(group, results):
+            if result["status"] in RESEND_STATUSES:
+                outcomes[job["id"]] = (
+                    False, f"Initial message {result['message_id']} not sent (status {result['status']})")
+            else:
+                outcomes[job["id"]] = (True, result)
+    return [outcomes[job["id"]] for job in jobs]
+
+
+async def ai_process_conversation(conversation_history: List[dict], conversation: dict,
+                                  summary: Optional[str] = None) -> tuple:
+    """
+    Ask the model for the RFA, next status/action and a reply. Returns (AIResponseSchema, usage)
+    where usage holds the prompt/completion token counts for this call.
+    """
+    with telemetry.span("ai_process_conversation"):
+        messages = build_messages(conversation_history, summary)
 
+        completion = await llm_client.parse(
+            model=MODEL,
+            messages=messages,
+            response_format=AIResponseSchema
+        )
 
-async def ai_process_conversation(conversation_history: List[dict], conversation: dict) -> AIResponseSchema:
-    prompt = f"""
-    Given the following conversation history and participant roles, please analyze the conversation and provide:
-    1. A reason for absence (RFA) if one has been made clear. If not clear, respond with null.
-    2. A an update to the conversation status if needed. This should be chosen from Literal["in_progress", "action_needed"]
-    3. (optional) IF the updated conversation_status is "action_needed" THEN choose a recommended_action (sort of like a 
-    next step) BASED on the conversation history. Chosen from Optional[Literal["mark_as_completed", "attendance_officer_take_over"]]
-    4. A text response to send to the recipient based on the above choices.
-
-    Conversation History:
-    {json.dumps(conversation_history)}
-
-    Participant Roles:
-    A guardian of a student who was recently absent and a school admin who reacahed out to understand why the student was absent are participating in the conversation.
-
-    Please respond in JSON format with the following structure:
-    {{
-        "rfa": "excused - sick" or null,
-        "convsersation_status": "action_needed",
-        "recommended_action": "mark_as_completed" or null,
-        "response_content": "I'm sorry to hear that. Could you provide more details about the illness?"
-    }}
-
-    Here are some helpful tips and guidelines:
-    - Be friendly and empathetic in your responses.
-    - If you decide that the rfa is "excused - [anything]", the "recommended_action" should typically be "mark_as_completed".
-    - If the guardian provides a clear rfa but you're unsure whether it should be excused or unexcused, you can choose one and set the "recommended_action" to "attendance_officer_take_over".
-    - If you decide to escalate the conversation to the attendance officer, you should let the guardian know that you will let the attendance officer know and that they will be in touch soon.
-    - If users ask about how to inform the school about future absences, you can instruct them to send a text message to this phone number.
-    - Please be pretty concise in the "response_content" since these will be sent as text messages and avoid repeating yourself too much.
-    """
-
-    print(f"Prompt: {prompt}")
-
-    completion = client.beta.chat.completions.parse(
-        model="gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": "You are an AI assistant helping to process school absence conversations."},
-            {"role": "user", "content": prompt}
-        ],
-        response_format=AIResponseSchema
+    usage = completion_usage(completion)
+    telemetry.debug_sampled("AI usage for conversation %s (absence %s): %s",
+                            conversation.get("id"), conversation.get("absence_id"), usage)
+    return completion.choices[0].message.parsed, usage
+
+
+async def summarize_history(summary: Optional[str], conversation_history: List[dict]) -> str:
+    """
+    Fold conversation_history into the running summary.
+    """
+    with telemetry.span("summarize_history"):
+        completion = await llm_client.parse(
+            model=MODEL,
+            messages=build_summary_messages(summary, conversation_history),
+            response_format=HistorySummary
+        )
+    return completion.choices[0].message.parsed.summary
+
+
+def message_position(message: dict) -> tuple:
+    # (created_at, id) orders a conversation's messages; ids break created_at ties
+    return (datetime.fromisoformat(message["created_at"]), message["id"])
+
+
+async def load_conversation_history(conversation: dict) -> tuple:
+    """
+    The history to show the model for a conversation: (recent messages oldest first, running
+    summary of everything before them or None).
+
+    Reads only HISTORY_COLUMNS of the newest HISTORY_WINDOW_MESSAGES + HISTORY_SUMMARY_BATCH
+    messages, so payload and latency don't grow with the thread. Once a thread outgrows that,
+    messages older than the last HISTORY_WINDOW_MESSAGES are folded into
+    conversations.history_summary a batch at a time (paging through any backlog), and
+    history_summary_through_at/_id record the last message folded in.
+    """
+    conversation_id = conversation["id"]
+    fetch = HISTORY_WINDOW_MESSAGES + HISTORY_SUMMARY_BATCH
+    recent = await db.get_recent_messages(conversation_id, fetch, HISTORY_COLUMNS)
+    if len(recent) < fetch:
+        # The whole thread
+        return recent, None
+
+    summary = conversation.get("history_summary")
+    through = None
+    if summary and conversation.get("history_summary_through_id"):
+        through = message_position({"created_at": conversation["history_summary_through_at"],
+                                    "id": conversation["history_summary_through_id"]})
+
+    summarized = False
+    # Messages older than this read that were never summarized, e.g. a thread from before
+    # summaries existed
+    if through is None or through < message_position(recent[0]):
+        after = (conversation["history_summary_through_at"], conversation["history_summary_through_id"]) if through else None
+        async for page in db.iter_message_pages(conversation_id, after, HISTORY_COLUMNS):
+            older = [message for message in page if message_position(message) < message_position(recent[0])]
+            if older:
+                summary = await summarize_history(summary, older)
+                through, summarized = message_position(older[-1]), True
+            if len(older) < len(page):
+                break
+
+    unsummarized = [message for message in recent if through is None or message_position(message) > through]
+    to_fold = unsummarized[:-HISTORY_WINDOW_MESSAGES]
+    if summarized or len(to_fold) >= HISTORY_SUMMARY_BATCH:
+        if to_fold:
+            summary = await summarize_history(summary, to_fold)
+            through = message_position(to_fold[-1])
+        await db.update_conversation(conversation_id, {
+            "history_summary": summary,
+            "history_summary_through_at": through[0].isoformat(),
+            "history_summary_through_id": through[1]
+        })
+        unsummarized = unsummarized[-HISTORY_WINDOW_MESSAGES:]
+    return unsummarized, summary
+
+
+def parse_absence_row(row: dict) -> tuple:
+    """
+    Validate one CSV row into an (Absence, school_id) pair. Raises KeyError for a missing
+    column and ValueError (incl. pydantic ValidationError) for a bad value.
+    """
+    school_id = row['school_id'].strip()
+    if not school_id:
+        raise ValueError("school_id is empty")
+    absence = Absence(
+        # Using student_id as absence id for simplicity
+        id=row['student_id'],
+        student_id=row['student_id'],
+        student_name=row['student_name'],
+        date=date.fromisoformat(row['date']),
+        rfa=row['rfa'],
+        guardian_name=row['guardian_name'],
+        guardian_phone=row['guardian_phone']
     )
+    return absence, school_id
+
 
-    return completion.choices[0].message.parsed
+def initiate_conversation_job(absence: Absence, school_id: str, batch_id: str) -> dict:
+    return {
+        # One job per absence, so re-uploading the same CSV is a no-op
+        "idempotency_key": f"initiate_conversation:{school_id}:{absence.date}:{absence.id}",
+        "batch_id": batch_id,
+        "kind": "initiate_conversation",
+        "payload": {
+            "absence": absence.model_dump(mode="json"),
+            "school_id": school_id,
+            "auto_approve": AUTO_APPROVE,
+            "trace_id": telemetry.current_trace_id()
+        }
+    }
 
 # Endpoints
 
@@ -332,103 +778,383 @@ async def root():
     return {"message": "Hello World"}
 
 
-@app.post("/initiate_conversations")
-async def initiate_conversations(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def check_supabase():
+    await db.run(lambda: db.client().table("guardians").select("id").limit(1).execute())
+
+
+async def check_job_store():
+    await job_queue.store.batch_status("readiness-check")
+
+
+async def check_openai():
+    # Only that the client can be built; a completion per probe would cost tokens
+    await asyncio.to_thread(llm_client.connect)
+
+
+async def check_sendblue():
+    if sendblue_client.http is None:
+        raise RuntimeError("Sendblue client not started")
+    if not SENDBLUE_API_KEY or not SENDBLUE_API_SECRET:
+        raise RuntimeError("SENDBLUE_API_KEY / SENDBLUE_API_SECRET not set")
+
+
+async def run_check(check) -> dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), READY_TIMEOUT_SECONDS)
+        result = {"ok": True}
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": f"Timed out after {READY_TIMEOUT_SECONDS}s"}
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {str(e)}"}
+    result["latency_ms"] = round(1000 * (time.perf_counter() - started), 2)
+    return result
+
+
+@app.get("/ready")
+async def ready():
     """
-    Process the uploaded CSV file and initiate conversations for unexplained absences
+    Readiness probe: whether Supabase, the job store, OpenAI and Sendblue are usable, with 503
+    until they all are. "/" stays the liveness probe and touches nothing.
     """
-    content = await file.read()
-    csv_data = content.decode('utf-8')
-    csv_reader = csv.DictReader(StringIO(csv_data))
+    checks = {
+        "supabase": check_supabase,
+        "job_store": check_job_store,
+        "openai": check_openai,
+        "sendblue": check_sendblue,
+    }
+    results = await asyncio.gather(*[run_check(check) for check in checks.values()])
+    dependencies = dict(zip(checks, results))
+    is_ready = all(result["ok"] for result in results)
+    return JSONResponse(status_code=200 if is_ready else 503, content={
+        "status": "ready" if is_ready else "not_ready",
+        "dependencies": dependencies
+    })
 
-    attendance_report = AttendanceReport(
-        date=date.today(), school_id="", absences=[])
+
+@app.get("/sendblue_stats")
+async def sendblue_stats():
+    """
+    Send latency / retry counters for sizing the Sendblue connection pool and rate limit
+    """
+    return sendblue_client.stats.as_dict()
+
+
+@app.get("/ai_stats")
+async def ai_stats():
+    """
+    OpenAI queue wait / latency / retry counters for sizing OPENAI_MAX_IN_FLIGHT
+    """
+    return {
+        **llm_client.stats.as_dict(),
+        "fast_path": fast_path_stats.as_dict(),
+        "response_cache": ai_response_cache.stats()
+    }
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the guardian and conversation lookup caches
+    """
+    return db.cache_stats()
+
+
+@app.get("/inbound_stats")
+async def inbound_stats_endpoint():
+    """
+    Latency from webhook receipt to the inbound message being stored and to the reply
+    """
+    return inbound_stats.as_dict()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text exposition of request, span and job metrics
+    """
+    return PlainTextResponse(telemetry.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/initiate_conversations")
+async def initiate_conversations(file: UploadFile = File(...), stream: bool = False):
+    """
+    Process the uploaded CSV file and initiate conversations for unexplained absences.
+
+    The file is read and validated a chunk at a time and jobs are queued every INGEST_BATCH_SIZE
+    valid rows, so invalid rows are reported (up to MAX_REPORTED_ROW_ERRORS) without aborting
+    the rest. Pass stream=true to leave the per-row initiated_conversations list out of the
+    response, which keeps memory flat for very large files.
+    """
+    batch_id = str(uuid.uuid4())
+    jobs = []
     initiated_conversations = []
+    row_errors = []
+    counts = {"rows": 0, "valid": 0, "rejected": 0, "unexplained": 0, "enqueued": 0}
 
-    for row in csv_reader:
-        absence = Absence(
-            # Using student_id as absence id for simplicity
-            id=row['student_id'],
-            student_id=row['student_id'],
-            student_name=row['student_name'],
-            date=date.fromisoformat(row['date']),
-            rfa=row['rfa'],
-            guardian_name=row['guardian_name'],
-            guardian_phone=row['guardian_phone']
-        )
-        attendance_report.absences.append(absence)
-        attendance_report.school_id = row['school_id']
-
-        if absence.rfa == "Unexplained":
-            background_tasks.add_task(
-                initiate_conversation,
-                absence,
-                attendance_report.school_id,
-                AUTO_APPROVE
-            )
-            initiated_conversations.append({
-                "student_id": absence.student_id,
-                "absence_id": absence.id,
-                "guardian_phone": absence.guardian_phone
-            })
+    try:
+        async for row_number, row in iter_csv_rows(file):
+            counts["rows"] += 1
+            try:
+                if "__error__" in row:
+                    raise ValueError(row["__error__"])
+                absence, school_id = parse_absence_row(row)
+            except (KeyError, ValueError) as e:
+                counts["rejected"] += 1
+                if len(row_errors) < MAX_REPORTED_ROW_ERRORS:
+                    error = f"Missing column {e}" if isinstance(e, KeyError) else str(e)
+                    row_errors.append({"row": row_number, "error": error})
+                continue
+            counts["valid"] += 1
+
+            if absence.rfa == "Unexplained":
+                counts["unexplained"] += 1
+                jobs.append(initiate_conversation_job(absence, school_id, batch_id))
+                if not stream:
+                    initiated_conversations.append({
+                        "student_id": absence.student_id,
+                        "absence_id": absence.id,
+                        "guardian_phone": absence.guardian_phone
+                    })
+
+            if len(jobs) >= INGEST_BATCH_SIZE:
+                counts["enqueued"] += await job_queue.enqueue(jobs)
+                jobs = []
+    except UnicodeDecodeError as e:
+        # Can't resync after bad bytes; keep what was already queued and report where it stopped
+        row_errors.append(
+            {"row": None, "error": f"File is not valid UTF-8 after {counts['rows']} rows: {str(e)}"})
+
+    if jobs:
+        counts["enqueued"] += await job_queue.enqueue(jobs)
+
+    response = {
+        "status": "Conversation initiation jobs queued for unexplained absences",
+        "batch_id": batch_id,
+        **counts,
+        "row_errors": row_errors
+    }
+    if not stream:
+        response["initiated_conversations"] = initiated_conversations
+    return response
 
-    return {"status": "Conversation initiation tasks added for unexplained absences", "initiated_conversations": initiated_conversations}
+
+@app.get("/jobs/{batch_id}")
+async def job_batch_status(batch_id: str):
+    """
+    Progress of an /initiate_conversations upload: job counts by status plus dead-lettered jobs
+    """
+    return await job_queue.store.batch_status(batch_id)
 
 
 @app.post("/approve_and_send_message/{message_id}")
 async def approve_and_send_message(message_id: str):
     # Fetch the message
-    message_result = supabase.table("messages").select(
-        "*").eq("id", message_id).single().execute()
-    if not message_result.data:
+    message_row = await db.get_message(message_id)
+    if not message_row:
         raise HTTPException(status_code=404, detail="Message not found")
 
-    message = Message(**message_result.data)
+    message = Message(**message_row)
 
     if message.status != "AWAITING_APPROVAL":
         raise HTTPException(
             status_code=400, detail="Message is not in AWAITING_APPROVAL status")
 
     # Fetch the conversation
-    conversation_result = supabase.table("conversations").select(
-        "*").eq("id", message.conversation_id).single().execute()
-    if not conversation_result.data:
+    conversation = await db.get_conversation(message.conversation_id)
+    if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    guardian_id = conversation_result.data.get("guardian_id")
+    guardian_id = conversation.get("guardian_id")
     if not guardian_id:
         raise HTTPException(
             status_code=404, detail="Guardian not associated with conversation")
 
     # Fetch the guardian
-    guardian_result = supabase.table("guardians").select(
-        "phone_number").eq("id", guardian_id).single().execute()
-    if not guardian_result.data:
+    guardian = await db.get_guardian(guardian_id)
+    if not guardian:
         raise HTTPException(status_code=404, detail="Guardian not found")
 
-    guardian_phone = guardian_result.data["phone_number"]
+    guardian_phone = guardian["phone_number"]
     if not guardian_phone:
         raise HTTPException(
             status_code=404, detail="Guardian phone number not found")
 
     # Send the message
     try:
-        sendblue_response = await sendblue_send_message(guardian_phone, message.content)
+        sendblue_response = await sendblue_send_message(
+            guardian_phone, message.content, idempotency_key=f"message:{message_id}")
     except HTTPException as e:
         # Log the error and re-raise
         print(f"Failed to send message via Sendblue: {str(e)}")
         raise
 
     # Update the message status
-    updated_message = supabase.table("messages").update({
+    await db.update_message(message_id, {
         "status": sendblue_response.get("status"),
         "was_downgraded": sendblue_response.get("was_downgraded"),
         "sendblue_message_handle": sendblue_response.get("message_handle")
-    }).eq("id", message_id).execute()
+    })
 
     return {"status": "Message approved and sent", "sendblue_response": sendblue_response}
 
 
+@app.post("/approve_and_send_messages")
+async def approve_and_send_messages(request: BulkApproveRequest):
+    """
+    Approve and send many AWAITING_APPROVAL messages at once, by id or by school/date.
+
+    Messages, conversations and guardians are looked up with chunked in_() queries and the
+    messages are claimed (moved to SENDING) in bulk, so two officers approving the same drafts
+    can't double-text a guardian. Sends run APPROVE_MAX_CONCURRENCY at a time; messages whose
+    send fails go back to AWAITING_APPROVAL. Returns a result per message.
+    """
+    if request.message_ids is None and request.created_on is None:
+        raise HTTPException(status_code=400, detail="Provide message_ids or created_on")
+
+    if request.message_ids is not None:
+        message_ids = list(dict.fromkeys(request.message_ids))
+    else:
+        since = request.created_on.isoformat()
+        until = date.fromordinal(request.created_on.toordinal() + 1).isoformat()
+        conversations = await db.find_conversations(request.school_id, since, until, columns="id")
+        messages = await db.find_messages([c["id"] for c in conversations], "AWAITING_APPROVAL", columns="id")
+        message_ids = [m["id"] for m in messages]
+    if len(message_ids) > APPROVE_MAX_MESSAGES:
+        raise HTTPException(
+            status_code=400, detail=f"{len(message_ids)} messages to approve, at most {APPROVE_MAX_MESSAGES} per call")
+
+    with telemetry.span("approve_and_send_messages"):
+        results = await _approve_and_send_messages(message_ids)
+
+    counts = {"sent": 0, "unconfirmed": 0, "failed": 0, "skipped": 0}
+    for result in results.values():
+        counts[result["result"]] += 1
+    return {
+        "status": "Messages approved",
+        "requested": len(message_ids),
+        **counts,
+        "results": [results[message_id] for message_id in message_ids]
+    }
+
+
+async def _approve_and_send_messages(message_ids: List[str]) -> dict:
+    results = {}
+    claimed = await db.transition_messages(message_ids, "AWAITING_APPROVAL", "SENDING")
+    claimed_ids = {row["id"] for row in claimed}
+    unclaimed = [message_id for message_id in message_ids if message_id not in claimed_ids]
+    if unclaimed:
+        statuses = {row["id"]: row["status"] for row in await db.get_messages(unclaimed, columns="id, status")}
+        for message_id in unclaimed:
+            error = (f"Message is in {statuses[message_id]} status, not AWAITING_APPROVAL"
+                     if message_id in statuses else "Message not found")
+            results[message_id] = {"message_id": message_id, "result": "skipped", "error": error}
+
+    conversations = await db.get_conversations([row["conversation_id"] for row in claimed])
+    guardians = await db.get_guardians([
+        conversation["guardian_id"] for conversation in conversations.values() if conversation.get("guardian_id")])
+
+    to_send = []
+    # Full rows of messages that can't be sent, back to AWAITING_APPROVAL so they can be
+    # approved again
+    updated = []
+    for row in claimed:
+        conversation = conversations.get(row["conversation_id"]) or {}
+        guardian = guardians.get(conversation.get("guardian_id")) or {}
+        if guardian.get("phone_number"):
+            to_send.append((row, guardian["phone_number"]))
+        else:
+            results[row["id"]] = {"message_id": row["id"], "result": "failed",
+                                  "error": "Guardian phone number not found"}
+            updated.append({**row, "status": "AWAITING_APPROVAL"})
+
+    semaphore = asyncio.Semaphore(APPROVE_MAX_CONCURRENCY)
+
+    async def send(row: dict, guardian_phone: str) -> dict:
+        async with semaphore:
+            try:
+                response = await sendblue_send_message(
+                    guardian_phone, row["content"], idempotency_key=f"message:{row['id']}")
+            except HTTPException as e:
+                results[row["id"]] = {"message_id": row["id"], "result": "failed", "error": e.detail}
+                return {**row, "status": "AWAITING_APPROVAL"}
+        results[row["id"]] = {"message_id": row["id"],
+                              "result": "unconfirmed" if response.get("status") == SEND_UNCONFIRMED else "sent",
+                              "sendblue_status": response.get("status"),
+                              "sendblue_message_handle": response.get("message_handle")}
+        return {
+            **row,
+            "status": response.get("status"),
+            "was_downgraded": response.get("was_downgraded"),
+            "sendblue_message_handle": response.get("message_handle")
+        }
+
+    if updated:
+        await db.upsert_messages(updated)
+    # Each send's status and handle is stored as it returns, so status callbacks find it
+    await send_and_store([send(row, phone) for row, phone in to_send])
+    return results
+
+
+@app.get("/analytics/summary")
+async def analytics_summary(school_id: str, start: date, end: date, refresh: bool = False):
+    """
+    RFA distribution, escalation and response rates, time to resolution and delivery/downgrade
+    rates for the conversations a school started on days start..end (inclusive, UTC).
+
+    Aggregated in Postgres from the daily rollup, so the cost doesn't grow with the number of
+    messages. The rollup trails live data by up to ANALYTICS_REFRESH_INTERVAL_SECONDS; pass
+    refresh=true to fold in pending changes first.
+    """
+    if start > end:
+        raise HTTPException(status_code=400, detail="start is after end")
+    if refresh:
+        await analytics_refresher.refresh(wait=True)
+    rows = await db.get_analytics_summary(school_id, start, end)
+    return {
+        "school_id": school_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        **analytics.summarize(rows)
+    }
+
+
+@app.get("/analytics/export")
+async def analytics_export(school_id: str, start: date, end: date,
+                           report: Literal["conversations", "daily"] = "conversations",
+                           export_format: Literal["csv", "parquet"] = Query("csv", alias="format"),
+                           refresh: bool = False):
+    """
+    Stream a report for days start..end (inclusive, UTC) as CSV or Parquet: one row per
+    conversation with its outcome and delivery counts (report=conversations), or the daily
+    totals per RFA (report=daily).
+
+    Rows are read in keyset pages of ANALYTICS_EXPORT_PAGE_SIZE and written out as they arrive,
+    so memory stays flat however large the export is. Parquet needs the optional pyarrow package.
+    """
+    if start > end:
+        raise HTTPException(status_code=400, detail="start is after end")
+    if export_format == "parquet" and not analytics.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow; install it or use format=csv")
+    if refresh:
+        await analytics_refresher.refresh(wait=True)
+
+    pages = await analytics.with_first_page(
+        analytics.report_pages(report, school_id, start, end, ANALYTICS_EXPORT_PAGE_SIZE))
+    chunks = analytics.parquet_chunks(pages, report) if export_format == "parquet" else analytics.csv_chunks(pages, report)
+    filename = f"{report}_{school_id}_{start.isoformat()}_{end.isoformat()}.{export_format}"
+    return StreamingResponse(chunks, media_type=analytics.EXPORT_MEDIA_TYPES[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@app.get("/analytics_stats")
+async def analytics_stats():
+    """
+    Rollup refresh counts and latency
+    """
+    return analytics_refresher.stats.as_dict()
+
+
 @app.post("/sendblue_status_callback")
 async def sendblue_status_callback(callback_data: dict):
     # TODO: change the ngrok url for this
@@ -438,20 +1164,28 @@ async def sendblue_status_callback(callback_data: dict):
     if not message_handle or not new_status:
         raise HTTPException(status_code=400, detail="Invalid callback data")
 
-    updated_message = supabase.table("messages").update({
-        "status": new_status,
-        "was_downgraded": callback_data.get("was_downgraded")
-    }).eq("sendblue_message_handle", message_handle).execute()
+    # Written to messages in bulk by the status callback buffer
+    status_callbacks.add(message_handle, new_status, callback_data.get("was_downgraded"))
+
+    return {"status": "Message status queued"}
 
-    if not updated_message.data:
-        raise HTTPException(status_code=404, detail="Message not found")
 
-    return {"status": "Message status updated"}
+@app.get("/status_callback_stats")
+async def status_callback_stats():
+    """
+    Callbacks received vs coalesced away, and bulk flush counts/latency
+    """
+    return status_callbacks.stats.as_dict()
 
 
 @app.post("/process_response")
 async def process_response(payload: dict):
-    print(f"Received webhook payload: {payload}")
+    """
+    Sendblue inbound-message webhook. Only validates and durably queues the message, then acks;
+    the AI classification and reply happen in the job queue (handle_inbound_message). Jobs are
+    keyed on Sendblue's message_handle, so a redelivered webhook is a no-op.
+    """
+    telemetry.debug_sampled("Received webhook payload: %s", payload)
     sender_phone = payload.get("from_number")
     to_phone = payload.get("to_number")
     message_content = payload.get("content")
@@ -459,57 +1193,217 @@ async def process_response(payload: dict):
 
     if not sender_phone or not to_phone or not message_content or not sendblue_message_handle:
         raise HTTPException(status_code=400, detail="Invalid webhook payload")
-    
+
+    # Sendblue redelivers webhooks it thinks we missed; repeats seen by this worker are dropped
+    # here, the job store's idempotency key and the messages unique constraint catch the rest
+    if recent_inbound_handles.get(sendblue_message_handle):
+        inbound_stats.duplicates["webhook"] += 1
+        return {"status": "Duplicate message ignored"}
+
+    enqueued = await job_queue.enqueue([{
+        "idempotency_key": f"process_response:{sendblue_message_handle}",
+        "kind": "process_response",
+        "payload": {"webhook": payload, "received_at": time.time(), "trace_id": telemetry.current_trace_id()}
+    }])
+    recent_inbound_handles.set(sendblue_message_handle, True)
+    if not enqueued:
+        inbound_stats.duplicates["webhook"] += 1
+        return {"status": "Duplicate message ignored"}
+
+    return {"status": "Message received"}
+
+
+async def process_response_jobs(jobs: List[dict]) -> List[tuple]:
+    """
+    Job handler for "process_response" jobs. Messages from different guardians are handled
+    concurrently; messages from the same guardian are handled in order.
+    """
+    by_sender = {}
+    for job in jobs:
+        by_sender.setdefault(job["payload"]["webhook"]["from_number"], []).append(job)
+
+    outcomes = {}
+
+    async def handle_sender(sender_jobs: List[dict]):
+        for job in sender_jobs:
+            try:
+                with telemetry.trace(job["payload"].get("trace_id")):
+                    result = await handle_inbound_message(job["payload"]["webhook"], job["payload"]["received_at"])
+                outcomes[job["id"]] = (True, result)
+            except HTTPException as e:
+                if e.status_code < 500 and e.status_code != 429:
+                    # Unknown guardian / no conversation etc. Retrying won't help
+                    outcomes[job["id"]] = (True, {"status": "ignored", "detail": e.detail})
+                else:
+                    outcomes[job["id"]] = (False, f"{e.status_code}: {e.detail}")
+            except Exception as e:
+                outcomes[job["id"]] = (False, f"{type(e).__name__}: {str(e)}")
+            inbound_stats.record("stored", time.time() - job["payload"]["received_at"])
+
+    await asyncio.gather(*[handle_sender(sender_jobs) for sender_jobs in by_sender.values()])
+    return [outcomes[job["id"]] for job in jobs]
+
+
+async def handle_inbound_message(payload: dict, received_at: float) -> dict:
+    """
+    Store an inbound guardian text and, if the conversation still needs the AI, schedule a
+    debounced evaluation. Texts that arrive within RESPONSE_DEBOUNCE_SECONDS of each other are
+    answered by a single evaluation (see evaluate_conversation).
+
+    Guardian and conversation lookups normally come from the db caches, so this is one insert.
+    """
+    sender_phone = payload.get("from_number")
+    message_content = payload.get("content")
+    sendblue_message_handle = payload.get("message_handle")
+
     normalized_sender_phone = sender_phone.lstrip('+')
 
     # Find the guardian based on the sender's phone number
-    guardian = supabase.table("guardians").select("id, school_id").eq(
-        "phone_number", normalized_sender_phone).single().execute()
-    if not guardian.data:
+    guardian = await db.get_guardian_by_phone(normalized_sender_phone)
+    if not guardian:
         raise HTTPException(status_code=404, detail="Guardian not found")
 
-    guardian_id = guardian.data['id']
-    school_id = guardian.data['school_id']
+    guardian_id = guardian['id']
+    school_id = guardian['school_id']
 
     # Find the most recent active conversation for this guardian
-    conversation = supabase.table("conversations").select("*").eq("guardian_id", guardian_id).eq(
-        "school_id", school_id).order("created_at", desc=True).limit(1).execute()
+    conversation = await db.get_latest_conversation(guardian_id, school_id)
 
-    if not conversation.data:
+    if not conversation:
         # Handle case where no active conversation is found
         raise HTTPException(
             status_code=404, detail="No active conversation found for this guardian")
 
-    conversation_id = conversation.data[0]['id']
+    conversation_id = conversation['id']
 
     new_message = Message(
         conversation_id=conversation_id,
         content=message_content,
         sender_type="guardian",
         status="RECEIVED",
-        sendblue_message_handle=conversation_id
+        sendblue_message_handle=sendblue_message_handle
     )
-    # Create the recevied message in DB
-    create_message(new_message)
-
-    # Get the conversation from conversation_id
-    conversation = supabase.table("conversations").select(
-        "*").eq("id", conversation_id).single().execute()
-    if not conversation.data:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    # Create the recevied message in DB, unless this handle was stored already (a retried job).
+    # Scheduling the evaluation below is keyed on the handle too, so repeating it is harmless.
+    if not await db.insert_message_once(new_message.model_dump()):
+        inbound_stats.duplicates["stored"] += 1
 
-    if not conversation.data.get("rfa") or conversation.data.get("status") == ConversationStatus.ACTION_NEEDED:
+    if not conversation.get("rfa") or conversation.get("status") == ConversationStatus.ACTION_NEEDED:
         """
         If the conversation does not have an RFA, this means the AI should re-consider the conversation with it's new message and see it can label it with an RFA and next action.
         """
+        await job_queue.enqueue([{
+            "idempotency_key": f"evaluate_conversation:{conversation_id}:{sendblue_message_handle}",
+            "kind": "evaluate_conversation",
+            "payload": {
+                "conversation_id": conversation_id,
+                "message_handle": sendblue_message_handle,
+                "received_at": received_at,
+                "trace_id": telemetry.current_trace_id()
+            },
+            "delay_seconds": RESPONSE_DEBOUNCE_SECONDS
+        }])
+        return {"conversation_id": conversation_id, "status": "Evaluation scheduled"}
 
-        # Get the conversation's messages using the conversation_id
-        messages = supabase.table("messages").select(
-            "*").eq("conversation_id", conversation_id).order("created_at").execute()
+    else:
+        """
+         If the conversation already has an RFA that means that we've already escalated this to a human and they should be handling it. We'll just notify them.
+         """
+        print("TODO: Notify admin that the guardian sent a new message")
 
-        # Pass the conversation to GPT to get RFA, next action, and response content
-        ai_response = await ai_process_conversation(messages.data, conversation.data)
-        print("Received AI response:" + str(ai_response))
+    return {"status": "Message processed successfully"}
+
+
+def pending_guardian_messages(messages: List[dict]) -> List[dict]:
+    """
+    Guardian messages that arrived after the last admin message, i.e. still waiting for a reply.
+    """
+    pending = []
+    for message in reversed(messages):
+        if message["sender_type"] != "guardian":
+            break
+        pending.append(message)
+    return pending[::-1]
+
+
+async def evaluate_conversation_jobs(jobs: List[dict]) -> List[tuple]:
+    """
+    Job handler for "evaluate_conversation" jobs. Different conversations are evaluated concurrently.
+    """
+    async def run(job: dict) -> tuple:
+        try:
+            with telemetry.trace(job["payload"].get("trace_id")):
+                result = await evaluate_conversation(
+                    job["payload"]["conversation_id"], job["payload"]["message_handle"])
+            if result.get("message_id"):
+                inbound_stats.record("replied", time.time() - job["payload"]["received_at"])
+            return (True, result)
+        except HTTPException as e:
+            if e.status_code < 500 and e.status_code != 429:
+                return (True, {"status": "ignored", "detail": e.detail})
+            return (False, f"{e.status_code}: {e.detail}")
+        except Exception as e:
+            return (False, f"{type(e).__name__}: {str(e)}")
+
+    return list(await asyncio.gather(*[run(job) for job in jobs]))
+
+
+async def evaluate_conversation(conversation_id: str, message_handle: str) -> dict:
+    """
+    Run the AI over a conversation and reply once for the burst of guardian texts ending with
+    message_handle. If a newer guardian text arrived since this job was scheduled, its own job
+    will answer the whole burst, so this one is a no-op (unless the burst has been going on for
+    longer than RESPONSE_MAX_DEBOUNCE_SECONDS). The per-conversation lock keeps two evaluations
+    from racing on the same conversation row.
+    """
+    async with conversation_locks.hold(conversation_id):
+        # Uncached: another worker may have just changed the RFA, status or history summary
+        conversation = await db.get_conversation(conversation_id, fresh=True)
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        if conversation.get("rfa") and conversation.get("status") != ConversationStatus.ACTION_NEEDED:
+            return {"conversation_id": conversation_id, "status": "skipped", "reason": "already resolved"}
+
+        # The recent messages (only the columns used here) plus a summary of older ones
+        messages, summary = await load_conversation_history(conversation)
+        pending = pending_guardian_messages(messages)
+        if not pending:
+            return {"conversation_id": conversation_id, "status": "skipped", "reason": "already answered"}
+
+        burst_age = time.time() - datetime.fromisoformat(pending[0]["created_at"]).timestamp()
+        if pending[-1]["sendblue_message_handle"] != message_handle and burst_age < RESPONSE_MAX_DEBOUNCE_SECONDS:
+            return {"conversation_id": conversation_id, "status": "skipped", "reason": "coalesced into a newer message"}
+
+        # Obvious first replies ("she's sick") are classified locally; everything else goes to GPT
+        fast_path = None
+        if not conversation.get("rfa"):
+            fast_path = classify_messages([message["content"] for message in pending])
+
+        # Conversations with the same normalized content (e.g. a bare "sick" after the standard
+        # opener) reuse an earlier classification
+        cached = None
+        if not fast_path:
+            cache_key, student_name = ai_response_cache.key(messages, conversation, summary)
+            cached = await ai_response_cache.get(cache_key, student_name)
+
+        if fast_path:
+            ai_response = AIResponseSchema(
+                rfa=fast_path.rfa,
+                conversation_status=ConversationStatus.ACTION_NEEDED,
+                recommended_action=RecommendedAction.ATTENDANCE_OFFICER_TAKE_OVER if fast_path.escalate
+                else RecommendedAction.MARK_AS_COMPLETED,
+                response_content=fast_path.response_content
+            )
+            usage = {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+        elif cached:
+            ai_response = AIResponseSchema(**cached)
+            usage = {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+        else:
+            # Pass the conversation to GPT to get RFA, next action, and response content
+            ai_response, usage = await ai_process_conversation(messages, conversation, summary)
+            await ai_response_cache.set(cache_key, student_name, ai_response.model_dump(mode="json"))
+        telemetry.debug_sampled("Received AI response: %s", ai_response)
 
         # Update the conversation with the new RFA and status in DB
         update_data = {
@@ -519,73 +1413,95 @@ async def process_response(payload: dict):
         if ai_response.conversation_status == ConversationStatus.ACTION_NEEDED:
             update_data["recommended_action"] = ai_response.recommended_action
 
-        supabase.table("conversations").update(
-            update_data).eq("id", conversation_id).execute()
+        await db.update_conversation(conversation_id, update_data)
 
         if AUTO_APPROVE:
             """
             If auto approve is on, try sending the message via Sendblue
             """
 
-            # Get conversation from conversation_id
-            conversation_result = supabase.table("conversations").select(
-                "*").eq("id", conversation_id).single().execute()
-            if not conversation_result.data:
-                raise HTTPException(
-                    status_code=404, detail="Conversation not found")
-
             # Get guardian_id from conversation
-            guardian_id = conversation_result.data.get("guardian_id")
+            guardian_id = conversation.get("guardian_id")
             if not guardian_id:
                 raise HTTPException(
                     status_code=404, detail="Guardian not associated with conversation")
 
             # Get the guardian (phone number col only) from guardian_id
-            guardian_result = supabase.table("guardians").select(
-                "phone_number").eq("id", guardian_id).single().execute()
-            if not guardian_result.data:
+            guardian_result = await db.get_guardian(guardian_id)
+            if not guardian_result:
                 raise HTTPException(
                     status_code=404, detail="Guardian not found")
 
-            guardian_phone = guardian_result.data["phone_number"]
+            guardian_phone = guardian_result["phone_number"]
             if not guardian_phone:
                 raise HTTPException(
                     status_code=404, detail="Guardian phone number not found")
 
+        # Store the reply before sending it: if this job is retried after the send (even from
+        # another worker), the stored reply makes the retry a no-op ("already answered")
+        # instead of a second text
+        ai_message = Message(
+            conversation_id=conversation_id,
+            content=ai_response.response_content,
+            sender_type="admin",
+            status="SENDING" if AUTO_APPROVE else "AWAITING_APPROVAL"
+        )
+        ai_message_id = await create_message(ai_message)
+
+        if AUTO_APPROVE:
             # Send the message
             try:
-                sendblue_response = await sendblue_send_message(guardian_phone, ai_response.response_content)
+                sendblue_response = await sendblue_send_message(
+                    guardian_phone, ai_message.content, idempotency_key=f"message:{ai_message_id}")
             except HTTPException as e:
-                # Log the error and re-raise
+                # Definitely not sent: drop the reply so the retried job answers the burst again
                 print(f"Failed to send message via Sendblue: {str(e)}")
+                await db.delete_message(ai_message_id)
                 raise
 
-        # Create message in DB
-        ai_message = Message(
-            conversation_id=conversation_id,
-            content=ai_response.response_content,
-            sender_type="admin",
-            status="AWAITING_APPROVAL" if not AUTO_APPROVE else sendblue_response.get(
-                "status"),
-            was_downgraded=sendblue_response.get(
-                "was_downgraded") if AUTO_APPROVE else None,
-            sendblue_message_handle=sendblue_response.get(
-                "message_handle") if AUTO_APPROVE else None
-        )
-        ai_message_id = create_message(ai_message)
+            ai_message.status = sendblue_response.get("status")
+            ai_message.was_downgraded = sendblue_response.get("was_downgraded")
+            ai_message.sendblue_message_handle = sendblue_response.get("message_handle")
+            await db.update_message(ai_message_id, {
+                "status": ai_message.status,
+                "was_downgraded": ai_message.was_downgraded,
+                "sendblue_message_handle": ai_message.sendblue_message_handle
+            })
+
         return {
             "conversation_id": conversation_id,
             "message_id": ai_message_id,
-            "status": ai_message.status
+            "status": ai_message.status,
+            "coalesced_messages": len(pending),
+            "classified_by": "rules" if fast_path else "cache" if cached else "llm",
+            "usage": usage
         }
 
-    else:
-        """
-         If the conversation already has an RFA that means that we've already escalated this to a human and they should be handling it. We'll just notify them.
-         """
-        print("TODO: Notify admin that the guardian sent a new message")
 
-    return {"status": "Message processed successfully"}
+def serve():
+    """
+    Run the server. Every worker process imports this module itself, so each one builds its own
+    Supabase, OpenAI and Sendblue clients (lazily), job workers and status-callback buffer; what
+    the processes share is the job store, the conversation locks (LOCK_BACKEND) and the AI
+    cache's SQLite tier.
+    """
+    parser = argparse.ArgumentParser(description="Run the backend API server")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")),
+                        help="server processes (default WEB_CONCURRENCY or 1)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # In-process locks can't serialize a conversation across processes
+        os.environ.setdefault("LOCK_BACKEND", "file")
+        if os.environ.get("LOCK_BACKEND") == "local":
+            logger.warning("LOCK_BACKEND=local with several workers: conversations are only locked per process")
+
+    import uvicorn
+    uvicorn.run("backend.main:app", host=args.host, port=args.port,
+                workers=args.workers, proxy_headers=True)
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    serve()
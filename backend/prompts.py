@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Type
+
+from pydantic import BaseModel
+
+MODEL = "gpt-4o-2024-08-06"
+
+SYSTEM_PROMPT = "You are an AI assistant helping to process school absence conversations."
+
+# Static instructions. They go first and never change between turns so OpenAI's prompt cache can
+# reuse them; only the conversation history message after them varies.
+INSTRUCTIONS = """
+Given the conversation history and participant roles, please analyze the conversation and provide:
+1. A reason for absence (RFA) if one has been made clear. If not clear, respond with null.
+2. A an update to the conversation status if needed. This should be chosen from Literal["in_progress", "action_needed"]
+3. (optional) IF the updated conversation_status is "action_needed" THEN choose a recommended_action (sort of like a
+next step) BASED on the conversation history. Chosen from Optional[Literal["mark_as_completed", "attendance_officer_take_over"]]
+4. A text response to send to the recipient based on the above choices.
+
+Participant Roles:
+A guardian of a student who was recently absent and a school admin who reacahed out to understand why the student was absent are participating in the conversation.
+The conversation history is a JSON list of {"role": "admin" | "guardian", "content": ...} turns, oldest first.
+In long conversations it starts with a {"role": "summary", ...} turn summarizing the earlier messages.
+
+Please respond in JSON format with the following structure:
+{
+    "rfa": "excused - sick" or null,
+    "convsersation_status": "action_needed",
+    "recommended_action": "mark_as_completed" or null,
+    "response_content": "I'm sorry to hear that. Could you provide more details about the illness?"
+}
+
+Here are some helpful tips and guidelines:
+- Be friendly and empathetic in your responses.
+- If you decide that the rfa is "excused - [anything]", the "recommended_action" should typically be "mark_as_completed".
+- If the guardian provides a clear rfa but you're unsure whether it should be excused or unexcused, you can choose one and set the "recommended_action" to "attendance_officer_take_over".
+- If you decide to escalate the conversation to the attendance officer, you should let the guardian know that you will let the attendance officer know and that they will be in touch soon.
+- If users ask about how to inform the school about future absences, you can instruct them to send a text message to this phone number.
+- Please be pretty concise in the "response_content" since these will be sent as text messages and avoid repeating yourself too much.
+""".strip()
+
+STATIC_PREFIX = [{"role": "system", "content": SYSTEM_PROMPT + "\n\n" + INSTRUCTIONS}]
+
+
+def prompt_version(response_format: Type[BaseModel]) -> str:
+    """
+    Fingerprint of everything that shapes the model's answer besides the history. Changes
+    whenever the model, instructions or response schema change.
+    """
+    material = json.dumps([MODEL, STATIC_PREFIX, response_format.model_json_schema()], sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+# Rough history budget in tokens. Older turns beyond it are dropped (the first turn, i.e. the
+# opening admin message or the summary of older messages, is always kept so the model knows which
+# absence this is about).
+HISTORY_TOKEN_BUDGET = int(os.environ.get("PROMPT_HISTORY_TOKEN_BUDGET", "1500"))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting without a tokenizer
+    return len(text) // 4 + 1
+
+
+def project_messages(messages: List[dict]) -> List[dict]:
+    """
+    Reduce messages rows to what the model needs: who said it and what they said.
+    """
+    return [{"role": message["sender_type"], "content": message["content"]} for message in messages]
+
+
+def fit_history(turns: List[dict], budget: int = None) -> List[dict]:
+    """
+    Keep the opening turn plus as many of the newest turns as fit in the token budget, with a
+    marker where older turns were left out.
+    """
+    budget = budget or HISTORY_TOKEN_BUDGET
+    if not turns:
+        return []
+
+    first, rest = turns[0], turns[1:]
+    remaining = budget - estimate_tokens(first["content"])
+    kept = []
+    for turn in reversed(rest):
+        cost = estimate_tokens(turn["content"])
+        if kept and cost > remaining:
+            break
+        kept.append(turn)
+        remaining -= cost
+    kept.reverse()
+
+    omitted = len(rest) - len(kept)
+    if omitted:
+        return [first, {"role": "note", "content": f"{omitted} earlier messages omitted"}] + kept
+    return [first] + kept
+
+
+def build_messages(conversation_history: List[dict], summary: Optional[str] = None) -> List[dict]:
+    """
+    Chat messages for one AI turn: the static prefix followed by the projected, budgeted history,
+    led by the running summary of older messages if there is one.
+    """
+    turns = project_messages(conversation_history)
+    if summary:
+        turns = [{"role": "summary", "content": summary}] + turns
+    history = fit_history(turns)
+    return STATIC_PREFIX + [{
+        "role": "user",
+        "content": "Conversation History:\n" + json.dumps(history, ensure_ascii=False, separators=(",", ":"))
+    }]
+
+
+SUMMARY_INSTRUCTIONS = """
+You keep a running summary of a text conversation between a school admin and the guardian of an
+absent student. Given the current summary (empty at first) and the messages that came after it,
+return the updated summary: the absence, reasons given, what the school asked or promised, and
+anything still open. Plain prose, at most 120 words.
+""".strip()
+
+
+def build_summary_messages(summary: Optional[str], conversation_history: List[dict]) -> List[dict]:
+    """
+    Chat messages asking the model to fold conversation_history into summary.
+    """
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": json.dumps(
+            {"summary": summary or "", "messages": project_messages(conversation_history)},
+            ensure_ascii=False, separators=(",", ":"))},
+    ]
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from . import telemetry
+from .cache import TTLCache
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# A send with an idempotency key is only retried where Sendblue can't have accepted it
+SAFE_RETRY_STATUS_CODES = {429, 503}
+SAFE_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class SendUnconfirmed(Exception):
+    """
+    A keyed send failed in a way that may still have delivered the message (timeout after the
+    request went out, 5xx), so it must not be sent again automatically.
+    """
+
+
+class TokenBucket:
+    """
+    Simple asyncio token bucket so we never send faster than Sendblue allows,
+    no matter how many tasks are trying to send at once.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens +
+                                  (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendblueStats:
+    def __init__(self):
+        self.sends = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.deduplicated = 0
+        self.unconfirmed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_rate_wait = 0.0
+
+    def record_send(self, latency: float):
+        self.sends += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self) -> dict:
+        return {
+            "sends": self.sends,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "deduplicated": self.deduplicated,
+            "unconfirmed": self.unconfirmed,
+            "avg_latency_ms": round(1000 * self.total_latency / self.sends, 2) if self.sends else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency, 2),
+            "total_rate_wait_ms": round(1000 * self.total_rate_wait, 2),
+        }
+
+
+class SendblueClient:
+    """
+    App-lifetime Sendblue client. Holds one pooled httpx.AsyncClient (keep-alive,
+    bounded connections), a token bucket matched to Sendblue's send rate, and retries
+    429/5xx responses with exponential backoff.
+
+    Sends with an idempotency key (one per outbound message) go out at most once per process:
+    a repeat within SENDBLUE_IDEMPOTENCY_TTL_SECONDS gets the first response back, and a repeat
+    while the first is in flight waits for it. Such sends are also only retried where Sendblue
+    can't have accepted them; other failures raise SendUnconfirmed.
+    """
+
+    def __init__(self, base_url: str, api_key: str, api_secret: str):
+        self.base_url = base_url
+        self.headers = {
+            "sb-api-key-id": api_key,
+            "sb-api-secret-key": api_secret,
+            "Content-Type": "application/json"
+        }
+        # Tuning knobs, read when the client is built so backend/.env has been loaded.
+        # Defaults are sized for Sendblue's documented send limits.
+        self.max_connections = int(os.environ.get("SENDBLUE_MAX_CONNECTIONS", "20"))
+        self.max_keepalive = int(os.environ.get("SENDBLUE_MAX_KEEPALIVE", "10"))
+        self.max_retries = int(os.environ.get("SENDBLUE_MAX_RETRIES", "3"))
+        self.timeout = float(os.environ.get("SENDBLUE_TIMEOUT_SECONDS", "15"))
+        self.bucket = TokenBucket(
+            float(os.environ.get("SENDBLUE_RATE_PER_SECOND", "10")),
+            int(os.environ.get("SENDBLUE_BURST", "10")))
+        self.stats = SendblueStats()
+        self.http: Optional[httpx.AsyncClient] = None
+        # idempotency key -> Sendblue response, and sends still in flight
+        self.sent = TTLCache(int(os.environ.get("SENDBLUE_IDEMPOTENCY_CACHE_SIZE", "10000")),
+                             float(os.environ.get("SENDBLUE_IDEMPOTENCY_TTL_SECONDS", "86400")))
+        self.in_flight: Dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url or "",
+            # Unset credentials fail the sends (and GET /ready), not startup
+            headers={name: value for name, value in self.headers.items() if value is not None},
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+            ),
+        )
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    async def post(self, path: str, payload: dict, idempotency_key: Optional[str] = None) -> dict:
+        """
+        POST to Sendblue under the rate limit, retrying rate-limit and server errors.
+        Raises httpx.HTTPStatusError / httpx.RequestError once retries are exhausted, or
+        SendUnconfirmed for a keyed send whose outcome is unknown.
+        """
+        if idempotency_key is None:
+            return await self._post(path, payload, keyed=False)
+
+        response = self.sent.get(idempotency_key)
+        if response is None and idempotency_key in self.in_flight:
+            # Raises if that send failed
+            response = await asyncio.shield(self.in_flight[idempotency_key])
+        if response is not None:
+            self.stats.deduplicated += 1
+            return response
+
+        # Shielded so a cancelled caller can't abandon a send halfway
+        send = asyncio.ensure_future(self._post(path, payload, keyed=True))
+        self.in_flight[idempotency_key] = send
+        send.add_done_callback(lambda _: self._finished(idempotency_key, send))
+        return await asyncio.shield(send)
+
+    def _finished(self, idempotency_key: str, send: asyncio.Task):
+        self.in_flight.pop(idempotency_key, None)
+        if not send.cancelled() and send.exception() is None:
+            self.sent.set(idempotency_key, send.result())
+
+    async def _post(self, path: str, payload: dict, keyed: bool) -> dict:
+        if self.http is None:
+            await self.start()
+
+        attempt = 0
+        while True:
+            wait_started = time.monotonic()
+            await self.bucket.acquire()
+            self.stats.total_rate_wait += time.monotonic() - wait_started
+
+            started = time.monotonic()
+            try:
+                with telemetry.span("sendblue." + path.strip("/")):
+                    response = await self.http.post(path, json=payload)
+            except httpx.TransportError as e:
+                if keyed and not isinstance(e, SAFE_RETRY_ERRORS):
+                    self.stats.failures += 1
+                    self.stats.unconfirmed += 1
+                    raise SendUnconfirmed(f"{type(e).__name__}: {str(e)}") from e
+                if attempt >= self.max_retries:
+                    self.stats.failures += 1
+                    raise
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+
+            retryable = SAFE_RETRY_STATUS_CODES if keyed else RETRYABLE_STATUS_CODES
+            if response.status_code in retryable and attempt < self.max_retries:
+                if response.status_code == 429:
+                    self.stats.rate_limited += 1
+                await self._backoff(attempt, response.headers.get("Retry-After"))
+                attempt += 1
+                continue
+
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                self.stats.failures += 1
+                if keyed and response.status_code >= 500 and response.status_code not in SAFE_RETRY_STATUS_CODES:
+                    self.stats.unconfirmed += 1
+                    raise SendUnconfirmed(f"HTTP {response.status_code}: {response.text}") from e
+                raise
+            self.stats.record_send(time.monotonic() - started)
+            return response.json()
+
+    async def _backoff(self, attempt: int, retry_after: Optional[str] = None):
+        self.stats.retries += 1
+        delay = 0.5 * (2 ** attempt) + random.uniform(0, 0.25)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        await asyncio.sleep(delay)
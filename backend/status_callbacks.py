@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from . import db
+
+logger = logging.getLogger("uvicorn")
+
+# Later statuses win; a late SENT callback must not overwrite DELIVERED. Statuses we don't know
+# about rank lowest and only apply to messages that haven't progressed past them.
+STATUS_PRECEDENCE = {
+    "SENDING": 0,
+    "REGISTERED": 1,
+    "PENDING": 1,
+    "QUEUED": 1,
+    "ACCEPTED": 1,
+    "SENT": 2,
+    "DELIVERED": 3,
+    "ERROR": 3,
+    "DECLINED": 3,
+    "SEND_FAILED": 3,
+    "READ": 4,
+}
+
+
+def status_rank(status: str) -> int:
+    return STATUS_PRECEDENCE.get(status, 0)
+
+
+class StatusCallbackStats:
+    def __init__(self):
+        self.received = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.rows_updated = 0
+        # The message already has a later status, or its handle never showed up
+        self.not_applied = 0
+        # Callbacks that arrived before their message's handle was stored, retried each flush
+        self.unmatched_retries = 0
+        self.unmatched_dropped = 0
+        self.total_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "rows_updated": self.rows_updated,
+            "not_applied": self.not_applied,
+            "unmatched_retries": self.unmatched_retries,
+            "unmatched_dropped": self.unmatched_dropped,
+            "avg_flush_latency_ms": round(1000 * self.total_flush_latency / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_latency_ms": round(1000 * self.max_flush_latency, 2),
+        }
+
+
+class StatusCallbackBuffer:
+    """
+    Collects Sendblue status callbacks and writes them to messages in bulk. Callbacks for the
+    same handle collapse to the highest-precedence status, and the buffer is flushed every
+    STATUS_FLUSH_INTERVAL_SECONDS or as soon as STATUS_FLUSH_MAX_BATCH handles are pending,
+    with one update per distinct status instead of one per callback. close() flushes whatever
+    is left, so a graceful shutdown doesn't drop statuses.
+
+    A callback can beat the write that stores its message's handle (bulk sends store handles as
+    their sends return). Callbacks whose handle matches no message stay pending and are retried
+    on every flush for up to STATUS_UNMATCHED_MAX_AGE_SECONDS before they're dropped.
+    """
+
+    def __init__(self):
+        self.flush_interval = float(os.environ.get("STATUS_FLUSH_INTERVAL_SECONDS", "1"))
+        self.max_batch = int(os.environ.get("STATUS_FLUSH_MAX_BATCH", "500"))
+        self.unmatched_max_age = float(os.environ.get("STATUS_UNMATCHED_MAX_AGE_SECONDS", "300"))
+        self.pending: Dict[str, dict] = {}
+        # Handle -> when its callbacks first matched no message
+        self.unmatched_since: Dict[str, float] = {}
+        self.stats = StatusCallbackStats()
+        self.full = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    def add(self, message_handle: str, status: str, was_downgraded: Optional[bool] = None):
+        self.stats.received += 1
+        self._merge(message_handle, {"status": status, "was_downgraded": was_downgraded})
+        if len(self.pending) >= self.max_batch:
+            self.full.set()
+
+    def _merge(self, message_handle: str, update: dict):
+        current = self.pending.get(message_handle)
+        if current is None:
+            self.pending[message_handle] = update
+            return
+        self.stats.coalesced += 1
+        if status_rank(update["status"]) >= status_rank(current["status"]):
+            if update["was_downgraded"] is None:
+                update = {**update, "was_downgraded": current["was_downgraded"]}
+            self.pending[message_handle] = update
+
+    def _requeue(self, updates: Dict[str, dict]):
+        for message_handle, update in updates.items():
+            if message_handle in self.pending:
+                pending = self.pending[message_handle]
+                self.pending[message_handle] = update
+                self._merge(message_handle, pending)
+            else:
+                self.pending[message_handle] = update
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Status callback flush failed: {e}")
+
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+
+            groups: Dict[tuple, list] = {}
+            for message_handle, update in batch.items():
+                groups.setdefault((update["status"], update["was_downgraded"]), []).append(message_handle)
+
+            started = time.monotonic()
+            unmatched = []
+            try:
+                for (status, was_downgraded), handles in groups.items():
+                    rank = status_rank(status)
+                    later_statuses = [s for s, r in STATUS_PRECEDENCE.items() if r > rank]
+                    updated = await db.update_messages_by_handles(
+                        handles, {"status": status, "was_downgraded": was_downgraded}, unless_status=later_statuses)
+                    self.stats.rows_updated += len(updated)
+                    applied = {row["sendblue_message_handle"] for row in updated}
+                    missed = [handle for handle in handles if handle not in applied]
+                    # A message that is already further along was left alone on purpose; one
+                    # that isn't there yet may just not have its handle stored
+                    superseded = await db.find_message_handles(missed) if missed else set()
+                    for handle in handles:
+                        if handle in superseded:
+                            self.stats.not_applied += 1
+                        elif handle not in applied:
+                            unmatched.append(handle)
+                            continue
+                        self.unmatched_since.pop(handle, None)
+                        batch.pop(handle)
+            except Exception:
+                self.stats.flush_failures += 1
+                # Put back whatever wasn't written; newer callbacks that arrived meanwhile still win
+                self._requeue(batch)
+                raise
+
+            now = time.monotonic()
+            retry = {}
+            for handle in unmatched:
+                since = self.unmatched_since.setdefault(handle, now)
+                if now - since < self.unmatched_max_age:
+                    retry[handle] = batch[handle]
+                    self.stats.unmatched_retries += 1
+                else:
+                    del self.unmatched_since[handle]
+                    self.stats.not_applied += 1
+                    self.stats.unmatched_dropped += 1
+            self._requeue(retry)
+
+            latency = time.monotonic() - started
+            self.stats.flushes += 1
+            self.stats.total_flush_latency += latency
+            self.stats.max_flush_latency = max(self.stats.max_flush_latency, latency)
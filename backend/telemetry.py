@@ -0,0 +1,191 @@
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Request tracing and Prometheus-format metrics without extra dependencies.
+#
+# A trace id is set per HTTP request (taken from X-Trace-Id if the caller sent one) and carried in
+# job payloads, so an upload, its initiate_conversation jobs and their Sendblue sends, or a webhook
+# and its AI evaluation, all log under the same id. span() times a block into the
+# sherpa_span_seconds histogram; GET /metrics renders the registry.
+
+logger = logging.getLogger("uvicorn")
+
+trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+# Fraction of debug_sampled() calls that are logged, when debug logging is enabled at all
+DEBUG_LOG_SAMPLE_RATE = float(os.environ.get("DEBUG_LOG_SAMPLE_RATE", "0.01"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Run the block under trace_id (a fresh one if None).
+    """
+    trace_id = trace_id or new_trace_id()
+    token = trace_id_var.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        trace_id_var.reset(token)
+
+
+def debug_sampled(message: str, *args):
+    """
+    logger.debug for hot paths: nothing is formatted unless debug logging is on and this call
+    is sampled. Pass values as args, not pre-formatted into message.
+    """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < DEBUG_LOG_SAMPLE_RATE:
+        logger.debug("[trace %s] " + message, current_trace_id(), *args)
+
+
+def _label_text(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (math.inf,)
+        # labels -> [per-bucket counts, sum, count]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+        # name -> (type, help, callable returning the current value), e.g. in-flight counts
+        self.callbacks: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, value: Callable[[], float]):
+        self.callbacks[name] = ("gauge", help, value)
+
+    def counter_callback(self, name: str, help: str, value: Callable[[], float]):
+        """
+        A counter whose running total is kept elsewhere (e.g. a client's stats); value() must
+        only ever go up.
+        """
+        self.callbacks[name] = ("counter", help, value)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for name, (kind, help, value) in self.callbacks.items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_number(value())}"])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+SPAN_SECONDS = registry.histogram(
+    "sherpa_span_seconds", "Duration of timed operations and external calls", ("span", "outcome"))
+HTTP_REQUESTS = registry.counter(
+    "sherpa_http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "sherpa_http_request_seconds", "HTTP request latency", ("method", "route"))
+JOBS = registry.counter("sherpa_jobs_total", "Jobs finished by the job queue", ("kind", "outcome"))
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time the block into sherpa_span_seconds{span=name}, with outcome "error" if it raised.
+    Names are "<service>.<operation>" for external calls, e.g. "supabase.get_guardian".
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, span=name, outcome=outcome)
+        debug_sampled("span %s %s in %.1f ms", name, outcome, 1000 * elapsed)
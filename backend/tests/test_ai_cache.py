@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from backend.ai_cache import AIResponseCache
+
+TEMPLATE = "Hi! We noticed that {student_name} was not at school today. Can you tell us why?"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.delenv("AI_CACHE_SQLITE_PATH", raising=False)
+    return AIResponseCache("v1", TEMPLATE)
+
+
+def conversation_for(student_name: str, reply: str = "he's sick"):
+    history = [
+        {"sender_type": "admin", "content": TEMPLATE.format(student_name=student_name)},
+        {"sender_type": "guardian", "content": reply},
+    ]
+    return history, {"status": "in_progress", "rfa": None}
+
+
+def response(content: str) -> dict:
+    return {"rfa": "Excused - Sick", "conversation_status": "in_progress",
+            "recommended_action": None, "response_content": content}
+
+
+def test_students_share_a_key(cache):
+    bob_key, bob_name = cache.key(*conversation_for("Bob Johnson"))
+    jane_key, jane_name = cache.key(*conversation_for("Jane Smith"))
+    assert bob_key == jane_key
+    assert (bob_name, jane_name) == ("Bob Johnson", "Jane Smith")
+
+
+def test_full_name_is_swapped_for_the_other_student(cache):
+    key, _ = cache.key(*conversation_for("Bob Johnson"))
+    assert asyncio.run(cache.set(key, "Bob Johnson", response("Thanks, we've excused Bob Johnson for today.")))
+
+    cached = asyncio.run(cache.get(key, "Jane Smith"))
+    assert cached["response_content"] == "Thanks, we've excused Jane Smith for today."
+
+
+@pytest.mark.parametrize("content", [
+    "Sorry to hear Bob isn't well. Is he running a fever?",
+    "Sorry to hear Bob isn't well.",
+    "Sorry to hear that. Is he running a fever?",
+    "Please let us know when she is back.",
+    "We hope JOHNSON feels better soon.",
+])
+def test_replies_about_the_student_are_not_cached(cache, content):
+    key, _ = cache.key(*conversation_for("Bob Johnson"))
+    assert not asyncio.run(cache.set(key, "Bob Johnson", response(content)))
+
+    assert asyncio.run(cache.get(key, "Jane Smith")) is None
+    assert cache.stats()["skipped"] == 1
+
+
+def test_name_inside_another_word_is_left_alone(cache):
+    key, _ = cache.key(*conversation_for("Al"))
+    assert asyncio.run(cache.set(key, "Al", response("Thanks, we'll let the attendance office know.")))
+
+    cached = asyncio.run(cache.get(key, "Jane Smith"))
+    assert cached["response_content"] == "Thanks, we'll let the attendance office know."
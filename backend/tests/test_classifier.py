@@ -0,0 +1,41 @@
+import pytest
+
+from backend.classifier import SICK_TEMPLATE, classify_text
+
+
+@pytest.mark.parametrize("text", [
+    "Ill call the office",
+    "ill bring a note tomorrow",
+    "sorry ill explain later",
+    "ILL TEXT YOU BACK",
+    "He is sick of school so he stayed home",
+    "she's sick and tired of that class",
+    "he isn't sick, he just didn't want to go",
+    "Is she sick? I dropped her off this morning",
+])
+def test_not_classified(text):
+    assert classify_text(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "she was ill all weekend",
+    "He's been ill since Monday",
+    "Kid is sick, staying home",
+    "feeling ill today",
+    "he came home sick",
+])
+def test_illness(text):
+    result = classify_text(text)
+    assert result.rfa == "Excused - Sick"
+    assert not result.escalate
+    assert result.response_content == SICK_TEMPLATE
+
+
+def test_clear_reason_that_needs_an_officer_is_escalated():
+    result = classify_text("the car wouldn't start this morning")
+    assert result.rfa == "Unexcused - Transportation issues"
+    assert result.escalate
+
+
+def test_two_reasons_go_to_the_llm():
+    assert classify_text("he was ill, then we had a family emergency") is None
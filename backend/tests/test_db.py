@@ -0,0 +1,24 @@
+import asyncio
+
+from backend import db
+from backend.benchmarks.fakes import FakeSupabase
+
+
+def test_find_conversations_and_messages_read_past_max_rows(monkeypatch):
+    fake = FakeSupabase(max_rows=3)
+    monkeypatch.setattr(db, "supabase", fake)
+    # Several conversations share a created_at, so the cursor has to break ties on id
+    conversations = fake.seed("conversations", [
+        {"school_id": "school", "created_at": f"2024-10-01T08:00:0{i // 2}+00:00"} for i in range(8)])
+    fake.seed("conversations", [{"school_id": "other", "created_at": "2024-10-01T09:00:00+00:00"}])
+    fake.seed("messages", [
+        {"conversation_id": conversation["id"], "status": status, "created_at": conversation["created_at"]}
+        for conversation in conversations for status in ("AWAITING_APPROVAL", "SENT")])
+
+    found = asyncio.run(db.find_conversations("school", "2024-10-01", "2024-10-02", columns="id", page_size=3))
+    assert sorted(row["id"] for row in found) == sorted(row["id"] for row in conversations)
+
+    messages = asyncio.run(db.find_messages(
+        [row["id"] for row in found], "AWAITING_APPROVAL", columns="id", page_size=3))
+    assert len(messages) == 8
+    assert len({row["id"] for row in messages}) == 8
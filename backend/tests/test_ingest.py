@@ -0,0 +1,81 @@
+import asyncio
+import io
+
+from backend.ingest import MAX_RECORD_LINES, iter_csv_rows
+
+
+class Upload:
+    """
+    Stands in for UploadFile: read(size) returns the next size bytes.
+    """
+
+    def __init__(self, data: bytes):
+        self.file = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+
+def rows(text: str, chunk_size: int = 4) -> list:
+    async def collect():
+        return [row async for row in iter_csv_rows(Upload(text.encode("utf-8")), chunk_size)]
+    return asyncio.run(collect())
+
+
+def test_line_separators_inside_fields_are_text():
+    assert rows("a,b\n1,x\u2028y\n2,3") == [(2, {"a": "1", "b": "x\u2028y"}), (3, {"a": "2", "b": "3"})]
+    assert rows("a,b\r\n1,x\x0cy\x85z\r\n") == [(2, {"a": "1", "b": "x\x0cy\x85z"})]
+
+
+def test_multibyte_character_across_chunk_boundary():
+    # "é" is two bytes in UTF-8; every chunk size splits one of them somewhere
+    text = "name,school\nRené,Crystal Springs\nZoë,Crystal Springs\n"
+    for chunk_size in range(1, 8):
+        assert rows(text, chunk_size) == [
+            (2, {"name": "René", "school": "Crystal Springs"}),
+            (3, {"name": "Zoë", "school": "Crystal Springs"}),
+        ]
+
+
+def test_quoted_newline_spans_lines():
+    assert rows('a,b\n1,"line one\nline two"\n2,3\n') == [
+        (2, {"a": "1", "b": "line one\nline two"}),
+        (4, {"a": "2", "b": "3"}),
+    ]
+
+
+def test_bad_rows_are_reported_and_skipped():
+    assert rows('a,b\n1,2,3\n4,5\n6,"open\n') == [
+        (2, {"__error__": "Expected 2 fields, got 3"}),
+        (3, {"a": "4", "b": "5"}),
+        (4, {"__error__": "Unterminated quoted field"}),
+    ]
+
+
+def test_quote_inside_unquoted_field_is_text():
+    assert rows('a,b\n1,O"Brien\n2,3\n4,"say ""hi"""\n') == [
+        (2, {"a": "1", "b": 'O"Brien'}),
+        (3, {"a": "2", "b": "3"}),
+        (4, {"a": "4", "b": 'say "hi"'}),
+    ]
+
+
+def test_stray_carriage_return_is_a_bad_row():
+    result = rows("a,b\n1,2\n3,x\ry\n4,5\n")
+    assert result[0] == (2, {"a": "1", "b": "2"})
+    assert result[1][0] == 3 and result[1][1]["__error__"].startswith("Malformed row")
+    assert result[2] == (4, {"a": "4", "b": "5"})
+
+
+def test_runaway_quote_resyncs():
+    text = 'a,b\n1,"open\n' + "".join(f"{i},x\n" for i in range(2, MAX_RECORD_LINES + 5))
+    result = rows(text, chunk_size=64)
+    assert result[0] == (2, {"__error__": f"Quoted field still open after {MAX_RECORD_LINES} lines"})
+    assert result[1:] == [(i + 1, {"a": str(i), "b": "x"}) for i in range(2, MAX_RECORD_LINES + 5)]
+
+
+def test_missing_header():
+    assert rows("") == []
+    assert rows("\ufeffa,b\n") == []
+    # A column missing from the header is missing from every row
+    assert rows("a\n1\n") == [(2, {"a": "1"})]
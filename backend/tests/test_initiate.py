@@ -0,0 +1,47 @@
+import asyncio
+from datetime import date
+
+from backend import db, main
+from backend.benchmarks.fakes import FakeSupabase
+
+
+def setup(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(db, "supabase", fake)
+    sends = []
+
+    async def sendblue_send_message(phone_number, content, idempotency_key=None):
+        sends.append(idempotency_key)
+        return {"status": "QUEUED", "message_handle": f"handle-{len(sends)}"}
+    monkeypatch.setattr(main, "sendblue_send_message", sendblue_send_message)
+    absence = main.Absence(id="1", student_id="S001", student_name="Bob Johnson", date=date(2024, 10, 1),
+                           rfa="Unexplained", guardian_name="Sally Johnson", guardian_phone="+15550100")
+    return fake, sends, [(absence, "school")]
+
+
+def rerun_with_status(fake: FakeSupabase, absences: list, status: str) -> dict:
+    (message,) = fake.rows("messages").values()
+    message["status"] = status
+    (result,) = asyncio.run(main.initiate_conversations_batch(absences, auto_approve=True))
+    return result
+
+
+def test_interrupted_send_is_not_resent(monkeypatch):
+    fake, sends, absences = setup(monkeypatch)
+    (first,) = asyncio.run(main.initiate_conversations_batch(absences, auto_approve=True))
+    assert first["status"] == "QUEUED"
+
+    # A worker died between storing the message and storing Sendblue's response
+    result = rerun_with_status(fake, absences, "SENDING")
+    assert len(sends) == 1
+    assert result["status"] == main.SEND_UNCONFIRMED
+    assert fake.rows("messages")[first["message_id"]]["status"] == main.SEND_UNCONFIRMED
+
+
+def test_failed_send_is_resent(monkeypatch):
+    fake, sends, absences = setup(monkeypatch)
+    (first,) = asyncio.run(main.initiate_conversations_batch(absences, auto_approve=True))
+
+    result = rerun_with_status(fake, absences, "SEND_FAILED")
+    assert sends == [f"message:{first['message_id']}"] * 2
+    assert result["status"] == "QUEUED"
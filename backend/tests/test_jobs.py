@@ -0,0 +1,72 @@
+import asyncio
+
+from backend.jobs import JOB_DEAD, JobQueue, SQLiteJobStore
+
+
+class FlakyStore(SQLiteJobStore):
+    """
+    complete() fails the first time it's called.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.complete_calls = 0
+
+    async def complete(self, job_id: str, result: dict):
+        self.complete_calls += 1
+        if self.complete_calls == 1:
+            raise RuntimeError("database is locked")
+        await super().complete(job_id, result)
+
+
+def job(key: str, **fields) -> dict:
+    return {"idempotency_key": key, "kind": "test", "payload": {}, **fields}
+
+
+async def ok_handler(jobs):
+    return [(True, {}) for _ in jobs]
+
+
+def test_workers_survive_store_errors(tmp_path):
+    async def run():
+        store = FlakyStore(str(tmp_path / "jobs.db"))
+        queue = JobQueue(store, {"test": ok_handler}, workers=2, claim_size=1, poll_interval=0.01)
+        queue.start()
+        await queue.enqueue([job("a"), job("b"), job("c")])
+        await asyncio.sleep(0.3)
+        alive = sum(not task.done() for task in queue.tasks)
+        await queue.stop()
+        return alive, store
+
+    alive, store = asyncio.run(run())
+    assert alive == 2
+    # The job whose completion failed is still leased; the others went through
+    assert store.complete_calls == 3
+
+
+def test_expired_lease_on_last_attempt_is_dead_lettered(tmp_path):
+    async def run():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue([job("crashes", max_attempts=2)])
+        claims = []
+        for _ in range(3):
+            # A worker that dies mid-job: claimed with a lease that has already run out
+            claims.append(await store.claim("worker", 10, lease_seconds=-1))
+        return claims
+
+    claims = asyncio.run(run())
+    assert [len(claimed) for claimed in claims] == [1, 1, 0]
+    assert claims[1][0]["attempts"] == 2
+
+
+def test_dead_lettered_job_is_reported(tmp_path):
+    async def run():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue([job("crashes", batch_id="b1", max_attempts=1)])
+        await store.claim("worker", 10, lease_seconds=-1)
+        await store.claim("worker", 10, lease_seconds=-1)
+        return await store.batch_status("b1")
+
+    status = asyncio.run(run())
+    assert status["counts"] == {JOB_DEAD: 1}
+    assert "Lease expired" in status["dead_letters"][0]["last_error"]
@@ -0,0 +1,41 @@
+import asyncio
+
+from backend import db, main
+
+
+def test_rows_are_stored_as_their_sends_return(monkeypatch):
+    writes = []
+
+    async def upsert_messages(rows):
+        writes.append([row["id"] for row in rows])
+    monkeypatch.setattr(db, "upsert_messages", upsert_messages)
+
+    async def send(message_id: str, delay: float) -> dict:
+        await asyncio.sleep(delay)
+        return {"id": message_id}
+
+    async def run():
+        slow = asyncio.ensure_future(main.send_and_store([send("fast", 0), send("slow", 0.2)]))
+        await asyncio.sleep(0.1)
+        # The fast send's row is written while the slow one is still in flight
+        assert writes == [["fast"]]
+        return await slow
+    rows = asyncio.run(run())
+
+    assert [row["id"] for row in rows] == ["fast", "slow"]
+    assert writes == [["fast"], ["slow"]]
+
+
+def test_rows_finishing_together_share_a_write(monkeypatch):
+    writes = []
+
+    async def upsert_messages(rows):
+        writes.append(len(rows))
+    monkeypatch.setattr(db, "upsert_messages", upsert_messages)
+
+    async def send(message_id: str) -> dict:
+        return {"id": message_id}
+
+    asyncio.run(main.send_and_store([send(str(i)) for i in range(50)]))
+    assert sum(writes) == 50
+    assert len(writes) == 1
@@ -0,0 +1,70 @@
+import asyncio
+
+from backend import db
+from backend.benchmarks.fakes import FakeSupabase
+from backend.status_callbacks import StatusCallbackBuffer
+
+
+def setup(monkeypatch, *messages: dict):
+    fake = FakeSupabase()
+    monkeypatch.setattr(db, "supabase", fake)
+    fake.seed("messages", list(messages))
+    return fake, StatusCallbackBuffer()
+
+
+def status(fake: FakeSupabase, handle: str) -> str:
+    return next(row["status"] for row in fake.rows("messages").values()
+                if row.get("sendblue_message_handle") == handle)
+
+
+def test_callbacks_collapse_to_the_latest_status(monkeypatch):
+    fake, buffer = setup(monkeypatch, {"sendblue_message_handle": "h1", "status": "QUEUED"})
+    buffer.add("h1", "DELIVERED", False)
+    buffer.add("h1", "SENT", None)
+    asyncio.run(buffer.flush())
+
+    assert status(fake, "h1") == "DELIVERED"
+    assert buffer.stats.coalesced == 1
+    assert fake.calls["messages.update"] == 1
+
+
+def test_late_status_does_not_regress_message(monkeypatch):
+    fake, buffer = setup(monkeypatch, {"sendblue_message_handle": "h1", "status": "READ"})
+    buffer.add("h1", "SENT", None)
+    asyncio.run(buffer.flush())
+
+    assert status(fake, "h1") == "READ"
+    assert buffer.stats.not_applied == 1
+    # Superseded, not unmatched: it isn't retried
+    assert buffer.pending == {}
+
+
+def test_unmatched_callback_waits_for_its_handle(monkeypatch):
+    fake, buffer = setup(monkeypatch)
+    (message,) = fake.seed("messages", [{"status": "SENDING"}])
+    buffer.add("h1", "DELIVERED", False)
+
+    async def run():
+        await buffer.flush()
+        assert "h1" in buffer.pending
+        # The send's response is stored after the callback arrived
+        fake.rows("messages")[message["id"]].update({"sendblue_message_handle": "h1", "status": "SENT"})
+        await buffer.flush()
+    asyncio.run(run())
+
+    assert status(fake, "h1") == "DELIVERED"
+    assert buffer.pending == {}
+    assert buffer.unmatched_since == {}
+    assert buffer.stats.unmatched_retries == 1
+    assert buffer.stats.not_applied == 0
+
+
+def test_unmatched_callback_is_dropped_after_max_age(monkeypatch):
+    fake, buffer = setup(monkeypatch)
+    buffer.unmatched_max_age = 0
+    buffer.add("h1", "DELIVERED", False)
+    asyncio.run(buffer.flush())
+
+    assert buffer.pending == {}
+    assert buffer.unmatched_since == {}
+    assert buffer.stats.unmatched_dropped == 1
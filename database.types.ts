@@ -11,13 +11,19 @@ export type Database = {
     Tables: {
       conversations: {
         Row: {
+          absence_date: string | null
           absence_id: string | null
           created_at: string
+          escalated_at: string | null
           guardian_id: string
+          history_summary: string | null
+          history_summary_through_at: string | null
+          history_summary_through_id: string | null
           id: string
           recommended_action:
             | Database["public"]["Enums"]["recommended_actions"]
             | null
+          resolved_at: string | null
           rfa: string | null
           school_id: string
           status: Database["public"]["Enums"]["conversation_status"]
@@ -27,13 +33,19 @@ export type Database = {
           user_id: string | null
         }
         Insert: {
+          absence_date?: string | null
           absence_id?: string | null
           created_at?: string
+          escalated_at?: string | null
           guardian_id: string
+          history_summary?: string | null
+          history_summary_through_at?: string | null
+          history_summary_through_id?: string | null
           id?: string
           recommended_action?:
             | Database["public"]["Enums"]["recommended_actions"]
             | null
+          resolved_at?: string | null
           rfa?: string | null
           school_id: string
           status: Database["public"]["Enums"]["conversation_status"]
@@ -43,13 +55,19 @@ export type Database = {
           user_id?: string | null
         }
         Update: {
+          absence_date?: string | null
           absence_id?: string | null
           created_at?: string
+          escalated_at?: string | null
           guardian_id?: string
+          history_summary?: string | null
+          history_summary_through_at?: string | null
+          history_summary_through_id?: string | null
           id?: string
           recommended_action?:
             | Database["public"]["Enums"]["recommended_actions"]
             | null
+          resolved_at?: string | null
           rfa?: string | null
           school_id?: string
           status?: Database["public"]["Enums"]["conversation_status"]
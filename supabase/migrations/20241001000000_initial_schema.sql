@@ -0,0 +1,104 @@
+-- Tables and enums as described by database.types.ts. Everything is "if not exists" so this
+-- can be applied to the hosted project, which already has them, as well as to a fresh database.
+
+do $$ begin
+    create type public.conversation_status as enum ('in_progress', 'action_needed', 'completed', 'awaiting_message_approval');
+exception when duplicate_object then null; end $$;
+
+do $$ begin
+    create type public.recommended_actions as enum ('mark_as_completed', 'attendance_officer_take_over');
+exception when duplicate_object then null; end $$;
+
+do $$ begin
+    create type public.type as enum ('guardian', 'admin');
+exception when duplicate_object then null; end $$;
+
+do $$ begin
+    create type public.user_role as enum ('district_super_admin', 'district_admin', 'school_super_admin', 'school_admin');
+exception when duplicate_object then null; end $$;
+
+create table if not exists public.districts (
+    id uuid primary key default gen_random_uuid(),
+    name text not null,
+    launch_date date not null,
+    data_provider text,
+    id_in_data_provider text,
+    logo_url text,
+    district_contact_email text,
+    district_contact_first_name text,
+    district_contact_last_name text,
+    district_contact_role text,
+    created_at timestamptz default now(),
+    updated_at timestamptz default now()
+);
+
+create table if not exists public.schools (
+    id uuid primary key default gen_random_uuid(),
+    district_id uuid references public.districts (id),
+    name text not null,
+    address text,
+    id_in_data_provider text,
+    logo_url text,
+    created_at timestamptz default now(),
+    updated_at timestamptz default now()
+);
+
+create table if not exists public.users (
+    id uuid primary key references auth.users (id) on delete cascade,
+    email text not null,
+    role public.user_role not null,
+    first_name text,
+    last_name text,
+    phone_number text,
+    district_id uuid references public.districts (id),
+    school_id uuid references public.schools (id),
+    created_at timestamptz default now(),
+    updated_at timestamptz default now()
+);
+
+create table if not exists public.external_system_mappings (
+    id uuid primary key default gen_random_uuid(),
+    district_id uuid references public.districts (id),
+    entity_type text,
+    external_system text,
+    external_id text,
+    local_id text,
+    created_at timestamptz default now(),
+    updated_at timestamptz default now()
+);
+
+create table if not exists public.guardians (
+    id uuid primary key default gen_random_uuid(),
+    school_id uuid not null references public.schools (id),
+    phone_number text not null,
+    first_name text,
+    last_name text,
+    email text,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.conversations (
+    id uuid primary key default gen_random_uuid(),
+    guardian_id uuid not null references public.guardians (id),
+    school_id uuid not null references public.schools (id),
+    user_id uuid references public.users (id),
+    student_id text not null,
+    absence_id text,
+    topic text not null,
+    status public.conversation_status not null,
+    rfa text,
+    recommended_action public.recommended_actions,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.messages (
+    id uuid primary key default gen_random_uuid(),
+    conversation_id uuid references public.conversations (id),
+    content text not null,
+    sender_type public.type not null,
+    status text not null,
+    sendblue_message_handle text,
+    was_downgraded boolean,
+    created_at timestamptz not null default now()
+);
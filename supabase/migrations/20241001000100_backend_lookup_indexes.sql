@@ -0,0 +1,31 @@
+-- Indexes matching the query shapes in backend/db.py. Run
+-- supabase/scripts/explain_backend_queries.sql to check the plans against seeded data.
+
+-- guardians: upsert on_conflict="phone_number,school_id" needs a matching unique constraint to be
+-- atomic, and its leading column also serves the inbound-webhook lookup by phone_number.
+-- Fails if duplicate (phone_number, school_id) rows already exist; merge those first.
+do $$ begin
+    alter table public.guardians
+        add constraint guardians_phone_number_school_id_key unique (phone_number, school_id);
+exception when duplicate_object or duplicate_table then null; end $$;
+
+-- conversations: latest conversation for a guardian at a school
+--   where guardian_id = ? and school_id = ? order by created_at desc limit 1
+create index if not exists conversations_guardian_school_created_idx
+    on public.conversations (guardian_id, school_id, created_at desc);
+
+-- conversations: already-initiated check when an absence file is (re)uploaded
+--   where absence_id in (...) and school_id in (...) and created_at >= ?
+create index if not exists conversations_absence_school_created_idx
+    on public.conversations (absence_id, school_id, created_at);
+
+-- messages: conversation history, oldest first
+--   where conversation_id = ? order by created_at
+create index if not exists messages_conversation_created_idx
+    on public.messages (conversation_id, created_at);
+
+-- messages: inbound dedupe and status callbacks by Sendblue handle. Most admin messages
+-- awaiting approval have no handle yet, so they're left out of the index.
+create index if not exists messages_sendblue_message_handle_idx
+    on public.messages (sendblue_message_handle)
+    where sendblue_message_handle is not null;
@@ -0,0 +1,60 @@
+-- Durable outbound job queue used by backend/jobs.py (JOB_STORE=supabase)
+
+create table if not exists public.outbound_jobs (
+    id uuid primary key default gen_random_uuid(),
+    idempotency_key text not null unique,
+    batch_id text,
+    kind text not null,
+    payload jsonb not null,
+    status text not null default 'queued' check (status in ('queued', 'running', 'done', 'dead')),
+    attempts integer not null default 0,
+    max_attempts integer not null default 5,
+    available_at timestamptz not null default now(),
+    locked_until timestamptz,
+    locked_by text,
+    last_error text,
+    result jsonb,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists outbound_jobs_claim_idx on public.outbound_jobs (status, available_at);
+create index if not exists outbound_jobs_batch_idx on public.outbound_jobs (batch_id);
+
+-- Claim up to batch_size runnable jobs for one worker. Jobs whose lease ran out (worker
+-- crashed mid-job) are claimable again, which gives at-least-once delivery.
+create or replace function public.claim_outbound_jobs(worker_id text, batch_size integer, lease_seconds integer)
+returns setof public.outbound_jobs
+language sql
+as $$
+    update public.outbound_jobs j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = worker_id,
+        locked_until = now() + make_interval(secs => lease_seconds),
+        updated_at = now()
+    where j.id in (
+        select id from public.outbound_jobs
+        where (status = 'queued' and available_at <= now())
+           or (status = 'running' and locked_until < now())
+        order by available_at
+        limit batch_size
+        for update skip locked
+    )
+    returning j.*;
+$$;
+
+-- Record a failed attempt: requeue with a delay, or dead-letter once max_attempts is reached.
+create or replace function public.fail_outbound_job(job_id uuid, error text, retry_in_seconds double precision)
+returns void
+language sql
+as $$
+    update public.outbound_jobs
+    set status = case when attempts >= max_attempts then 'dead' else 'queued' end,
+        last_error = error,
+        available_at = now() + make_interval(secs => retry_in_seconds),
+        locked_by = null,
+        locked_until = null,
+        updated_at = now()
+    where id = job_id;
+$$;
@@ -0,0 +1,31 @@
+-- Keyed lock leases used by backend/locks.py (LOCK_BACKEND=supabase) to serialize work on one
+-- conversation across server processes and hosts.
+
+create table if not exists public.lock_leases (
+    lease_key text primary key,
+    owner text not null,
+    expires_at timestamptz not null
+);
+
+-- Take the lease if it's free, expired or already ours. Returns whether we now hold it.
+create or replace function public.try_acquire_lock_lease(lease_key text, lease_owner text, lease_seconds integer)
+returns boolean
+language sql
+as $$
+    with acquired as (
+        insert into public.lock_leases as l (lease_key, owner, expires_at)
+        values (lease_key, lease_owner, now() + make_interval(secs => lease_seconds))
+        on conflict (lease_key) do update
+            set owner = excluded.owner, expires_at = excluded.expires_at
+            where l.expires_at < now() or l.owner = excluded.owner
+        returning 1
+    )
+    select exists (select 1 from acquired);
+$$;
+
+create or replace function public.release_lock_lease(lease_key text, lease_owner text)
+returns void
+language sql
+as $$
+    delete from public.lock_leases l where l.lease_key = release_lock_lease.lease_key and l.owner = lease_owner;
+$$;
@@ -0,0 +1,15 @@
+-- Running summary of long conversations, maintained by backend/main.py's
+-- load_conversation_history: messages up to (history_summary_through_at, history_summary_through_id)
+-- are folded into history_summary, so a reply only needs to read the newest messages.
+
+alter table public.conversations
+    add column if not exists history_summary text,
+    add column if not exists history_summary_through_at timestamptz,
+    add column if not exists history_summary_through_id uuid;
+
+-- messages: newest-first windows and keyset pages on (created_at, id). Replaces the
+-- (conversation_id, created_at) index, which it covers.
+create index if not exists messages_conversation_created_id_idx
+    on public.messages (conversation_id, created_at, id);
+
+drop index if exists public.messages_conversation_created_idx;
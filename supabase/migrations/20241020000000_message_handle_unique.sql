@@ -0,0 +1,28 @@
+-- messages: one row per Sendblue handle, so a redelivered inbound webhook can't store the same
+-- guardian text twice (backend/db.py's insert_message_once upserts on this constraint and ignores
+-- duplicates). NULL handles, e.g. drafts awaiting approval, never conflict.
+
+-- Older guardian messages stored the conversation id as their handle; those aren't Sendblue
+-- handles and would collide within a conversation.
+update public.messages
+    set sendblue_message_handle = null
+    where sendblue_message_handle = conversation_id::text;
+
+-- Keep the earliest row for any handle stored more than once.
+update public.messages m
+    set sendblue_message_handle = null
+    from (
+        select id, row_number() over (
+            partition by sendblue_message_handle order by created_at, id) as position
+        from public.messages
+        where sendblue_message_handle is not null
+    ) ranked
+    where m.id = ranked.id and ranked.position > 1;
+
+do $$ begin
+    alter table public.messages
+        add constraint messages_sendblue_message_handle_key unique (sendblue_message_handle);
+exception when duplicate_object or duplicate_table then null; end $$;
+
+-- The unique constraint's index serves the handle lookups the partial index did.
+drop index if exists public.messages_sendblue_message_handle_idx;
@@ -0,0 +1,309 @@
+-- Reporting rollups behind GET /analytics/summary and GET /analytics/export (backend/analytics.py):
+--
+-- - conversation_outcomes: one row per conversation with its outcome and message delivery counts
+-- - conversation_daily_stats: totals per school, day (UTC, by conversation start) and RFA
+--
+-- Both are refreshed incrementally. Statement-level triggers queue the conversations whose row or
+-- messages changed in analytics_dirty_conversations, and refresh_conversation_analytics()
+-- recomputes just those outcomes and the days they fall on, so a refresh costs what changed since
+-- the last one rather than the whole history. The backend calls it every
+-- ANALYTICS_REFRESH_INTERVAL_SECONDS; pg_cron can call it instead.
+
+-- When a conversation was first completed / handed to an attendance officer. A conversation the
+-- guardian reopens keeps its first resolution time.
+alter table public.conversations
+    add column if not exists resolved_at timestamptz,
+    add column if not exists escalated_at timestamptz;
+
+-- Existing conversations: the last message is the best estimate of when they got there
+update public.conversations c
+    set resolved_at = case when c.status = 'completed' then activity.at end,
+        escalated_at = case when c.status = 'action_needed'
+                             or c.recommended_action = 'attendance_officer_take_over' then activity.at end
+    from (
+        select c2.id, coalesce(
+            (select max(m.created_at) from public.messages m where m.conversation_id = c2.id),
+            c2.updated_at) as at
+        from public.conversations c2
+        where c2.status in ('completed', 'action_needed')
+           or c2.recommended_action = 'attendance_officer_take_over'
+    ) activity
+    where c.id = activity.id and c.resolved_at is null and c.escalated_at is null;
+
+create or replace function public.stamp_conversation_outcome()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.resolved_at is null and new.status = 'completed' then
+        new.resolved_at := now();
+    end if;
+    if new.escalated_at is null and (new.status = 'action_needed'
+            or new.recommended_action = 'attendance_officer_take_over') then
+        new.escalated_at := now();
+    end if;
+    return new;
+end $$;
+
+drop trigger if exists conversations_stamp_outcome on public.conversations;
+create trigger conversations_stamp_outcome
+    before insert or update of status, recommended_action on public.conversations
+    for each row execute function public.stamp_conversation_outcome();
+
+create table if not exists public.conversation_outcomes (
+    -- No foreign key: a deleted conversation's row is removed by the next refresh, which also
+    -- needs its school and day to fix up the daily totals
+    conversation_id uuid primary key,
+    school_id uuid not null,
+    created_at timestamptz not null,
+    student_id text,
+    absence_id text,
+    status public.conversation_status not null,
+    rfa text,
+    recommended_action public.recommended_actions,
+    escalated boolean not null,
+    resolved_at timestamptz,
+    resolution_seconds double precision,
+    guardian_messages integer not null,
+    -- Admin messages past approval; delivered includes read, failed is SEND_FAILED/ERROR/DECLINED
+    outbound_messages integer not null,
+    delivered integer not null,
+    read integer not null,
+    failed integer not null,
+    unconfirmed integer not null,
+    downgraded integer not null,
+    awaiting_approval integer not null,
+    refreshed_at timestamptz not null default now()
+);
+
+-- Exports: where school_id = ? and created_at in [start, end) order by created_at, conversation_id
+create index if not exists conversation_outcomes_school_created_idx
+    on public.conversation_outcomes (school_id, created_at, conversation_id);
+
+create table if not exists public.conversation_daily_stats (
+    school_id uuid not null,
+    day date not null,
+    -- 'Unexplained' until a reason is recorded
+    rfa text not null,
+    conversations integer not null,
+    completed integer not null,
+    action_needed integer not null,
+    escalated integer not null,
+    resolved integer not null,
+    resolution_seconds_total double precision not null,
+    -- Conversations the guardian replied in
+    responded integer not null,
+    outbound_messages integer not null,
+    delivered integer not null,
+    read integer not null,
+    failed integer not null,
+    unconfirmed integer not null,
+    downgraded integer not null,
+    primary key (school_id, day, rfa)
+);
+
+create table if not exists public.analytics_dirty_conversations (
+    conversation_id uuid primary key,
+    queued_at timestamptz not null default now()
+);
+
+-- One insert per statement, however many rows it touched (status callbacks update in bulk)
+create or replace function public.queue_conversation_analytics()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_table_name = 'conversations' then
+        insert into public.analytics_dirty_conversations (conversation_id)
+        select distinct id from changed_rows
+        on conflict do nothing;
+    else
+        insert into public.analytics_dirty_conversations (conversation_id)
+        select distinct conversation_id from changed_rows where conversation_id is not null
+        on conflict do nothing;
+    end if;
+    return null;
+end $$;
+
+-- Transition tables allow one event per trigger
+drop trigger if exists conversations_queue_analytics_insert on public.conversations;
+create trigger conversations_queue_analytics_insert
+    after insert on public.conversations referencing new table as changed_rows
+    for each statement execute function public.queue_conversation_analytics();
+drop trigger if exists conversations_queue_analytics_update on public.conversations;
+create trigger conversations_queue_analytics_update
+    after update on public.conversations referencing new table as changed_rows
+    for each statement execute function public.queue_conversation_analytics();
+drop trigger if exists conversations_queue_analytics_delete on public.conversations;
+create trigger conversations_queue_analytics_delete
+    after delete on public.conversations referencing old table as changed_rows
+    for each statement execute function public.queue_conversation_analytics();
+
+drop trigger if exists messages_queue_analytics_insert on public.messages;
+create trigger messages_queue_analytics_insert
+    after insert on public.messages referencing new table as changed_rows
+    for each statement execute function public.queue_conversation_analytics();
+drop trigger if exists messages_queue_analytics_update on public.messages;
+create trigger messages_queue_analytics_update
+    after update on public.messages referencing new table as changed_rows
+    for each statement execute function public.queue_conversation_analytics();
+drop trigger if exists messages_queue_analytics_delete on public.messages;
+create trigger messages_queue_analytics_delete
+    after delete on public.messages referencing old table as changed_rows
+    for each statement execute function public.queue_conversation_analytics();
+
+-- Recompute the outcomes of up to batch_size queued conversations (all of them if null) and the
+-- daily totals of every (school, day) they fall on. Returns how many conversations it refreshed.
+-- Concurrent calls (one per backend worker) don't wait: all but one return 0 at once.
+create or replace function public.refresh_conversation_analytics(batch_size integer default 5000)
+returns integer
+language plpgsql
+as $$
+declare
+    refreshed integer;
+begin
+    if not pg_try_advisory_xact_lock(hashtext('refresh_conversation_analytics')) then
+        return 0;
+    end if;
+    -- From an earlier call in the same transaction
+    drop table if exists pg_temp.analytics_claimed, pg_temp.analytics_days;
+
+    create temp table analytics_claimed on commit drop as
+    with claimed as (
+        delete from public.analytics_dirty_conversations
+        where conversation_id in (
+            select conversation_id from public.analytics_dirty_conversations
+            order by queued_at
+            limit batch_size)
+        returning conversation_id
+    )
+    select conversation_id from claimed;
+    get diagnostics refreshed = row_count;
+    if refreshed = 0 then
+        return 0;
+    end if;
+
+    -- Days the claimed conversations were counted on before, and are counted on now
+    create temp table analytics_days on commit drop as
+    select school_id, (created_at at time zone 'utc')::date as day
+    from public.conversation_outcomes
+    where conversation_id in (select conversation_id from analytics_claimed)
+    union
+    select school_id, (created_at at time zone 'utc')::date
+    from public.conversations
+    where id in (select conversation_id from analytics_claimed);
+
+    delete from public.conversation_outcomes o
+    where o.conversation_id in (select conversation_id from analytics_claimed)
+      and not exists (select 1 from public.conversations c where c.id = o.conversation_id);
+
+    insert into public.conversation_outcomes (
+        conversation_id, school_id, created_at, student_id, absence_id, status, rfa,
+        recommended_action, escalated, resolved_at, resolution_seconds, guardian_messages,
+        outbound_messages, delivered, read, failed, unconfirmed, downgraded, awaiting_approval,
+        refreshed_at)
+    select c.id, c.school_id, c.created_at, c.student_id, c.absence_id, c.status, c.rfa,
+           c.recommended_action, c.escalated_at is not null, c.resolved_at,
+           extract(epoch from c.resolved_at - c.created_at),
+           coalesce(m.guardian_messages, 0), coalesce(m.outbound_messages, 0),
+           coalesce(m.delivered, 0), coalesce(m.read, 0), coalesce(m.failed, 0),
+           coalesce(m.unconfirmed, 0), coalesce(m.downgraded, 0), coalesce(m.awaiting_approval, 0),
+           now()
+    from public.conversations c
+    left join (
+        select conversation_id,
+               count(*) filter (where sender_type = 'guardian') as guardian_messages,
+               count(*) filter (where sender_type = 'admin' and status <> 'AWAITING_APPROVAL') as outbound_messages,
+               count(*) filter (where sender_type = 'admin' and status in ('DELIVERED', 'READ')) as delivered,
+               count(*) filter (where sender_type = 'admin' and status = 'READ') as read,
+               count(*) filter (where sender_type = 'admin' and status in ('SEND_FAILED', 'ERROR', 'DECLINED')) as failed,
+               count(*) filter (where sender_type = 'admin' and status = 'SEND_UNCONFIRMED') as unconfirmed,
+               count(*) filter (where sender_type = 'admin' and was_downgraded) as downgraded,
+               count(*) filter (where sender_type = 'admin' and status = 'AWAITING_APPROVAL') as awaiting_approval
+        from public.messages
+        where conversation_id in (select conversation_id from analytics_claimed)
+        group by conversation_id
+    ) m on m.conversation_id = c.id
+    where c.id in (select conversation_id from analytics_claimed)
+    on conflict (conversation_id) do update set
+        status = excluded.status,
+        rfa = excluded.rfa,
+        recommended_action = excluded.recommended_action,
+        escalated = excluded.escalated,
+        resolved_at = excluded.resolved_at,
+        resolution_seconds = excluded.resolution_seconds,
+        guardian_messages = excluded.guardian_messages,
+        outbound_messages = excluded.outbound_messages,
+        delivered = excluded.delivered,
+        read = excluded.read,
+        failed = excluded.failed,
+        unconfirmed = excluded.unconfirmed,
+        downgraded = excluded.downgraded,
+        awaiting_approval = excluded.awaiting_approval,
+        refreshed_at = excluded.refreshed_at;
+
+    delete from public.conversation_daily_stats s
+    using analytics_days d
+    where s.school_id = d.school_id and s.day = d.day;
+
+    insert into public.conversation_daily_stats (
+        school_id, day, rfa, conversations, completed, action_needed, escalated, resolved,
+        resolution_seconds_total, responded, outbound_messages, delivered, read, failed,
+        unconfirmed, downgraded)
+    select o.school_id, d.day, coalesce(o.rfa, 'Unexplained'),
+           count(*),
+           count(*) filter (where o.status = 'completed'),
+           count(*) filter (where o.status = 'action_needed'),
+           count(*) filter (where o.escalated),
+           count(*) filter (where o.resolved_at is not null),
+           coalesce(sum(o.resolution_seconds), 0),
+           count(*) filter (where o.guardian_messages > 0),
+           sum(o.outbound_messages), sum(o.delivered), sum(o.read), sum(o.failed),
+           sum(o.unconfirmed), sum(o.downgraded)
+    from analytics_days d
+    join public.conversation_outcomes o
+      on o.school_id = d.school_id
+     and o.created_at >= d.day::timestamp at time zone 'utc'
+     and o.created_at < (d.day + 1)::timestamp at time zone 'utc'
+    group by o.school_id, d.day, coalesce(o.rfa, 'Unexplained');
+
+    return refreshed;
+end $$;
+
+-- Totals per RFA over a school's days in [from_day, to_day], for GET /analytics/summary
+create or replace function public.conversation_analytics_summary(school uuid, from_day date, to_day date)
+returns table (
+    rfa text,
+    conversations bigint,
+    completed bigint,
+    action_needed bigint,
+    escalated bigint,
+    resolved bigint,
+    resolution_seconds_total double precision,
+    responded bigint,
+    outbound_messages bigint,
+    delivered bigint,
+    read bigint,
+    failed bigint,
+    unconfirmed bigint,
+    downgraded bigint
+)
+language sql
+stable
+as $$
+    select s.rfa, sum(s.conversations), sum(s.completed), sum(s.action_needed), sum(s.escalated),
+           sum(s.resolved), sum(s.resolution_seconds_total), sum(s.responded),
+           sum(s.outbound_messages), sum(s.delivered), sum(s.read), sum(s.failed),
+           sum(s.unconfirmed), sum(s.downgraded)
+    from public.conversation_daily_stats s
+    where s.school_id = school and s.day between from_day and to_day
+    group by s.rfa
+    order by s.rfa;
+$$;
+
+-- Backfill everything that exists today
+insert into public.analytics_dirty_conversations (conversation_id)
+select id from public.conversations
+on conflict do nothing;
+
+select public.refresh_conversation_analytics(null);
@@ -0,0 +1,8 @@
+-- The date of the absence a conversation was opened for. absence_id is the student id, so a
+-- student absent on several days has several conversations with the same absence_id; retried
+-- initiate jobs (backend/main.py find_initiated_conversations) match on (absence_id, school_id,
+-- absence_date). Older rows stay null and are matched by created_at as before. The
+-- (absence_id, school_id, created_at) index still serves the lookup.
+
+alter table public.conversations
+    add column if not exists absence_date date;
@@ -0,0 +1,31 @@
+-- claim_outbound_jobs reclaimed every job whose lease ran out, so a job that crashes its worker
+-- was redelivered forever. A job whose lease runs out on its last attempt is now dead-lettered
+-- instead (same rule as backend/jobs.py's SQLite store).
+create or replace function public.claim_outbound_jobs(worker_id text, batch_size integer, lease_seconds integer)
+returns setof public.outbound_jobs
+language sql
+as $$
+    update public.outbound_jobs
+    set status = 'dead',
+        last_error = 'Lease expired on the last attempt; the worker running it probably died',
+        locked_by = null,
+        locked_until = null,
+        updated_at = now()
+    where status = 'running' and locked_until < now() and attempts >= max_attempts;
+
+    update public.outbound_jobs j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = worker_id,
+        locked_until = now() + make_interval(secs => lease_seconds),
+        updated_at = now()
+    where j.id in (
+        select id from public.outbound_jobs
+        where (status = 'queued' and available_at <= now())
+           or (status = 'running' and locked_until < now())
+        order by available_at
+        limit batch_size
+        for update skip locked
+    )
+    returning j.*;
+$$;
@@ -0,0 +1,26 @@
+-- A conversation is escalated when the AI hands it to an attendance officer. status
+-- 'action_needed' alone isn't an escalation: clearly excused absences also land there, with
+-- recommended_action 'mark_as_completed', so counting them inflated escalation_rate.
+
+create or replace function public.stamp_conversation_outcome()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.resolved_at is null and new.status = 'completed' then
+        new.resolved_at := now();
+    end if;
+    if new.escalated_at is null and new.recommended_action = 'attendance_officer_take_over' then
+        new.escalated_at := now();
+    end if;
+    return new;
+end $$;
+
+-- Undo the stamps (and backfill) that came from status alone. The update queues these
+-- conversations for the analytics refresh below.
+update public.conversations
+    set escalated_at = null
+    where escalated_at is not null
+      and recommended_action is distinct from 'attendance_officer_take_over';
+
+select public.refresh_conversation_analytics(null);
@@ -0,0 +1,12 @@
+-- refresh_conversation_analytics() returns 0 at once while another call holds its lock, which is
+-- right for the periodic refresh but let refresh=true on the analytics endpoints serve stale
+-- rollups. This variant waits for the running refresh to finish, then refreshes. The advisory
+-- lock is reentrant, so the inner call's try-lock succeeds.
+create or replace function public.refresh_conversation_analytics_blocking(batch_size integer default 5000)
+returns integer
+language plpgsql
+as $$
+begin
+    perform pg_advisory_xact_lock(hashtext('refresh_conversation_analytics'));
+    return public.refresh_conversation_analytics(batch_size);
+end $$;